@@ -0,0 +1,77 @@
+'''
+This script compares how big and how fast our Mongo documents are when we
+store their arrays as nested lists of floats versus as binary blobs (see
+`gaspy.mongo.use_binary_arrays`). It does not need a Mongo server; it only
+encodes and decodes BSON locally.
+'''
+
+__authors__ = ['Kevin Tran']
+__email__ = 'ktran@andrew.cmu.edu'
+
+import time
+import numpy as np
+from bson import BSON
+from ase.build import fcc111, add_adsorbate, molecule
+from ase.constraints import FixAtoms
+from ase.calculators.singlepoint import SinglePointCalculator
+from gaspy.mongo import make_doc_from_atoms, make_atoms_from_doc, use_binary_arrays
+
+
+N_DOCS = 500
+
+
+def make_relaxed_adslab():
+    ''' Makes a slab of ~80 atoms with CO on it and fake DFT results '''
+    atoms = fcc111('Cu', size=(4, 4, 5), vacuum=10.)
+    add_adsorbate(atoms, molecule('CO'), 2., 'ontop')
+    atoms.set_constraint(FixAtoms(indices=range(32)))
+    forces = np.random.RandomState(42).normal(size=(len(atoms), 3))
+    atoms.set_calculator(SinglePointCalculator(atoms, energy=-400., forces=forces))
+    return atoms
+
+
+def benchmark(atoms, label):
+    '''
+    Prints how long it takes to make, BSON-encode, BSON-decode, and read
+    documents, and how big the encoded documents are.
+    '''
+    start = time.time()
+    docs = []
+    for _ in range(N_DOCS):
+        doc = make_doc_from_atoms(atoms)
+        doc['initial_configuration'] = make_doc_from_atoms(atoms)
+        docs.append(doc)
+    make_time = time.time() - start
+
+    start = time.time()
+    encoded_docs = [BSON.encode(doc) for doc in docs]
+    encode_time = time.time() - start
+
+    start = time.time()
+    decoded_docs = [encoded_doc.decode() for encoded_doc in encoded_docs]
+    decode_time = time.time() - start
+
+    start = time.time()
+    for doc in decoded_docs:
+        make_atoms_from_doc(doc)
+        make_atoms_from_doc(doc['initial_configuration'])
+    read_time = time.time() - start
+
+    size = np.mean([len(encoded_doc) for encoded_doc in encoded_docs])
+    print('%-18s %8.0f bytes/doc   make %6.0f docs/s   encode %7.0f docs/s   '
+          'decode %7.0f docs/s   read %6.0f docs/s'
+          % (label, size, N_DOCS / make_time, N_DOCS / encode_time,
+             N_DOCS / decode_time, N_DOCS / read_time))
+
+
+if __name__ == '__main__':
+    atoms = make_relaxed_adslab()
+    print('%i atoms per structure, %i documents per run\n' % (len(atoms), N_DOCS))
+
+    use_binary_arrays(False)
+    benchmark(atoms, 'lists')
+    use_binary_arrays(True)
+    benchmark(atoms, 'binary')
+    use_binary_arrays(True, compression='zlib')
+    benchmark(atoms, 'binary + zlib')
+    use_binary_arrays(False)
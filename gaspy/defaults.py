@@ -335,6 +335,22 @@ def surface_projection():
                     information from the old Mongo docs (in our
                     `surface_energy` collection).
     '''
+    fingerprints = surface_identifier_projection()
+    fingerprints['thinnest_structure'] = {'$arrayElemAt': ['$surface_structures', 0]}
+    return fingerprints
+
+
+def surface_identifier_projection():
+    '''
+    The identifiers and energies from `surface_projection`, without any of the
+    atomic structures. Use this when you do not need the structures, because
+    they are most of what we would be downloading otherwise.
+
+    Returns:
+        projection  A dictionary that is meant to be passed as a projection
+                    operator to a Mongo `find` or `aggregate` command on our
+                    `surface_energy` collection.
+    '''
     fingerprints = {'_id': 0,
                     'mongo_id': '$_id',
                     'mpid': '$mpid',
@@ -342,7 +358,6 @@ def surface_projection():
                     'shift': '$shift',
                     'intercept': '$surface_energy',
                     'intercept_uncertainty': '$surface_energy_standard_error',
-                    'thinnest_structure': {'$arrayElemAt': ['$surface_structures', 0]},
                     'FW_info': '$fwids'}
     return fingerprints
 
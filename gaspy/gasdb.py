@@ -3,18 +3,37 @@
 __author__ = 'Kevin Tran'
 __email__ = 'ktran@andrew.cmu.edu'
 
+import os
+import sys
+import fcntl
+import threading
 import warnings
+import weakref
 import math
+import re
+import hashlib
+import pickle
+import time
+from datetime import datetime
+from array import array
 import numpy as np
+import pandas as pd
 from copy import deepcopy
+from itertools import islice
 import json
+from collections import OrderedDict
+from collections.abc import Mapping
 from tqdm import tqdm
-from pymongo import MongoClient
+from multiprocess import Pool
+from pymongo import MongoClient, IndexModel, ASCENDING, UpdateOne, UpdateMany, ReplaceOne
+from bson.objectid import ObjectId
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, ConnectionFailure, CursorNotFound, ExecutionTimeout
 from pymatgen.ext.matproj import MPRester
 from pymatgen.analysis.pourbaix_diagram import PourbaixDiagram, ELEMENTS_HO
 from . import defaults
-from .utils import read_rc
+from .utils import read_rc, multimap, _chunk
+from .atoms_operators import get_stoich_from_mpid
 from .fireworks_helper_scripts import get_launchpad
 
 
@@ -23,6 +42,10 @@ def get_mongo_collection(collection_tag):
     Get a mongo collection, but with `__enter__` and `__exit__` methods that
     will allow you to establish and close connections with `with` statements.
 
+    The underlying `MongoClient` comes from a per-process registry (see
+    `_get_mongo_client`), so repeated calls reuse the same authenticated
+    connection pool instead of doing a new handshake every time.
+
     Args:
         collection_tag  All of the information needed to access a specific
                         Mongo collection is stored in the .gaspyrc.json file.
@@ -39,7 +62,7 @@ def get_mongo_collection(collection_tag):
                     methods.
     '''
     # Login info
-    mongo_info = read_rc('mongo_info')[collection_tag]
+    mongo_info = _get_mongo_info(collection_tag)
     host = mongo_info['host']
     port = int(mongo_info['port'])
     database_name = mongo_info['database']
@@ -48,29 +71,283 @@ def get_mongo_collection(collection_tag):
     collection_name = mongo_info['collection_name']
 
     # Connect to the database/collection
-    client = MongoClient(host=host, port=port, maxPoolSize=None)
+    client = _get_mongo_client(host=host, port=port, user=user,
+                               password=password, auth_source=database_name)
     database = getattr(client, database_name)
-    database.authenticate(user, password)
     collection = ConnectableCollection(database=database, name=collection_name)
 
     return collection
 
 
+# The registry of `MongoClient` instances that `get_mongo_collection` uses.
+# Clients are not fork-safe, so we remember which process made them and start
+# over if we find ourselves in a different one (e.g., a `multimap` worker).
+_MONGO_CLIENTS = {}
+_MONGO_INFO = {}
+_MONGO_REGISTRY_PID = None
+_MONGO_REGISTRY_LOCK = threading.Lock()
+
+
+def _get_mongo_info(collection_tag):
+    '''
+    Cached version of `read_rc('mongo_info')[collection_tag]`, since finding
+    and reading the .gaspyrc.json file every time we connect adds up.
+    '''
+    _reset_mongo_registry_after_fork()
+    try:
+        mongo_info = _MONGO_INFO[collection_tag]
+    except KeyError:
+        mongo_info = read_rc('mongo_info')[collection_tag]
+        _MONGO_INFO[collection_tag] = mongo_info
+    return mongo_info
+
+
+def _get_mongo_client(host, port, user, password, auth_source):
+    '''
+    Get the `MongoClient` for a host, port, and user from this process's
+    registry. If there is not one yet, then we make it.
+
+    Extra `MongoClient` settings (e.g., `maxPoolSize`, `compressors`,
+    `connectTimeoutMS`, `socketTimeoutMS`, and `serverSelectionTimeoutMS`) are
+    read from the optional `mongo_client_settings` branch of the
+    .gaspyrc.json file. Anything not set there falls back to the `pymongo`
+    defaults, which bound each client's pool at 100 connections.
+
+    Args:
+        host        A string indicating the host of the Mongo server
+        port        An integer indicating the port of the Mongo server
+        user        A string indicating the user to authenticate as
+        password    A string indicating the password of the user
+        auth_source A string indicating the database to authenticate against
+    Returns:
+        client  An authenticated instance of `pymongo.MongoClient`
+    '''
+    _reset_mongo_registry_after_fork()
+    key = (host, port, user, auth_source)
+    with _MONGO_REGISTRY_LOCK:
+        try:
+            client = _MONGO_CLIENTS[key]
+        except KeyError:
+            try:
+                settings = read_rc('mongo_client_settings')
+            except KeyError:
+                settings = {}
+            client = MongoClient(host=host, port=port,
+                                 username=user, password=password,
+                                 authSource=auth_source,
+                                 connect=False, **settings)
+            _MONGO_CLIENTS[key] = client
+    return client
+
+
+def _reset_mongo_registry_after_fork():
+    '''
+    If we are in a different process than the one that populated the
+    registry, then forget the inherited clients and make a fresh lock. We do
+    not close the clients because they still belong to the parent process.
+    '''
+    global _MONGO_REGISTRY_PID, _MONGO_REGISTRY_LOCK
+    pid = os.getpid()
+    if _MONGO_REGISTRY_PID != pid:
+        _MONGO_REGISTRY_LOCK = threading.Lock()
+        _MONGO_CLIENTS.clear()
+        _MONGO_INFO.clear()
+        _MONGO_REGISTRY_PID = pid
+
+
+def close_mongo_clients():
+    '''
+    Close every pooled `MongoClient` in this process and empty the registry.
+    You do not normally need this, but it is useful if you changed your
+    .gaspyrc.json file and want `get_mongo_collection` to pick it up.
+    '''
+    _reset_mongo_registry_after_fork()
+    with _MONGO_REGISTRY_LOCK:
+        for client in _MONGO_CLIENTS.values():
+            client.close()
+        _MONGO_CLIENTS.clear()
+        _MONGO_INFO.clear()
+
+
+def _is_pooled_client(client):
+    ''' Checks whether a `MongoClient` belongs to this process's registry '''
+    return any(client is pooled_client for pooled_client in _MONGO_CLIENTS.values())
+
+
 class ConnectableCollection(Collection):
     '''
     An extendeded version of the pymongo.collection.Collection class that can
-    be open and closed via a `with` statement
+    be open and closed via a `with` statement. Collections from pooled clients
+    are given back to the pool on exit instead of being closed.
     '''
     def __enter__(self):
         return self
     def __exit__(self, exception_type, exception_value, exception_traceback):   # noqa: E301
-        self.database.client.close()
+        client = self.database.client
+        if not _is_pooled_client(client):
+            client.close()
+
+
+# The compound indexes that our hot queries need, by collection tag. Equality
+# fields come first and range fields come last so that Mongo can use as much
+# of each index as possible.
+INDEXES = {'atoms': [[('fwid', ASCENDING)],
+                     # `FindCalculation` queries (e.g., `FindAdslab`)
+                     [('fwname.calculation_type', ASCENDING),
+                      ('fwname.mpid', ASCENDING),
+                      ('fwname.miller', ASCENDING),
+                      ('fwname.top', ASCENDING),
+                      ('fwname.adsorbate', ASCENDING),
+                      ('fwname.shift', ASCENDING)]],
+           'adsorption': [[('fwids.slab+adsorbate', ASCENDING)],
+                          # `defaults.adsorption_filters`
+                          [('adsorbate', ASCENDING),
+                           ('vasp_settings.gga', ASCENDING),
+                           ('adsorption_energy', ASCENDING)],
+                          # `_make_attempted_sites_lookup`
+                          [('adsorbate', ASCENDING),
+                           ('mpid', ASCENDING),
+                           ('miller', ASCENDING),
+                           ('top', ASCENDING)]],
+           # The duplicate check in `_InsertSitesToCatalog`
+           'catalog': [[('mpid', ASCENDING),
+                        ('miller', ASCENDING),
+                        ('top', ASCENDING),
+                        ('shift', ASCENDING)]]}
+
+
+def ensure_indexes(collection_tags=None):
+    '''
+    Builds the indexes in `INDEXES` if they do not exist yet. Mongo does
+    nothing for indexes that already exist, so this is safe to run as often as
+    you want. Note that we do not touch the `catalog_readonly` collection,
+    because we cannot write to it.
 
+    Arg:
+        collection_tags A sequence of strings indicating which collections
+                        you want to index. Defaults to all of the keys in
+                        `INDEXES`.
+    Returns:
+        index_names A dictionary whose keys are the collection tags and whose
+                    values are lists of the names of the indexes we made (or
+                    that already existed)
+    '''
+    if collection_tags is None:
+        collection_tags = list(INDEXES.keys())
+
+    index_names = {}
+    for collection_tag in collection_tags:
+        print('Building indexes for the %s collection...' % collection_tag)
+        indexes = [IndexModel(keys, background=True) for keys in INDEXES[collection_tag]]
+        with get_mongo_collection(collection_tag) as collection:
+            index_names[collection_tag] = collection.create_indexes(indexes)
+    return index_names
+
+
+def explain_hot_queries():
+    '''
+    Runs `explain` on a representative version of each of our hot queries
+    (see `_make_hot_queries`) and reports which of them would need a full
+    collection scan. You probably want to run `ensure_indexes` if any of them
+    do.
+
+    Returns:
+        report  A list of dictionaries, one per query, with the keys 'name',
+                'collection_tag', 'stages' (a list of the stages in the
+                winning query plan), and 'collection_scan' (a Boolean
+                indicating whether the plan has a `COLLSCAN` stage)
+    '''
+    report = []
+    for name, collection_tag, query in _make_hot_queries():
+        with get_mongo_collection(collection_tag) as collection:
+            explanation = collection.find(query).explain()
+        stages = _get_plan_stages(explanation['queryPlanner']['winningPlan'])
+        collection_scan = 'COLLSCAN' in stages
+        report.append({'name': name,
+                       'collection_tag': collection_tag,
+                       'stages': stages,
+                       'collection_scan': collection_scan})
+
+        print('%s (%s collection):  %s' % (name, collection_tag, ' <- '.join(stages)))
+        if collection_scan:
+            warnings.warn('The "%s" query does a full scan of the %s collection.'
+                          % (name, collection_tag), RuntimeWarning)
+    return report
+
+
+def _make_hot_queries():
+    '''
+    Makes queries that are shaped like the ones our tasks and pull functions
+    send the most. The values are placeholders; only the fields and operators
+    matter for the query plans.
 
-def get_adsorption_docs(adsorbate=None, extra_projections=None, filters=None):
+    Returns:
+        queries A list of 3-tuples whose elements are the name of the query,
+                the tag of the collection it is sent to, and the query itself
+    '''
+    shift = 0.25
+    site = [1., 2., 3.]
+    rotation = defaults.adslab_settings()['rotation']
+
+    find_adslab = {'fwname.calculation_type': 'slab+adsorbate optimization',
+                   'fwname.adsorbate': 'CO',
+                   'fwname.mpid': 'mp-2',
+                   'fwname.miller': [1, 1, 1],
+                   'fwname.shift': {'$gte': shift - 1e-3, '$lte': shift + 1e-3},
+                   'fwname.top': True}
+    for i, coordinate in enumerate(site):
+        find_adslab['fwname.adsorption_site.%i' % i] = {'$gte': coordinate - 1e-2,
+                                                        '$lte': coordinate + 1e-2}
+    for angle, value in rotation.items():
+        find_adslab['fwname.adsorbate_rotation.%s' % angle] = value
+
+    catalog_duplicate = {'mpid': 'mp-2',
+                         'miller': [1, 1, 1],
+                         'shift': {'$gt': shift - 0.01, '$lt': shift + 0.01},
+                         'top': True}
+    for i, coordinate in enumerate(site):
+        catalog_duplicate['adsorption_site.%i' % i] = {'$gt': coordinate - 0.01,
+                                                       '$lt': coordinate + 0.01}
+
+    adsorption_filters = defaults.adsorption_filters('CO')
+    adsorption_filters['adsorbate'] = 'CO'
+
+    # What each `$lookup` of `_make_attempted_sites_lookup` asks for
+    attempted_site = {'adsorbate': 'CO',
+                      'mpid': 'mp-2',
+                      'miller': [1, 1, 1],
+                      'top': True}
+
+    queries = [('FindAdslab', 'atoms', find_adslab),
+               ('fwid lookup', 'atoms', {'fwid': {'$in': [1, 2, 3]}}),
+               ('slab+adsorbate fwid lookup', 'adsorption', {'fwids.slab+adsorbate': {'$in': [1, 2, 3]}}),
+               ('adsorption filters', 'adsorption', adsorption_filters),
+               ('attempted sites lookup', 'adsorption', attempted_site),
+               ('catalog duplicate check', 'catalog', catalog_duplicate)]
+    return queries
+
+
+def _get_plan_stages(plan):
+    '''
+    Flattens a query plan from `explain` into a list of its stage names,
+    starting from the root (e.g., `['FETCH', 'IXSCAN']`).
+    '''
+    stages = [plan['stage']]
+    if 'inputStage' in plan:
+        stages.extend(_get_plan_stages(plan['inputStage']))
+    for input_stage in plan.get('inputStages', []):
+        stages.extend(_get_plan_stages(input_stage))
+    return stages
+
+
+def get_adsorption_docs(adsorbate=None, extra_projections=None, filters=None,
+                        strict=False, n_partitions=1, processes=None,
+                        ordered=True, resumable=False, record_type=None,
+                        fingerprints=None):
     '''
     A wrapper for the `aggregate` command that is tailored specifically for the
-    `adsorption` collection.
+    `adsorption` collection. This is a list-returning wrapper for
+    `iter_adsorption_docs`.
 
     Args:
         adsorbate           [optional] A string of the adsorbate that you want
@@ -89,12 +366,111 @@ def get_adsorption_docs(adsorbate=None, extra_projections=None, filters=None):
                             `gaspy.defaults.adsorption_filters`. If you want to
                             modify them, we suggest simply fetching that
                             object, modifying it, and then passing it here.
+        strict              A Boolean indicating whether to validate the
+                            documents in Python with `_clean_up_aggregated_docs`
+                            (`True`) instead of on the Mongo server (`False`).
+                            The Python path is slower because it downloads
+                            the documents before throwing them away.
+        n_partitions        An integer indicating how many `_id` ranges to
+                            split the collection into so that they can be
+                            pulled in parallel. Refer to
+                            `_iter_partitioned_docs`.
+        processes           An integer indicating how many processes to pull
+                            the partitions with. Defaults to `n_partitions`.
+        ordered             A Boolean indicating whether to give back the
+                            partitions in `_id` order (`True`) or in whatever
+                            order they finish (`False`)
+        resumable           A Boolean indicating whether to pull in
+                            checkpointed chunks that we retry after failures
+                            and resume after crashes. Refer to
+                            `_iter_resumable_docs`.
+        record_type         [Optional] A `gaspy.records.Record` type (e.g.,
+                            `gaspy.records.AdsorptionRecord`) to give the
+                            documents back as instead of dictionaries. They
+                            take less memory.
+        fingerprints        [Optional] How to encode the fingerprint strings
+                            (e.g., 'intern' or a `FingerprintVocabulary`).
+                            Refer to `_iter_encoded_fingerprints`.
     Returns:
         cleaned_docs    A list of dictionaries whose key/value pairings are the
                         ones given by `gaspy.defaults.adsorption_projection`
                         and who meet the filtering criteria of
                         `gaspy.defaults.adsorption_filters`
     '''
+    cleaned_docs = list(iter_adsorption_docs(adsorbate=adsorbate,
+                                             extra_projections=extra_projections,
+                                             filters=filters,
+                                             strict=strict,
+                                             n_partitions=n_partitions,
+                                             processes=processes,
+                                             ordered=ordered,
+                                             resumable=resumable,
+                                             record_type=record_type,
+                                             fingerprints=fingerprints))
+    return cleaned_docs
+
+
+def iter_adsorption_docs(adsorbate=None, extra_projections=None, filters=None,
+                         batch_size=1000, chunked=False, strict=False,
+                         n_partitions=1, processes=None, ordered=True,
+                         resumable=False, record_type=None, fingerprints=None):
+    '''
+    Generator version of `get_adsorption_docs`. Documents are validated as
+    they come off of the Mongo cursor, so you never have to hold the whole
+    collection in memory at once.
+
+    Args:
+        adsorbate           [optional] A string of the adsorbate that you want
+                            to get calculations for. If you pass nothing, then
+                            we get all documents regardless of adsorbate.
+        extra_projections   A dictionary with key/value pairings that
+                            correspond to a new projection you want to fetch
+                            and its location in the Mongo docs, respectively.
+                            Refer to `gaspy.defaults.adsorption_projection` for
+                            examples, or to the `$project` MongoDB operation.
+        filters             A dictionary whose keys are the locations of
+                            elements in the Mongo collection and whose values
+                            are Mongo matching commands. If this argument is
+                            `None`, then it will fetch the default filters from
+                            `gaspy.defaults.adsorption_filters`.
+        batch_size          An integer indicating how many documents Mongo
+                            should send us per network round trip. If
+                            `chunked` is `True`, then this is also the size of
+                            the lists that we yield.
+        chunked             A Boolean indicating whether you want to get
+                            documents one at a time (`False`) or in lists of
+                            size `batch_size` (`True`).
+        strict              A Boolean indicating whether to validate the
+                            documents in Python with `_clean_up_aggregated_docs`
+                            (`True`) instead of on the Mongo server (`False`).
+                            The Python path is slower because it downloads
+                            the documents before throwing them away.
+        n_partitions        An integer indicating how many `_id` ranges to
+                            split the collection into so that they can be
+                            pulled in parallel. Refer to
+                            `_iter_partitioned_docs`.
+        processes           An integer indicating how many processes to pull
+                            the partitions with. Defaults to `n_partitions`.
+        ordered             A Boolean indicating whether to give back the
+                            partitions in `_id` order (`True`) or in whatever
+                            order they finish (`False`)
+        resumable           A Boolean indicating whether to pull in
+                            checkpointed chunks that we retry after failures
+                            and resume after crashes. Refer to
+                            `_iter_resumable_docs`.
+        record_type         [Optional] A `gaspy.records.Record` type (e.g.,
+                            `gaspy.records.AdsorptionRecord`) to give the
+                            documents back as instead of dictionaries. They
+                            take less memory.
+        fingerprints        [Optional] How to encode the fingerprint strings
+                            (e.g., 'intern' or a `FingerprintVocabulary`).
+                            Refer to `_iter_encoded_fingerprints`.
+    Yields:
+        doc     A dictionary whose key/value pairings are the ones given by
+                `gaspy.defaults.adsorption_projection` and who meets the
+                filtering criteria of `gaspy.defaults.adsorption_filters`. If
+                `chunked` is `True`, then we yield lists of these instead.
+    '''
     # Set the filtering criteria of the documents we'll be getting
     if filters is None:
         filters = defaults.adsorption_filters(adsorbate)
@@ -112,13 +488,754 @@ def get_adsorption_docs(adsorbate=None, extra_projections=None, filters=None):
 
     # Get the documents and clean them up
     pipeline = [match, project]
-    with get_mongo_collection(collection_tag='adsorption') as collection:
-        print('Now pulling adsorption documents...')
-        cursor = collection.aggregate(pipeline=pipeline, allowDiskUse=True)
-        docs = [doc for doc in tqdm(cursor)]
-    cleaned_docs = _clean_up_aggregated_docs(docs, expected_keys=projection.keys())
+    if not strict:
+        pipeline.append(_make_validation_match(projection.keys()))
+    print('Now pulling adsorption documents...')
+    docs = _iter_aggregated_docs('adsorption', pipeline, batch_size,
+                                 n_partitions=n_partitions,
+                                 processes=processes,
+                                 ordered=ordered,
+                                 resumable=resumable)
+    cleaned_docs = _iter_validated_docs(docs, projection.keys(), strict)
+    cleaned_docs = _iter_encoded_fingerprints(cleaned_docs, fingerprints)
+    cleaned_docs = _iter_records(cleaned_docs, record_type, projection.keys())
+    yield from _maybe_chunk(cleaned_docs, batch_size, chunked)
+
+
+def _iter_aggregated_docs(collection_tag, pipeline, batch_size=1000,
+                          n_partitions=1, processes=None, ordered=True,
+                          resumable=False):
+    '''
+    Streams the documents of a Mongo aggregation one at a time. The connection
+    is closed once the generator is exhausted or garbage collected.
 
-    return cleaned_docs
+    Args:
+        collection_tag  A string indicating which collection to aggregate. See
+                        `get_mongo_collection` for examples.
+        pipeline        A list object containing the pipeline of Mongo
+                        operations that you want to use during Mongo
+                        aggregation.
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip
+        n_partitions    An integer indicating how many `_id` ranges to split
+                        the collection into and pull in parallel. If this is
+                        more than one, then refer to `_iter_partitioned_docs`.
+        processes       An integer indicating how many processes to pull the
+                        partitions with. Defaults to `n_partitions`.
+        ordered         A Boolean indicating whether to give back the
+                        partitions in `_id` order (`True`) or in whatever order
+                        they finish (`False`)
+        resumable       A Boolean indicating whether to pull in checkpointed
+                        chunks that we retry after failures and resume after
+                        crashes. Refer to `_iter_resumable_docs`. You cannot
+                        use this with more than one partition.
+    Yields:
+        doc     Each document that the aggregation returns. If you turned on
+                memoization with `memoize_pipelines`, then these are shallow
+                copies of memoized documents.
+    '''
+    if PIPELINE_MEMO_SETTINGS['enabled']:
+        # Fingerprint the collection before we pull so that anything added
+        # during the pull invalidates the memo
+        key = _get_pipeline_memo_key(collection_tag, pipeline)
+        version = _get_collection_version(collection_tag)
+        docs = _get_memoized_docs(key, version)
+        if docs is None:
+            docs = list(_iter_aggregated_docs_from_mongo(collection_tag, pipeline, batch_size,
+                                                         n_partitions, processes, ordered,
+                                                         resumable))
+            _memoize_docs(key, version, docs)
+        yield from (doc.copy() for doc in docs)
+
+    else:
+        yield from _iter_aggregated_docs_from_mongo(collection_tag, pipeline, batch_size,
+                                                    n_partitions, processes, ordered,
+                                                    resumable)
+
+
+def _iter_aggregated_docs_from_mongo(collection_tag, pipeline, batch_size=1000,
+                                     n_partitions=1, processes=None, ordered=True,
+                                     resumable=False):
+    '''
+    The part of `_iter_aggregated_docs` that actually talks to Mongo, i.e.,
+    without memoization. Refer to `_iter_aggregated_docs` for the arguments.
+    '''
+    if resumable:
+        if n_partitions > 1:
+            raise ValueError('Resumable pulls cannot be partitioned')
+        yield from _iter_resumable_docs(collection_tag, pipeline, batch_size)
+        return
+
+    if n_partitions > 1:
+        yield from _iter_partitioned_docs(collection_tag, pipeline, batch_size,
+                                          n_partitions, processes, ordered)
+        return
+
+    with get_mongo_collection(collection_tag=collection_tag) as collection:
+        cursor = collection.aggregate(pipeline=pipeline, allowDiskUse=True,
+                                      batchSize=batch_size)
+        yield from tqdm(cursor)
+
+
+# Memoized results of `_iter_aggregated_docs`. `_PIPELINE_MEMO` is an LRU whose
+# keys come from `_get_pipeline_memo_key` and whose values are 2-tuples of the
+# collection version (from `_get_collection_version`) and the documents.
+PIPELINE_MEMO_SETTINGS = {'enabled': False, 'max_entries': 32, 'disk': False}
+_PIPELINE_MEMO = OrderedDict()
+_PIPELINE_MEMO_LOCK = threading.Lock()
+_PIPELINE_MEMO_STATS = dict.fromkeys(['hits', 'disk_hits', 'misses', 'invalidations'], 0)
+
+
+def memoize_pipelines(enabled=True, max_entries=32, disk=False):
+    '''
+    Turns the memoization of our Mongo pulls on or off. When it is on, every
+    aggregation that `gasdb` does (e.g., in `get_adsorption_docs` or
+    `get_low_coverage_docs`) is remembered by collection and pipeline. We reuse
+    what we remembered as long as the number of documents and the latest `_id`
+    of the collection have not changed. For the catalog, we also check the
+    `mtime` of the prediction schema (see `register_predictions`), because new
+    predictions do not add documents.
+
+    Args:
+        enabled     A Boolean indicating whether to memoize
+        max_entries An integer indicating how many pulls to keep in memory.
+                    We forget the least recently used ones first.
+        disk        A Boolean indicating whether to also keep every pull in
+                    the `pipeline_memos` folder of our `gasdb_path`, so that
+                    other processes and sessions can reuse them
+    '''
+    with _PIPELINE_MEMO_LOCK:
+        PIPELINE_MEMO_SETTINGS.update(enabled=enabled, max_entries=max_entries, disk=disk)
+        if not enabled:
+            _PIPELINE_MEMO.clear()
+        while len(_PIPELINE_MEMO) > max_entries:
+            _PIPELINE_MEMO.popitem(last=False)
+
+
+def get_pipeline_memo_stats():
+    '''
+    Returns:
+        stats   A dictionary with how many times we reused a memoized pull
+                from memory ('hits') or from disk ('disk_hits'), had to pull
+                from Mongo ('misses'), or threw away a pull because its
+                collection changed ('invalidations'). It also has the number
+                of pulls we are keeping in memory ('entries').
+    '''
+    stats = dict(_PIPELINE_MEMO_STATS, entries=len(_PIPELINE_MEMO))
+    return stats
+
+
+def clear_pipeline_memo(disk=False):
+    '''
+    Forgets every memoized pull and resets the statistics.
+
+    Arg:
+        disk    A Boolean indicating whether to delete the on-disk memos, too
+    '''
+    with _PIPELINE_MEMO_LOCK:
+        _PIPELINE_MEMO.clear()
+        for key in _PIPELINE_MEMO_STATS:
+            _PIPELINE_MEMO_STATS[key] = 0
+    if disk:
+        memo_folder = read_rc('gasdb_path') + '/pipeline_memos/'
+        try:
+            file_names = os.listdir(memo_folder)
+        except FileNotFoundError:
+            file_names = []
+        for file_name in file_names:
+            if file_name.endswith('.pkl'):
+                os.remove(memo_folder + file_name)
+
+
+def _get_memoized_docs(key, version):
+    '''
+    Looks for a memoized pull that is still up to date, first in memory and
+    then on disk (if we're using it).
+
+    Args:
+        key     The key of the pull from `_get_pipeline_memo_key`
+        version The current version of the pull's collection from
+                `_get_collection_version`
+    Returns:
+        docs    A list of the memoized documents, or `None` if there are none
+                that are up to date
+    '''
+    with _PIPELINE_MEMO_LOCK:
+        try:
+            memo_version, docs = _PIPELINE_MEMO[key]
+            if memo_version == version:
+                _PIPELINE_MEMO.move_to_end(key)
+                _PIPELINE_MEMO_STATS['hits'] += 1
+                return docs
+            del _PIPELINE_MEMO[key]
+            _PIPELINE_MEMO_STATS['invalidations'] += 1
+        except KeyError:
+            pass
+
+    if PIPELINE_MEMO_SETTINGS['disk']:
+        try:
+            with open(_get_pipeline_memo_name(key), 'rb') as file_handle:
+                memo_version, docs = pickle.load(file_handle)
+            if memo_version == version:
+                _store_pipeline_memo(key, version, docs)
+                with _PIPELINE_MEMO_LOCK:
+                    _PIPELINE_MEMO_STATS['disk_hits'] += 1
+                return docs
+            with _PIPELINE_MEMO_LOCK:
+                _PIPELINE_MEMO_STATS['invalidations'] += 1
+        except (FileNotFoundError, EOFError):
+            pass
+
+    with _PIPELINE_MEMO_LOCK:
+        _PIPELINE_MEMO_STATS['misses'] += 1
+    return None
+
+
+def _memoize_docs(key, version, docs):
+    '''
+    Remembers the documents of a pull in memory and, if we're using it, on
+    disk.
+
+    Args:
+        key     The key of the pull from `_get_pipeline_memo_key`
+        version The version of the pull's collection from
+                `_get_collection_version`, as of before the pull
+        docs    A list of the documents that the pull returned
+    '''
+    _store_pipeline_memo(key, version, docs)
+
+    if PIPELINE_MEMO_SETTINGS['disk']:
+        cache_name = _get_pipeline_memo_name(key)
+        os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+        temp_name = '%s.%i.tmp' % (cache_name, os.getpid())
+        with open(temp_name, 'wb') as file_handle:
+            pickle.dump((version, docs), file_handle)
+        os.replace(temp_name, cache_name)
+
+
+def _store_pipeline_memo(key, version, docs):
+    ''' Puts a pull into the in-memory LRU and evicts the oldest ones '''
+    with _PIPELINE_MEMO_LOCK:
+        _PIPELINE_MEMO[key] = (version, docs)
+        _PIPELINE_MEMO.move_to_end(key)
+        while len(_PIPELINE_MEMO) > PIPELINE_MEMO_SETTINGS['max_entries']:
+            _PIPELINE_MEMO.popitem(last=False)
+
+
+def _get_pipeline_memo_key(collection_tag, pipeline):
+    '''
+    Makes a stable hash of a collection tag and pipeline. Non-JSON objects in
+    the pipeline (e.g., compiled regular expressions or `ObjectId`s) are
+    hashed by their string representations.
+    '''
+    serialized_pull = json.dumps([collection_tag, pipeline], sort_keys=True, default=repr)
+    key = hashlib.sha224(serialized_pull.encode()).hexdigest()
+    return key
+
+
+def _get_pipeline_memo_name(key):
+    ''' Figures out where the on-disk memo of a pull should go '''
+    cache_name = read_rc('gasdb_path') + '/pipeline_memos/' + key + '.pkl'
+    return cache_name
+
+
+def _get_collection_version(collection_tag):
+    '''
+    Cheaply fingerprints the state of a collection so that we can tell whether
+    a memoized pull is out of date.
+
+    Arg:
+        collection_tag  A string indicating the collection
+    Returns:
+        version A tuple of the (estimated) number of documents, the latest
+                `_id`, and, for the catalog, the `mtime` of the prediction
+                schema
+    '''
+    with get_mongo_collection(collection_tag) as collection:
+        n_docs = collection.estimated_document_count()
+        latest_doc = collection.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+    latest_id = latest_doc['_id'] if latest_doc is not None else None
+    version = (n_docs, latest_id)
+
+    if collection_tag in {'catalog', 'catalog_readonly'}:
+        with get_mongo_collection('catalog') as collection:
+            schema = collection['metadata'].find_one({'_id': PREDICTION_SCHEMA_ID}, {'mtime': 1})
+        version += (schema.get('mtime') if schema is not None else None,)
+    return version
+
+
+def _iter_partitioned_docs(collection_tag, pipeline, batch_size=1000,
+                           n_partitions=4, processes=None, ordered=True):
+    '''
+    Splits a collection into `_id` ranges and then runs the same aggregation
+    on each range in a different process. This spreads the work (and the
+    decoding of the documents) across multiple server threads and processes.
+
+    This only gives the same documents as one cursor would if every stage of
+    the pipeline handles each document on its own (e.g., `$match` and
+    `$project`). Do not use it for pipelines with `$group`, `$sort`, etc.
+
+    Args:
+        collection_tag  A string indicating which collection to aggregate
+        pipeline        A list object containing the pipeline of Mongo
+                        operations that you want to use during Mongo
+                        aggregation
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip
+        n_partitions    An integer indicating how many `_id` ranges to split
+                        the collection into
+        processes       An integer indicating how many processes to use.
+                        Defaults to `n_partitions`.
+        ordered         A Boolean indicating whether to give back the
+                        partitions in `_id` order (`True`) or in whatever order
+                        they finish (`False`)
+    Yields:
+        doc     Each document that the aggregation returns
+    '''
+    inputs = []
+    for id_range in _get_id_ranges(collection_tag, n_partitions):
+        match = {'$match': {'_id': id_range} if id_range else {}}
+        inputs.append((collection_tag, [match] + list(pipeline), batch_size))
+    if processes is None:
+        processes = len(inputs)
+    processes = max(min(processes, len(inputs)), 1)
+
+    with Pool(processes=processes) as pool:
+        if ordered:
+            iterator = pool.imap(_pull_partition, inputs)
+        else:
+            iterator = pool.imap_unordered(_pull_partition, inputs)
+        for docs in tqdm(iterator, total=len(inputs)):
+            yield from docs
+
+
+def _get_id_ranges(collection_tag, n_partitions):
+    '''
+    Splits a collection into `_id` ranges with roughly the same number of
+    documents in each by using Mongo's `$bucketAuto`.
+
+    Args:
+        collection_tag  A string indicating which collection to split
+        n_partitions    An integer indicating how many ranges you want. You
+                        may get fewer if there are not enough documents.
+    Returns:
+        id_ranges   A list of dictionaries that can be used as Mongo queries
+                    on `_id`, e.g., `{'$gte': ObjectId(...), '$lt':
+                    ObjectId(...)}`. The first and last ranges are open ended
+                    so that every document falls in exactly one range.
+    '''
+    with get_mongo_collection(collection_tag) as collection:
+        buckets = list(collection.aggregate([{'$bucketAuto': {'groupBy': '$_id',
+                                                              'buckets': n_partitions}}],
+                                            allowDiskUse=True))
+    boundaries = [bucket['_id']['min'] for bucket in buckets[1:]]
+
+    id_ranges = []
+    for lower, upper in zip([None] + boundaries, boundaries + [None]):
+        id_range = {}
+        if lower is not None:
+            id_range['$gte'] = lower
+        if upper is not None:
+            id_range['$lt'] = upper
+        id_ranges.append(id_range)
+    return id_ranges
+
+
+def _pull_partition(inputs):
+    '''
+    Runs one partition of `_iter_partitioned_docs`. This is the function that
+    we map over.
+
+    Arg:
+        inputs  A 3-tuple whose elements are the collection tag, the pipeline,
+                and the batch size
+    Returns:
+        docs    A list of the documents that the aggregation returns
+    '''
+    collection_tag, pipeline, batch_size = inputs
+    with get_mongo_collection(collection_tag) as collection:
+        docs = list(collection.aggregate(pipeline=pipeline, allowDiskUse=True,
+                                         batchSize=batch_size))
+    return docs
+
+
+# Resumable pulls go through the collection in chunks of this many documents
+# (before any filtering), and they retry each chunk up to `PULL_MAX_RETRIES`
+# times. The delay before each retry starts at `PULL_RETRY_DELAY` seconds and
+# doubles every time. We do not resume pulls that started more than
+# `PULL_CHECKPOINT_MAX_AGE` seconds ago.
+PULL_CHECKPOINT_SIZE = 10000
+PULL_MAX_RETRIES = 5
+PULL_RETRY_DELAY = 1.
+PULL_CHECKPOINT_MAX_AGE = 24 * 60 * 60
+_RETRYABLE_PULL_ERRORS = (ConnectionFailure, CursorNotFound, ExecutionTimeout)
+
+
+def _iter_resumable_docs(collection_tag, pipeline, batch_size=1000):
+    '''
+    Pulls an aggregation in `_id` ordered chunks of `PULL_CHECKPOINT_SIZE`
+    documents. After each chunk, we append its documents to a spill file and
+    then record the last `_id` that it covered in a checkpoint file. If a
+    chunk fails (e.g., the cursor timed out or the network blipped), then we
+    retry it with exponential backoff. If we run out of retries or the
+    process dies, then the next pull of the same pipeline replays the spill
+    file and picks up from the checkpoint instead of starting over. We delete
+    both files once the pull finishes.
+
+    We only resume if the collection has the same `_get_collection_version`
+    as when the interrupted pull started, and if that pull started less than
+    `PULL_CHECKPOINT_MAX_AGE` seconds ago. Only one process at a time can
+    checkpoint a given pull. If another process is already doing so, then we
+    still pull in retried chunks, but without checkpoints.
+
+    Like `_iter_partitioned_docs`, this only gives the same documents as one
+    cursor would if every stage of the pipeline handles each document on its
+    own (e.g., `$match` and `$project`).
+
+    Args:
+        collection_tag  A string indicating which collection to aggregate
+        pipeline        A list object containing the pipeline of Mongo
+                        operations that you want to use during Mongo
+                        aggregation
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip
+    Yields:
+        doc     Each document that the aggregation returns
+    '''
+    checkpoint_name, spill_name, lock_name = _get_pull_checkpoint_names(collection_tag, pipeline)
+    os.makedirs(os.path.dirname(lock_name), exist_ok=True)
+    with open(lock_name, 'a') as lock_handle:
+        try:
+            fcntl.flock(lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            warnings.warn('Another process is already pulling this pipeline, so '
+                          'this pull will not be resumable.', RuntimeWarning)
+            for docs, _ in _iter_chunks(collection_tag, pipeline, None, batch_size):
+                yield from docs
+            return
+
+        # The lock goes away when we close its file
+        version = _get_collection_version(collection_tag)
+        checkpoint = _load_pull_checkpoint(checkpoint_name, spill_name, version)
+        if checkpoint['n_docs']:
+            print('Resuming the pull after %i documents...' % checkpoint['n_docs'])
+        yield from _iter_spilled_docs(spill_name, checkpoint['spill_size'])
+
+        with open(spill_name, 'ab') as spill_handle:
+            # Anything spilled after the last checkpoint is from a chunk that
+            # never finished
+            spill_handle.truncate(checkpoint['spill_size'])
+
+            with tqdm(initial=checkpoint['n_docs']) as progress_bar:
+                for docs, last_id in _iter_chunks(collection_tag, pipeline,
+                                                  checkpoint['last_id'], batch_size):
+                    pickle.dump(docs, spill_handle)
+                    spill_handle.flush()
+                    checkpoint = dict(checkpoint,
+                                      last_id=last_id,
+                                      n_docs=checkpoint['n_docs'] + len(docs),
+                                      spill_size=spill_handle.tell())
+                    _dump_pull_checkpoint(checkpoint, checkpoint_name)
+                    progress_bar.update(len(docs))
+                    yield from docs
+
+        os.remove(checkpoint_name)
+        os.remove(spill_name)
+
+
+def _iter_chunks(collection_tag, pipeline, last_id, batch_size):
+    '''
+    Goes through the chunks of a resumable pull with `_pull_chunk`, starting
+    after `last_id`, until there are no documents left.
+
+    Yields:
+        docs    A list of the documents that the aggregation returned for each
+                chunk
+        last_id The last `_id` that each chunk covered
+    '''
+    while True:
+        docs, last_id = _pull_chunk(collection_tag, pipeline, last_id, batch_size)
+        if last_id is None:
+            return
+        yield docs, last_id
+
+
+def _pull_chunk(collection_tag, pipeline, last_id, batch_size):
+    '''
+    Pulls the next chunk of a resumable pull, retrying with exponential
+    backoff if Mongo fails on us.
+
+    Args:
+        collection_tag  A string indicating which collection to aggregate
+        pipeline        A list object containing the pipeline of Mongo
+                        operations
+        last_id         The last `_id` that the previous chunk covered, or
+                        `None` if this is the first chunk
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip
+    Returns:
+        docs    A list of the documents that the aggregation returned for this
+                chunk
+        last_id The last `_id` that this chunk covered, or `None` if there
+                were no documents left
+    '''
+    query = {'_id': {'$gt': last_id}} if last_id is not None else {}
+    for attempt in range(PULL_MAX_RETRIES + 1):
+        try:
+            with get_mongo_collection(collection_tag) as collection:
+                # Find where this chunk ends. We use `_id` boundaries instead
+                # of counting documents so that the chunks stay the same even
+                # if documents are added while we pull.
+                boundary = list(collection.find(query, {'_id': 1})
+                                .sort('_id', ASCENDING)
+                                .skip(PULL_CHECKPOINT_SIZE - 1).limit(1))
+                if not boundary:
+                    boundary = list(collection.find(query, {'_id': 1})
+                                    .sort('_id', -1).limit(1))
+                if not boundary:
+                    return [], None
+                upper_id = boundary[0]['_id']
+
+                id_range = dict(query.get('_id', {}), **{'$lte': upper_id})
+                chunk_pipeline = [{'$match': {'_id': id_range}}] + list(pipeline)
+                docs = list(collection.aggregate(pipeline=chunk_pipeline,
+                                                 allowDiskUse=True,
+                                                 batchSize=batch_size))
+            return docs, upper_id
+
+        except _RETRYABLE_PULL_ERRORS as error:
+            if attempt == PULL_MAX_RETRIES:
+                raise
+            delay = PULL_RETRY_DELAY * 2**attempt
+            warnings.warn('Pulling a chunk failed (%s); retrying in %.1f seconds'
+                          % (error, delay), RuntimeWarning)
+            time.sleep(delay)
+
+
+def _get_pull_checkpoint_names(collection_tag, pipeline):
+    '''
+    Figures out where the checkpoint and spill files of a resumable pull
+    should go.
+
+    Args:
+        collection_tag  A string indicating the collection of the pull
+        pipeline        A list object containing the pipeline of the pull
+    Returns:
+        checkpoint_name A string indicating the full path of the checkpoint
+        spill_name      A string indicating the full path of the spill file
+        lock_name       A string indicating the full path of the file that we
+                        lock while we write the other two
+    '''
+    key = _get_pipeline_memo_key(collection_tag, pipeline)
+    prefix = read_rc('gasdb_path') + '/pull_checkpoints/' + key
+    checkpoint_name = prefix + '.checkpoint.pkl'
+    spill_name = prefix + '.spill.pkl'
+    lock_name = prefix + '.lock'
+    return checkpoint_name, spill_name, lock_name
+
+
+def _load_pull_checkpoint(checkpoint_name, spill_name, version):
+    '''
+    Loads the checkpoint of a resumable pull. We start over if there is none,
+    if the spill file is missing what the checkpoint says it has, if the
+    collection changed since the pull started, or if the pull started more
+    than `PULL_CHECKPOINT_MAX_AGE` seconds ago.
+
+    Args:
+        checkpoint_name A string indicating the full path of the checkpoint
+        spill_name      A string indicating the full path of the spill file
+        version         The current version of the pull's collection from
+                        `_get_collection_version`
+    Returns:
+        checkpoint  A dictionary with the keys 'last_id' (the last `_id` that
+                    we covered), 'n_docs' (how many documents we spilled),
+                    'spill_size' (how many bytes of the spill file are good),
+                    'version' (the version of the collection when the pull
+                    started), and 'ctime' (when the pull started, in seconds
+                    since the epoch)
+    '''
+    try:
+        with open(checkpoint_name, 'rb') as file_handle:
+            checkpoint = pickle.load(file_handle)
+        if (checkpoint.get('version') == version and
+                time.time() - checkpoint.get('ctime', 0.) < PULL_CHECKPOINT_MAX_AGE and
+                os.path.getsize(spill_name) >= checkpoint['spill_size']):
+            return checkpoint
+    except (FileNotFoundError, EOFError):
+        pass
+
+    os.makedirs(os.path.dirname(checkpoint_name), exist_ok=True)
+    checkpoint = {'last_id': None, 'n_docs': 0, 'spill_size': 0,
+                  'version': version, 'ctime': time.time()}
+    return checkpoint
+
+
+def _dump_pull_checkpoint(checkpoint, checkpoint_name):
+    '''
+    Writes a checkpoint to a temporary file first so that an interruption
+    doesn't leave us with a corrupted one
+    '''
+    tmp_name = checkpoint_name + '.%i.tmp' % os.getpid()
+    with open(tmp_name, 'wb') as file_handle:
+        pickle.dump(checkpoint, file_handle)
+    os.replace(tmp_name, checkpoint_name)
+
+
+def _iter_spilled_docs(spill_name, spill_size):
+    '''
+    Replays the documents in the first `spill_size` bytes of a spill file,
+    which holds one pickled list of documents per chunk.
+    '''
+    if not spill_size:
+        return
+    with open(spill_name, 'rb') as file_handle:
+        while file_handle.tell() < spill_size:
+            yield from pickle.load(file_handle)
+
+
+def _maybe_chunk(docs, batch_size, chunked):
+    '''
+    Pass the `docs` iterable through as-is, or group it into lists of size
+    `batch_size` if `chunked` is `True`. The last list may be shorter.
+
+    Args:
+        docs        Any iterable of documents
+        batch_size  An integer indicating the size of the lists you want
+        chunked     A Boolean indicating whether or not to group the documents
+    Yields:
+        Either the documents themselves or lists of documents
+    '''
+    if not chunked:
+        yield from docs
+        return
+
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) >= batch_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# The keys of our documents whose values are fingerprint strings (or lists of
+# them). There are only a few thousand distinct values across all of our
+# documents.
+FINGERPRINT_KEYS = ('coordination', 'neighborcoord', 'nextnearestcoordination')
+
+
+class FingerprintVocabulary:
+    '''
+    Integer codes for fingerprint values (e.g., 'Cu-Cu' or ['Cu:Cu-Cu',
+    'Cu:Cu']). Codes are handed out in the order that we first see the
+    values. Share one vocabulary across pulls (e.g., of the adsorption and
+    catalog collections) if you want to compare their codes.
+    '''
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        '''
+        Arg:
+            value   A fingerprint string or a list of them
+        Returns:
+            code    The integer code of the value
+        '''
+        # Lists (like `neighborcoord`) are not hashable, so use tuples
+        if isinstance(value, list):
+            value = tuple(value)
+        try:
+            return self._codes[value]
+        except KeyError:
+            with self._lock:
+                # Another thread may have added it while we were waiting
+                if value not in self._codes:
+                    self._codes[value] = len(self.values)
+                    self.values.append(value)
+                return self._codes[value]
+
+    def decode(self, code):
+        '''
+        Arg:
+            code    An integer code from `encode`
+        Returns:
+            value   The fingerprint string or list of them that has the code
+        '''
+        value = self.values[code]
+        if isinstance(value, tuple):
+            value = list(value)
+        return value
+
+
+def _iter_encoded_fingerprints(docs, fingerprints):
+    '''
+    Encodes the fingerprints (i.e., the values of `FINGERPRINT_KEYS`) of
+    documents so that they take less memory and are faster to compare.
+
+    Args:
+        docs            An iterable of documents. We modify them in place.
+        fingerprints    `None` to leave the fingerprints alone; 'intern' to
+                        intern the strings with `sys.intern` so that all
+                        documents share the same string objects; or a
+                        `FingerprintVocabulary` to replace each fingerprint
+                        with its integer code in the vocabulary
+    Yields:
+        doc     Each document with its fingerprints encoded
+    '''
+    if fingerprints is None:
+        yield from docs
+        return
+    elif fingerprints == 'intern':
+        encode = _intern_fingerprint
+    elif isinstance(fingerprints, FingerprintVocabulary):
+        encode = fingerprints.encode
+    else:
+        raise ValueError('`fingerprints` must be `None`, \'intern\', or a '
+                         '`FingerprintVocabulary`, not %r' % (fingerprints,))
+
+    keys = None
+    for doc in docs:
+        if keys is None:
+            keys = [key for key in FINGERPRINT_KEYS if key in doc]
+        for key in keys:
+            doc[key] = encode(doc[key])
+        yield doc
+
+
+def _intern_fingerprint(value):
+    ''' Interns a fingerprint string or each string in a list of them '''
+    if isinstance(value, list):
+        return [sys.intern(element) for element in value]
+    return sys.intern(value)
+
+
+def _iter_records(docs, record_type, fields):
+    '''
+    Turns documents into records if the user asked for them.
+
+    Args:
+        docs        An iterable of documents
+        record_type A `gaspy.records.Record` type, or `None` to leave the
+                    documents as they are
+        fields      The keys of the documents. If `record_type` does not have
+                    all of them (e.g., because of extra projections), then we
+                    use a version of it that does.
+    Yields:
+        doc     Each document, as a record if we were given a `record_type`
+    '''
+    if record_type is None:
+        yield from docs
+        return
+
+    record_type = record_type.with_fields(fields)
+    for doc in docs:
+        yield record_type(doc)
 
 
 def _clean_up_aggregated_docs(docs, expected_keys):
@@ -137,48 +1254,137 @@ def _clean_up_aggregated_docs(docs, expected_keys):
     Returns:
         clean_docs  A subset of the `docs` argument with
     '''
+    cleaned_docs = list(_iter_clean_docs(docs, expected_keys))
+    return cleaned_docs
+
+
+def _make_validation_match(expected_keys):
+    '''
+    Creates a `$match` stage that does the same thing as
+    `_clean_up_aggregated_docs`, but on the Mongo server so that we do not
+    waste time downloading and decoding documents that we will throw away.
+    Put it after the `$project` (or `$group`) stage whose keys you are
+    validating.
+
+    Note that Mongo treats arrays differently than Python, so documents whose
+    arrays contain `None` or '' elements will be filtered out here even though
+    `_clean_up_aggregated_docs` would keep them.
+
+    Arg:
+        expected_keys   The dict keys that that you expect to be in every
+                        document. If a document is missing one of these keys
+                        or has `None` or '' for one of them, then it is
+                        filtered out.
+    Returns:
+        match   A dictionary that you can use as a stage in a Mongo pipeline
+    '''
+    filters = {}
+    for key in expected_keys:
+        if key == '_id':
+            continue
+        # `None` also matches keys that are missing
+        filters[key] = {'$nin': [None, '']}
+
+    # Clean up documents that have no second-shell atoms, i.e., they have a
+    # `neighborcoord` that looks like 'Cu:'
+    if 'neighborcoord' in filters:
+        filters['neighborcoord']['$not'] = re.compile(':$')
+
+    match = {'$match': filters}
+    return match
+
+
+def _iter_validated_docs(docs, expected_keys, strict=False):
+    '''
+    Pass documents through `_iter_clean_docs` if we are doing strict
+    validation. Otherwise, we assume that the pipeline already has a
+    `_make_validation_match` stage and we only warn the user if we did not
+    find anything.
+
+    Args:
+        docs            An iterable of aggregated Mongo documents
+        expected_keys   The dict keys that that you expect to be in every
+                        document
+        strict          A Boolean indicating whether or not to validate the
+                        documents in Python
+    Yields:
+        doc     Each valid document in `docs`
+    '''
+    if strict:
+        yield from _iter_clean_docs(docs, expected_keys)
+        return
+
+    found_docs = False
+    for doc in docs:
+        found_docs = True
+        yield doc
+    if not found_docs:
+        warnings.warn('We did not find any matching documents', RuntimeWarning)
+
+
+def _iter_clean_docs(docs, expected_keys):
+    '''
+    Generator version of `_clean_up_aggregated_docs`. It yields only the
+    documents that pass `_is_clean_doc`, and it warns the user if nothing
+    passed once the `docs` iterable is exhausted.
+
+    Arg:
+        docs            An iterable of aggregated Mongo documents
+        expected_keys   The dict keys that that you expect to be in every
+                        document
+    Yields:
+        doc     Each document in `docs` that is clean
+    '''
     # A hack to ignore the _id key, which is redundant with Mongo ID
     expected_keys = set(expected_keys)
-    try:
-        expected_keys.remove('_id')
-    except KeyError:
-        pass
+    expected_keys.discard('_id')
 
-    cleaned_docs = []
+    found_docs = False
     for doc in docs:
-        clean = True
-
-        # Clean up documents that don't have the right keys
-        if set(doc.keys()) != expected_keys:
-            clean = False
-        # Clean up documents that have `None` or '' as values
-        for key, value in doc.items():
-            if (value is None) or (value == ''):
-                clean = False
-            # Clean up documents that have no second-shell atoms
-            if key == 'neighborcoord':
-                for neighborcoord in value:  # neighborcoord looks like ['Cu:Cu-Cu-Cu-Cu', 'Cu:Cu-Cu-Cu-Cu']
-                    neighbor, coord = neighborcoord.split(':')
-                    if not coord:
-                        clean = False
-                        break
-            if not clean:
-                break
-
-        if clean:
-            cleaned_docs.append(doc)
+        if _is_clean_doc(doc, expected_keys):
+            found_docs = True
+            yield doc
 
     # Warn the user if we did not actually get any documents out the end.
-    if not cleaned_docs:
+    if not found_docs:
         warnings.warn('We did not find any matching documents', RuntimeWarning)
 
-    return cleaned_docs
 
+def _is_clean_doc(doc, expected_keys):
+    '''
+    Checks whether a single aggregated document has exactly the keys we expect
+    and no `None` or '' values. Documents that have no second-shell atoms in
+    their `neighborcoord` are not clean, either.
 
-def get_surface_docs(extra_projections=None, filters=None):
+    Args:
+        doc             An aggregated (i.e., flat) Mongo document
+        expected_keys   A set of the dict keys that you expect to be in the
+                        document, not including `_id`
+    Returns:
+        clean   A Boolean indicating whether or not the document is clean
+    '''
+    # Clean up documents that don't have the right keys
+    if set(doc.keys()) != expected_keys:
+        return False
+
+    for key, value in doc.items():
+        # Clean up documents that have `None` or '' as values
+        if (value is None) or (value == ''):
+            return False
+        # Clean up documents that have no second-shell atoms
+        if key == 'neighborcoord':
+            # neighborcoord looks like ['Cu:Cu-Cu-Cu-Cu', 'Cu:Cu-Cu-Cu-Cu']
+            if any(neighborcoord.endswith(':') for neighborcoord in value):
+                return False
+    return True
+
+
+def get_surface_docs(extra_projections=None, filters=None, strict=False,
+                     lazy=False, record_type=None):
     '''
     A wrapper for `collection.aggregate` that is tailored specifically for the
-    collection that's tagged `surface_energy`.
+    collection that's tagged `surface_energy`. This is a list-returning wrapper
+    for `iter_surface_docs`.
 
     Args:
         extra_projections   A dictionary with key/value pairings that
@@ -194,19 +1400,85 @@ def get_surface_docs(extra_projections=None, filters=None):
                             `gaspy.defaults.surface_filters`. If you want to
                             modify them, we suggest simply fetching that
                             object, modifying it, and then passing it here.
+        strict              A Boolean indicating whether to validate the
+                            documents in Python with `_clean_up_aggregated_docs`
+                            (`True`) instead of on the Mongo server (`False`).
+                            The Python path is slower because it downloads
+                            the documents before throwing them away.
+        lazy                A Boolean indicating whether to wait until you
+                            first access the atomic structures (e.g.,
+                            'thinnest_structure') of a document before
+                            downloading them. Refer to `_LazyDoc`.
+        record_type         [Optional] A `gaspy.records.Record` type (e.g.,
+                            `gaspy.records.SurfaceRecord`) to give the
+                            documents back as instead of dictionaries. You
+                            cannot use this with `lazy`.
     Returns:
         docs    A list of dictionaries whose key/value pairings are the
                 ones given by `gaspy.defaults.adsorption_projection` and who
                 meet the filtering criteria of `gaspy.defaults.surface_filters`
     '''
+    cleaned_docs = list(iter_surface_docs(extra_projections=extra_projections,
+                                          filters=filters,
+                                          strict=strict,
+                                          lazy=lazy,
+                                          record_type=record_type))
+    return cleaned_docs
+
+
+def iter_surface_docs(extra_projections=None, filters=None,
+                      batch_size=1000, chunked=False, strict=False,
+                      lazy=False, record_type=None):
+    '''
+    Generator version of `get_surface_docs`.
+
+    Args:
+        extra_projections   A dictionary with key/value pairings that
+                            correspond to a new projection you want to fetch
+                            and its location in the Mongo docs, respectively.
+        filters             A dictionary of Mongo matching commands. If this
+                            argument is `None`, then it will fetch the default
+                            filters from `gaspy.defaults.surface_filters`.
+        batch_size          An integer indicating how many documents Mongo
+                            should send us per network round trip. If
+                            `chunked` is `True`, then this is also the size of
+                            the lists that we yield.
+        chunked             A Boolean indicating whether you want to get
+                            documents one at a time (`False`) or in lists of
+                            size `batch_size` (`True`).
+        strict              A Boolean indicating whether to validate the
+                            documents in Python with `_clean_up_aggregated_docs`
+                            (`True`) instead of on the Mongo server (`False`).
+                            The Python path is slower because it downloads
+                            the documents before throwing them away.
+        lazy                A Boolean indicating whether to wait until you
+                            first access the atomic structures of a document
+                            before downloading them. Refer to `_LazyDoc`.
+        record_type         [Optional] A `gaspy.records.Record` type to give
+                            the documents back as instead of dictionaries. You
+                            cannot use this with `lazy`.
+    Yields:
+        doc     A dictionary whose key/value pairings are the ones given by
+                `gaspy.defaults.surface_projection`, or a list of them if
+                `chunked` is `True`
+    '''
+    if lazy and record_type is not None:
+        raise ValueError('Lazy surface documents cannot be records')
+
     # Set the filtering criteria of the documents we'll be getting
     if filters is None:
         filters = defaults.surface_filters()
     match = {'$match': filters}
 
     # Establish the information that'll be contained in the documents we'll be getting
-    # Also add anything the user asked for.
-    projection = defaults.surface_projection()
+    # Also add anything the user asked for. If we're being lazy, then we
+    # only get the identifiers and energies now and the rest later.
+    if lazy:
+        projection = defaults.surface_identifier_projection()
+        lazy_projection = {key: value for key, value in defaults.surface_projection().items()
+                           if key not in projection}
+    else:
+        projection = defaults.surface_projection()
     if extra_projections:
         for key, value in extra_projections.items():
             projection[key] = value
@@ -214,56 +1486,553 @@ def get_surface_docs(extra_projections=None, filters=None):
 
     # Get the documents and clean them up
     pipeline = [match, project]
-    with get_mongo_collection(collection_tag='surface_energy') as collection:
-        print('Now pulling surface documents...')
-        cursor = collection.aggregate(pipeline=pipeline, allowDiskUse=True)
-        docs = [doc for doc in tqdm(cursor)]
-    cleaned_docs = _clean_up_aggregated_docs(docs, expected_keys=projection.keys())
+    if not strict:
+        pipeline.append(_make_validation_match(projection.keys()))
+    print('Now pulling surface documents...')
+    docs = _iter_aggregated_docs('surface_energy', pipeline, batch_size)
+    cleaned_docs = _iter_validated_docs(docs, projection.keys(), strict)
+    if lazy:
+        loader = _LazyFieldLoader('surface_energy', lazy_projection, batch_size)
+        cleaned_docs = (loader.add(doc) for doc in cleaned_docs)
+    cleaned_docs = _iter_records(cleaned_docs, record_type, projection.keys())
+    yield from _maybe_chunk(cleaned_docs, batch_size, chunked)
+
+
+class _LazyDoc(dict):
+    '''
+    A document whose heavy fields are only downloaded when you first ask for
+    them with `doc[key]` (or `doc.get(key)`). Its `_LazyFieldLoader` then
+    downloads those fields for this document and for other documents that
+    are still waiting, all in one query. Until then, the heavy fields are
+    not in `doc.keys()`.
+
+    Copying or pickling one of these gives you a normal dictionary with
+    whatever has been loaded so far.
+    '''
+    __slots__ = ('_loader', '_loaded', '__weakref__')
 
-    return cleaned_docs
+    def __init__(self, doc, loader):
+        super().__init__(doc)
+        self._loader = loader
+        self._loaded = False
+
+    def __missing__(self, key):
+        if self._loaded or key not in self._loader.projection:
+            raise KeyError(key)
+        self._loader.load(self)
+        self._loaded = True
+        return self[key]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
 
 
-def get_catalog_docs():
+class _LazyFieldLoader:
+    '''
+    Downloads the lazy fields of `_LazyDoc` instances in batches.
+
+    Args:
+        collection_tag  A string indicating the collection the documents came
+                        from
+        projection      A dictionary whose keys are the lazy fields and whose
+                        values are Mongo projection expressions for them
+        batch_size      An integer indicating how many documents to load per
+                        query
+
+    The loader only keeps weak references to the documents that are still
+    waiting, so that streamed documents you have thrown away can still be
+    garbage collected.
+    '''
+    def __init__(self, collection_tag, projection, batch_size=1000):
+        self.collection_tag = collection_tag
+        self.projection = projection
+        self.batch_size = batch_size
+        self._pending = weakref.WeakValueDictionary()
+
+    def add(self, doc):
+        ''' Turns a document with a 'mongo_id' into a `_LazyDoc` '''
+        lazy_doc = _LazyDoc(doc, self)
+        self._pending[doc['mongo_id']] = lazy_doc
+        return lazy_doc
+
+    def load(self, lazy_doc):
+        '''
+        Downloads the lazy fields of a `_LazyDoc`, along with the ones of the
+        other documents that are still waiting (oldest first).
+        '''
+        docs_by_id = {lazy_doc['mongo_id']: lazy_doc}
+        self._pending.pop(lazy_doc['mongo_id'], None)
+        for mongo_id, doc in list(islice(self._pending.items(), self.batch_size - 1)):
+            docs_by_id[mongo_id] = doc
+            del self._pending[mongo_id]
+
+        pipeline = [{'$match': {'_id': {'$in': list(docs_by_id.keys())}}},
+                    {'$project': self.projection}]
+        with get_mongo_collection(self.collection_tag) as collection:
+            for result in collection.aggregate(pipeline, allowDiskUse=True):
+                dict.update(docs_by_id[result.pop('_id')], result)
+        for doc in docs_by_id.values():
+            doc._loaded = True
+
+
+def get_catalog_docs(cache=False, refresh_cache=False, strict=False,
+                     n_partitions=1, processes=None, ordered=True,
+                     resumable=False, record_type=None, fingerprints=None):
     '''
     A wrapper for `collection.aggregate` that is tailored specifically for the
-    collection that's tagged `catalog`.
+    collection that's tagged `catalog`. This is a list-returning wrapper for
+    `iter_catalog_docs`.
 
+    Args:
+        cache           A Boolean indicating whether or not to use a local,
+                        on-disk snapshot of the catalog. If `True`, then we
+                        only download the documents that were added since the
+                        last time you pulled. Refer to
+                        `_pull_catalog_with_snapshot` for details.
+        refresh_cache   A Boolean indicating whether or not to throw away the
+                        snapshot and re-download everything. Only used if
+                        `cache` is `True`.
+        strict          A Boolean indicating whether to validate the documents
+                        in Python with `_clean_up_aggregated_docs` (`True`)
+                        instead of on the Mongo server (`False`). Snapshots
+                        are always validated in Python because we only pull
+                        the new documents anyway.
+        n_partitions    An integer indicating how many `_id` ranges to split
+                        the collection into so that they can be pulled in
+                        parallel. Refer to `_iter_partitioned_docs`. Not
+                        used if `cache` is `True`.
+        processes       An integer indicating how many processes to pull the
+                        partitions with. Defaults to `n_partitions`.
+        ordered         A Boolean indicating whether to give back the
+                        partitions in `_id` order (`True`) or in whatever order
+                        they finish (`False`)
+        resumable       A Boolean indicating whether to pull in checkpointed
+                        chunks that we retry after failures and resume after
+                        crashes. Refer to `_iter_resumable_docs`. Not used if
+                        `cache` is `True`.
+        record_type     [Optional] A `gaspy.records.Record` type (e.g.,
+                        `gaspy.records.CatalogRecord`) to give the documents
+                        back as instead of dictionaries. They take less
+                        memory.
+        fingerprints    [Optional] How to encode the fingerprint strings
+                        (e.g., 'intern' or a `FingerprintVocabulary`).
+                        Refer to `_iter_encoded_fingerprints`. Snapshots
+                        keep the strings, so we encode copies of their
+                        documents.
     Returns:
         docs    A list of dictionaries whose key/value pairings are the ones
                 given by `gaspy.defaults.catalog_projection`
     '''
+    if cache:
+        projection = defaults.catalog_projection()
+        pipeline = [{'$project': projection}]
+        cleaned_docs = _pull_catalog_with_snapshot(pipeline,
+                                                   expected_keys=projection.keys(),
+                                                   refresh=refresh_cache)
+        if fingerprints is not None:
+            cleaned_docs = _iter_encoded_fingerprints((doc.copy() for doc in cleaned_docs),
+                                                      fingerprints)
+        cleaned_docs = list(_iter_records(cleaned_docs, record_type, projection.keys()))
+    else:
+        cleaned_docs = list(iter_catalog_docs(strict=strict,
+                                              n_partitions=n_partitions,
+                                              processes=processes,
+                                              ordered=ordered,
+                                              resumable=resumable,
+                                              record_type=record_type,
+                                              fingerprints=fingerprints))
+    return cleaned_docs
+
+
+def _pull_catalog_with_snapshot(pipeline, expected_keys, refresh=False):
+    '''
+    We only ever append to our catalog, so re-downloading all of it every time
+    is a waste. This function saves the cleaned documents of a catalog pull to
+    a pickle along with the largest Mongo `_id` that we have seen (i.e., the
+    high-water mark). On subsequent calls, we only pull the documents whose
+    `_id` is larger than the mark and then merge them into the snapshot.
+
+    If the number of documents at or below the mark changed since the
+    snapshot was made (e.g., something was deleted), then we cannot trust the
+    snapshot anymore and we rebuild it from scratch.
+
+    Args:
+        pipeline        A list object containing the pipeline of Mongo
+                        operations that you want to use during Mongo
+                        aggregation. Snapshots are keyed by this pipeline, so
+                        different projections get different snapshots.
+        expected_keys   The dict keys that that you expect to be in every
+                        document. Refer to `_clean_up_aggregated_docs`.
+        refresh         A Boolean indicating whether or not to ignore any
+                        existing snapshot and re-download everything
+    Returns:
+        docs    A list of the cleaned catalog documents as per your pipeline
+    '''
+    expected_keys = set(expected_keys)
+    expected_keys.discard('_id')
+    cache_name = _get_catalog_snapshot_name(pipeline)
+
+    # Load the snapshot if it exists
+    snapshot = None
+    if not refresh:
+        try:
+            with open(cache_name, 'rb') as file_handle:
+                snapshot = pickle.load(file_handle)
+        except (FileNotFoundError, EOFError):
+            pass
+
+    with get_mongo_collection(collection_tag='catalog_readonly') as collection:
+        # Fix the upper bound of this pull now so that anything that gets
+        # inserted while we are pulling will be picked up next time instead
+        latest_doc = collection.find_one({}, projection={'_id': 1}, sort=[('_id', -1)])
+
+        # Make sure nothing that we already have was deleted
+        if snapshot is not None and snapshot['max_id'] is not None:
+            n_docs_old = collection.count_documents({'_id': {'$lte': snapshot['max_id']}})
+            if n_docs_old != snapshot['n_docs_pulled']:
+                print('The catalog changed since the last snapshot; rebuilding it...')
+                snapshot = None
+    if snapshot is None:
+        snapshot = {'docs': [], 'max_id': None, 'n_docs_pulled': 0}
+
+    # Pull only the documents above the high-water mark
+    if latest_doc is not None and latest_doc['_id'] != snapshot['max_id']:
+        id_range = {'$lte': latest_doc['_id']}
+        if snapshot['max_id'] is not None:
+            id_range['$gt'] = snapshot['max_id']
+        new_pipeline = [{'$match': {'_id': id_range}}] + list(pipeline)
+        for doc in _iter_catalog_from_mongo(new_pipeline):
+            snapshot['n_docs_pulled'] += 1
+            if _is_clean_doc(doc, expected_keys):
+                snapshot['docs'].append(doc)
+        snapshot['max_id'] = latest_doc['_id']
+
+        # Write to a temporary file first so that an interruption doesn't
+        # leave us with a corrupted snapshot
+        os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+        with open(cache_name + '.tmp', 'wb') as file_handle:
+            pickle.dump(snapshot, file_handle)
+        os.replace(cache_name + '.tmp', cache_name)
+
+    docs = snapshot['docs']
+    if not docs:
+        warnings.warn('We did not find any matching documents', RuntimeWarning)
+    return docs
+
+
+def _get_catalog_snapshot_name(pipeline):
+    '''
+    Figures out where `_pull_catalog_with_snapshot` should save its snapshot
+    for a given pipeline.
+
+    Arg:
+        pipeline    A list object containing the pipeline of Mongo operations
+    Returns:
+        cache_name  A string indicating the full path of the snapshot pickle
+    '''
+    pipeline_hash = hashlib.sha224(json.dumps(pipeline, sort_keys=True).encode()).hexdigest()
+    cache_name = read_rc('gasdb_path') + '/catalog_snapshots/' + pipeline_hash + '.pkl'
+    return cache_name
+
+
+def iter_catalog_docs(batch_size=1000, chunked=False, strict=False,
+                      n_partitions=1, processes=None, ordered=True,
+                      resumable=False, record_type=None, fingerprints=None):
+    '''
+    Generator version of `get_catalog_docs`.
+
+    Args:
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip. If `chunked` is
+                        `True`, then this is also the size of the lists that
+                        we yield.
+        chunked         A Boolean indicating whether you want to get documents
+                        one at a time (`False`) or in lists of size
+                        `batch_size` (`True`).
+        strict          A Boolean indicating whether to validate the documents
+                        in Python with `_clean_up_aggregated_docs` (`True`)
+                        instead of on the Mongo server (`False`)
+        n_partitions    An integer indicating how many `_id` ranges to split
+                        the collection into so that they can be pulled in
+                        parallel. Refer to `_iter_partitioned_docs`.
+        processes       An integer indicating how many processes to pull the
+                        partitions with. Defaults to `n_partitions`.
+        ordered         A Boolean indicating whether to give back the
+                        partitions in `_id` order (`True`) or in whatever order
+                        they finish (`False`)
+        resumable       A Boolean indicating whether to pull in checkpointed
+                        chunks that we retry after failures and resume after
+                        crashes. Refer to `_iter_resumable_docs`.
+        record_type     [Optional] A `gaspy.records.Record` type to give the
+                        documents back as instead of dictionaries
+        fingerprints    [Optional] How to encode the fingerprint strings
+                        (e.g., 'intern' or a `FingerprintVocabulary`).
+                        Refer to `_iter_encoded_fingerprints`.
+    Yields:
+        doc     A dictionary whose key/value pairings are the ones given by
+                `gaspy.defaults.catalog_projection`, or a list of them if
+                `chunked` is `True`
+    '''
     # Reorganize the documents to the way we want
     projection = defaults.catalog_projection()
     project = {'$project': projection}
 
     # Pull and clean the documents
     pipeline = [project]
-    docs = _pull_catalog_from_mongo(pipeline)
-    cleaned_docs = _clean_up_aggregated_docs(docs, expected_keys=projection.keys())
-
-    return cleaned_docs
-
-
-def _pull_catalog_from_mongo(pipeline):
+    if not strict:
+        pipeline.append(_make_validation_match(projection.keys()))
+    docs = _iter_catalog_from_mongo(pipeline, batch_size,
+                                    n_partitions=n_partitions,
+                                    processes=processes,
+                                    ordered=ordered,
+                                    resumable=resumable)
+    cleaned_docs = _iter_validated_docs(docs, projection.keys(), strict)
+    cleaned_docs = _iter_encoded_fingerprints(cleaned_docs, fingerprints)
+    cleaned_docs = _iter_records(cleaned_docs, record_type, projection.keys())
+    yield from _maybe_chunk(cleaned_docs, batch_size, chunked)
+
+
+def _pull_catalog_from_mongo(pipeline, n_partitions=1, processes=None,
+                             ordered=True, resumable=False):
     '''
     Given a Mongo pipeline, get the catalog documents.
 
     Arg:
-        pipeline    A list object containing the pipeline of Mongo operations
-                    that you want to use during Mongo aggregation. Refer to
-                    pymongo documentation on aggregation.
+        pipeline        A list object containing the pipeline of Mongo
+                        operations that you want to use during Mongo
+                        aggregation. Refer to pymongo documentation on
+                        aggregation.
+        n_partitions    An integer indicating how many `_id` ranges to split
+                        the collection into so that they can be pulled in
+                        parallel. Refer to `_iter_partitioned_docs`.
+        processes       An integer indicating how many processes to pull the
+                        partitions with. Defaults to `n_partitions`.
+        ordered         A Boolean indicating whether to give back the
+                        partitions in `_id` order (`True`) or in whatever order
+                        they finish (`False`)
+        resumable       A Boolean indicating whether to pull in checkpointed
+                        chunks that we retry after failures and resume after
+                        crashes. Refer to `_iter_resumable_docs`.
     Returns:
         docs    A list of dictionaries containing the catalog documents as per
                 your pipeline.
     '''
-    with get_mongo_collection(collection_tag='catalog_readonly') as collection:
-        print('Now pulling catalog documents...')
-        cursor = collection.aggregate(pipeline=pipeline, allowDiskUse=True)
-        docs = [doc for doc in tqdm(cursor)]
+    docs = list(_iter_catalog_from_mongo(pipeline,
+                                         n_partitions=n_partitions,
+                                         processes=processes,
+                                         ordered=ordered,
+                                         resumable=resumable))
     return docs
 
 
-def get_catalog_docs_with_predictions(latest_predictions=True):
+def _iter_catalog_from_mongo(pipeline, batch_size=1000, n_partitions=1,
+                             processes=None, ordered=True, resumable=False):
+    '''
+    Generator version of `_pull_catalog_from_mongo`.
+
+    Args:
+        pipeline        A list object containing the pipeline of Mongo
+                        operations that you want to use during Mongo
+                        aggregation
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip
+        n_partitions    An integer indicating how many `_id` ranges to split
+                        the collection into so that they can be pulled in
+                        parallel. Refer to `_iter_partitioned_docs`.
+        processes       An integer indicating how many processes to pull the
+                        partitions with. Defaults to `n_partitions`.
+        ordered         A Boolean indicating whether to give back the
+                        partitions in `_id` order (`True`) or in whatever order
+                        they finish (`False`)
+        resumable       A Boolean indicating whether to pull in checkpointed
+                        chunks that we retry after failures and resume after
+                        crashes. Refer to `_iter_resumable_docs`.
+    Yields:
+        doc     Each catalog document as per your pipeline
+    '''
+    print('Now pulling catalog documents...')
+    yield from _iter_aggregated_docs('catalog_readonly', pipeline, batch_size,
+                                     n_partitions=n_partitions,
+                                     processes=processes,
+                                     ordered=ordered,
+                                     resumable=resumable)
+
+
+def get_catalog_frame(as_dataframe=True, batch_size=1000):
+    '''
+    Columnar version of `get_catalog_docs`. Instead of giving you a list of
+    dictionaries, this function builds typed columns straight from the Mongo
+    cursor so that you never have to touch per-document dictionaries.
+
+    Args:
+        as_dataframe    A Boolean indicating whether you want a
+                        `pandas.DataFrame` (`True`) or a dictionary of NumPy
+                        arrays (`False`). Refer to `_make_frame` for the
+                        layouts of both.
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip
+    Returns:
+        frame   Either a `pandas.DataFrame` or a dictionary of NumPy arrays
+                whose columns are the keys of
+                `gaspy.defaults.catalog_projection`
+    '''
+    docs = iter_catalog_docs(batch_size=batch_size)
+    frame = _make_frame(docs, as_dataframe=as_dataframe)
+    return frame
+
+
+def get_adsorption_frame(adsorbate=None, extra_projections=None, filters=None,
+                         as_dataframe=True, batch_size=1000):
+    '''
+    Columnar version of `get_adsorption_docs`. Instead of giving you a list of
+    dictionaries, this function builds typed columns straight from the Mongo
+    cursor so that you never have to touch per-document dictionaries.
+
+    Args:
+        adsorbate           [optional] A string of the adsorbate that you want
+                            to get calculations for. If you pass nothing, then
+                            we get all documents regardless of adsorbate.
+        extra_projections   A dictionary with key/value pairings that
+                            correspond to a new projection you want to fetch
+                            and its location in the Mongo docs, respectively.
+                            These will be stored as object columns.
+        filters             A dictionary of Mongo matching commands. If this
+                            argument is `None`, then it will fetch the default
+                            filters from `gaspy.defaults.adsorption_filters`.
+        as_dataframe        A Boolean indicating whether you want a
+                            `pandas.DataFrame` (`True`) or a dictionary of
+                            NumPy arrays (`False`). Refer to `_make_frame` for
+                            the layouts of both.
+        batch_size          An integer indicating how many documents Mongo
+                            should send us per network round trip
+    Returns:
+        frame   Either a `pandas.DataFrame` or a dictionary of NumPy arrays
+                whose columns are the keys of
+                `gaspy.defaults.adsorption_projection`
+    '''
+    docs = iter_adsorption_docs(adsorbate=adsorbate,
+                                extra_projections=extra_projections,
+                                filters=filters,
+                                batch_size=batch_size)
+    frame = _make_frame(docs, as_dataframe=as_dataframe)
+    return frame
+
+
+# The `array` typecodes and NumPy dtypes that we use for the columns of
+# `_make_frame`. Keys that are not in here or in `FRAME_CATEGORICAL_KEYS` are
+# stored as object columns.
+FRAME_SCALAR_TYPES = {'shift': ('d', np.float64),
+                      'energy': ('d', np.float64),
+                      'top': ('b', np.int8),
+                      'natoms': ('i', np.intc)}
+FRAME_VECTOR_TYPES = {'miller': ('b', np.int8, ('h', 'k', 'l')),
+                      'adsorption_site': ('d', np.float64, ('x', 'y', 'z'))}
+FRAME_CATEGORICAL_KEYS = {'mpid', 'adsorbate', 'coordination',
+                          'neighborcoord', 'nextnearestcoordination'}
+
+
+def _make_frame(docs, as_dataframe=True):
+    '''
+    Turns an iterable of aggregated documents into typed columns in a single
+    pass. Floats become float64, `top` becomes int8, Miller indices and
+    adsorption sites become (n, 3) arrays, and strings such as the MPID and
+    fingerprints become categorical codes. Anything else is kept as an object
+    column.
+
+    Args:
+        docs            An iterable of aggregated documents that all have the
+                        same keys, e.g., the output of `iter_catalog_docs`
+        as_dataframe    A Boolean indicating the type of the output. If
+                        `True`, you get a `pandas.DataFrame` whose (n, 3)
+                        columns are split into one column per component,
+                        e.g., `miller_h`, `miller_k`, and `miller_l`, and whose
+                        categorical columns are `pandas.Categorical`. If
+                        `False`, you get a dictionary of NumPy arrays where
+                        each categorical column is an array of integer codes
+                        and its vocabulary is stored in an object array under
+                        the '<key>_categories' key. Note that the numeric
+                        arrays are read-only views of the buffers we filled
+                        while streaming, so copy them if you need to modify
+                        them in place.
+    Returns:
+        frame   A `pandas.DataFrame` or a dictionary of NumPy arrays
+    '''
+    columns = {}
+    vocabularies = {}
+    n_docs = 0
+    for doc in docs:
+        if not columns:
+            for key in doc:
+                if key in FRAME_SCALAR_TYPES:
+                    columns[key] = array(FRAME_SCALAR_TYPES[key][0])
+                elif key in FRAME_VECTOR_TYPES:
+                    columns[key] = array(FRAME_VECTOR_TYPES[key][0])
+                elif key in FRAME_CATEGORICAL_KEYS:
+                    columns[key] = array('i')
+                    vocabularies[key] = {}
+                else:
+                    columns[key] = []
+
+        for key, column in columns.items():
+            value = doc[key]
+            if key in FRAME_VECTOR_TYPES:
+                column.extend(value)
+            elif key in vocabularies:
+                # Lists (like `neighborcoord`) are not hashable, so use tuples
+                if isinstance(value, list):
+                    value = tuple(value)
+                vocabulary = vocabularies[key]
+                column.append(vocabulary.setdefault(value, len(vocabulary)))
+            else:
+                column.append(value)
+        n_docs += 1
+
+    # Convert the growable columns into NumPy arrays
+    arrays = {}
+    for key, column in columns.items():
+        if key in FRAME_SCALAR_TYPES:
+            arrays[key] = np.frombuffer(column, dtype=FRAME_SCALAR_TYPES[key][1])
+        elif key in FRAME_VECTOR_TYPES:
+            arrays[key] = np.frombuffer(column, dtype=FRAME_VECTOR_TYPES[key][1]).reshape(n_docs, 3)
+        elif key in vocabularies:
+            arrays[key] = np.frombuffer(column, dtype=np.intc)
+            arrays[key + '_categories'] = _make_object_array(list(vocabularies[key]))
+        else:
+            arrays[key] = _make_object_array(column)
+    if not as_dataframe:
+        return arrays
+
+    frame = pd.DataFrame(index=pd.RangeIndex(n_docs))
+    for key in columns:
+        if key in FRAME_VECTOR_TYPES:
+            for i, component in enumerate(FRAME_VECTOR_TYPES[key][2]):
+                frame['%s_%s' % (key, component)] = arrays[key][:, i]
+        elif key in vocabularies:
+            categories = pd.Index(arrays[key + '_categories'], dtype=object, tupleize_cols=False)
+            frame[key] = pd.Categorical.from_codes(arrays[key], categories=categories)
+        else:
+            frame[key] = arrays[key]
+    return frame
+
+
+def _make_object_array(values):
+    '''
+    NumPy tries to turn lists of lists into 2-D arrays. This function makes
+    sure that we get a 1-D object array instead, regardless of the values.
+    '''
+    object_array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        object_array[i] = value
+    return object_array
+
+
+def get_catalog_docs_with_predictions(latest_predictions=True, strict=False):
     '''
     Nearly identical to `get_catalog_docs`, except it also pulls our surrogate
     modeling predictions for adsorption energies.
@@ -271,6 +2040,9 @@ def get_catalog_docs_with_predictions(latest_predictions=True):
     Args:
         lastest_predictions Boolean indicating whether or not you want either
                             the latest predictions or all of them.
+        strict              A Boolean indicating whether to validate the
+                            documents in Python with `_clean_up_aggregated_docs`
+                            (`True`) instead of on the Mongo server (`False`)
     Returns:
         docs    A list of dictionaries whose key/value pairings are the ones
                 given by `gaspy.defaults.catalog_projection`, along with a
@@ -283,15 +2055,15 @@ def get_catalog_docs_with_predictions(latest_predictions=True):
     projection = _add_adsorption_energy_predictions_to_projection(projection, latest_predictions)
     projection = _add_orr_predictions_to_projection(projection, latest_predictions)
 
-    # Get the documents
-    project = {'$project': projection}
-    pipeline = [project]
-    docs = _pull_catalog_from_mongo(pipeline)
-
-    # Clean the documents up
+    # Get the documents and clean them up
     expected_keys = set(defaults.catalog_projection())
     expected_keys.add('predictions')
-    cleaned_docs = _clean_up_aggregated_docs(docs, expected_keys=expected_keys)
+    project = {'$project': projection}
+    pipeline = [project]
+    if not strict:
+        pipeline.append(_make_validation_match(expected_keys))
+    docs = _iter_catalog_from_mongo(pipeline)
+    cleaned_docs = list(_iter_validated_docs(docs, expected_keys, strict))
 
     return cleaned_docs
 
@@ -308,20 +2080,15 @@ def _add_adsorption_energy_predictions_to_projection(projection, latest_predicti
         lastest_predictions Boolean indicating whether or not you want either
                             the latest predictions or all of them.
     '''
-    # Figure out what type of json structure our adsorption energy predictions
-    # have. We do that by looking at the structure of one random document. Note
-    # that this assumes that all documents are structure identically.
-    with get_mongo_collection('catalog') as collection:
-        cursor = collection.aggregate([{"$sample": {"size": 1}}])
-        example_doc = list(cursor)[0]
-    predictions = example_doc['predictions']['adsorption_energy']
-    adsorbates = set(predictions.keys())
-    models = set(model for adsorbate in adsorbates for model in predictions[adsorbate])
+    # Figure out which adsorbates and models we have predictions for by
+    # looking at the [cached] prediction schema.
+    schema = get_prediction_schema()
+    predictions = schema['adsorption_energy']
 
     # Make a projection query that targets predictions for each combination of
     # adsorbate and model.
-    for adsorbate in adsorbates:
-        for model in models:
+    for adsorbate, models in sorted(predictions.items()):
+        for model in sorted(models):
             data_location = 'predictions.adsorption_energy.%s.%s' % (adsorbate, model)
             if latest_predictions:
                 projection[data_location] = {'$arrayElemAt': ['$'+data_location, -1]}
@@ -343,17 +2110,13 @@ def _add_orr_predictions_to_projection(projection, latest_predictions):
         lastest_predictions Boolean indicating whether or not you want either
                             the latest predictions or all of them.
     '''
-    # Figure out what type of json structure our adsorption energy predictions
-    # have. We do that by looking at the structure of one random document. Note
-    # that this assumes that all documents are structure identically.
-    with get_mongo_collection('catalog') as collection:
-        cursor = collection.aggregate([{"$sample": {"size": 1}}])
-        example_doc = list(cursor)[0]
-    predictions = example_doc['predictions']['orr_onset_potential_4e']
-    models = set(predictions.keys())
+    # Figure out which models we have predictions for by looking at the
+    # [cached] prediction schema.
+    schema = get_prediction_schema()
+    models = schema['orr_onset_potential_4e']
 
     # Make a projection query that targets predictions for each model.
-    for model in models:
+    for model in sorted(models):
         data_location = 'predictions.orr_onset_potential_4e.%s' % model
         if latest_predictions:
             projection[data_location] = {'$arrayElemAt': ['$'+data_location, -1]}
@@ -363,9 +2126,133 @@ def _add_orr_predictions_to_projection(projection, latest_predictions):
     return projection
 
 
+# The prediction schema lists which adsorbates and models we have surrogate
+# predictions for. It lives in a single document inside the `metadata`
+# sub-collection of the catalog (e.g., `catalog.metadata`), and we keep an
+# in-process copy of it for `PREDICTION_SCHEMA_TTL` seconds.
+PREDICTION_SCHEMA_ID = 'prediction_schema'
+PREDICTION_SCHEMA_TTL = 600.
+_PREDICTION_SCHEMA_CACHE = {}
+
+
+def get_prediction_schema(max_age=PREDICTION_SCHEMA_TTL):
+    '''
+    Get the adsorbates and models that our catalog has surrogate predictions
+    for. We read this from the prediction schema document instead of probing
+    the catalog itself, and then we cache it in-process. If the schema
+    document does not exist yet, then we build it with
+    `update_prediction_schema`.
+
+    Args:
+        max_age     A float indicating how old (in seconds) the in-process copy
+                    of the schema may be before we read it from Mongo again.
+                    Set this to zero to force a read.
+    Returns:
+        schema  A dictionary with the keys 'adsorption_energy' and
+                'orr_onset_potential_4e'. The 'adsorption_energy' value is a
+                dictionary whose keys are adsorbates and whose values are
+                lists of model names. The 'orr_onset_potential_4e' value is a
+                list of model names. Please do not modify it, because it is
+                shared by everyone in this process.
+    '''
+    try:
+        schema, time_read = _PREDICTION_SCHEMA_CACHE['schema']
+        if time.time() - time_read < max_age:
+            return schema
+    except KeyError:
+        pass
+
+    with get_mongo_collection('catalog') as collection:
+        doc = collection['metadata'].find_one({'_id': PREDICTION_SCHEMA_ID})
+    if doc is None:
+        schema = update_prediction_schema()
+    else:
+        schema = {'adsorption_energy': doc.get('adsorption_energy', {}),
+                  'orr_onset_potential_4e': doc.get('orr_onset_potential_4e', [])}
+        _PREDICTION_SCHEMA_CACHE['schema'] = (schema, time.time())
+    return schema
+
+
+def update_prediction_schema():
+    '''
+    [Re]build the prediction schema document by scanning every prediction in
+    the catalog. This is a full collection scan, so you should only need it to
+    create the schema the first time or to repair it. Whatever writes new
+    predictions should call `register_predictions` instead.
+
+    Returns:
+        schema  The new prediction schema; see `get_prediction_schema`
+    '''
+    adsorption_pipeline = [{'$project': {'adsorbates': {'$objectToArray': '$predictions.adsorption_energy'}}},
+                           {'$unwind': '$adsorbates'},
+                           {'$project': {'adsorbate': '$adsorbates.k',
+                                         'models': {'$objectToArray': '$adsorbates.v'}}},
+                           {'$unwind': '$models'},
+                           {'$group': {'_id': '$adsorbate',
+                                       'models': {'$addToSet': '$models.k'}}}]
+    orr_pipeline = [{'$project': {'models': {'$objectToArray': '$predictions.orr_onset_potential_4e'}}},
+                    {'$unwind': '$models'},
+                    {'$group': {'_id': None,
+                                'models': {'$addToSet': '$models.k'}}}]
+
+    print('Building the prediction schema of the catalog...')
+    with get_mongo_collection('catalog') as collection:
+        adsorption_energy = {doc['_id']: sorted(doc['models'])
+                             for doc in collection.aggregate(adsorption_pipeline, allowDiskUse=True)}
+        orr_onset_potential_4e = sorted(model
+                                        for doc in collection.aggregate(orr_pipeline, allowDiskUse=True)
+                                        for model in doc['models'])
+
+        schema = {'adsorption_energy': adsorption_energy,
+                  'orr_onset_potential_4e': orr_onset_potential_4e}
+        collection['metadata'].replace_one({'_id': PREDICTION_SCHEMA_ID},
+                                           dict(schema, mtime=datetime.utcnow()),
+                                           upsert=True)
+
+    _PREDICTION_SCHEMA_CACHE['schema'] = (schema, time.time())
+    return schema
+
+
+def register_predictions(model, adsorbates=None, orr_onset_potential_4e=False):
+    '''
+    Whatever writes surrogate predictions into the catalog should call this
+    afterwards so that the prediction schema knows about them. Adding an
+    adsorbate/model that is already in the schema does nothing.
+
+    Args:
+        model                   A string indicating the name of the model
+                                that made the predictions
+        adsorbates              An iterable of strings indicating the
+                                adsorbates that `model` made adsorption energy
+                                predictions for
+        orr_onset_potential_4e  A Boolean indicating whether `model` made
+                                4-electron ORR onset potential predictions
+    '''
+    if adsorbates is None:
+        adsorbates = []
+    add_to_set = {'adsorption_energy.%s' % adsorbate: model for adsorbate in adsorbates}
+    if orr_onset_potential_4e:
+        add_to_set['orr_onset_potential_4e'] = model
+    if not add_to_set:
+        return
+
+    with get_mongo_collection('catalog') as collection:
+        result = collection['metadata'].update_one({'_id': PREDICTION_SCHEMA_ID},
+                                                   {'$addToSet': add_to_set,
+                                                    '$currentDate': {'mtime': True}})
+
+    # If there was no schema to add to, then build the whole thing. The scan
+    # will find these predictions as long as they were written first.
+    if result.matched_count == 0:
+        update_prediction_schema()
+    else:
+        _PREDICTION_SCHEMA_CACHE.clear()
+
+
 def get_unsimulated_catalog_docs(adsorbate,
                                  adsorbate_rotation_list=None,
-                                 vasp_settings=None):
+                                 vasp_settings=None,
+                                 server_side=True):
     '''
     Gets the same documents from `get_catalog_docs`, but then filters out all
     items that also show up in `get_adsorption_docs`, i.e., gets the catalog
@@ -388,17 +2275,204 @@ def get_unsimulated_catalog_docs(adsorbate,
                                 obtained (and modified, if necessary) from
                                 `gaspy.defaults.adslab_settings()['vasp']`. If
                                 `None`, then pulls default settings.
+        server_side             A Boolean indicating whether to find the
+                                unsimulated sites with a `$lookup` anti-join on
+                                the Mongo server (`True`) or by downloading and
+                                hashing both collections in Python (`False`).
+                                We fall back to hashing if the `catalog` and
+                                `adsorption` collections are not in the same
+                                database.
+    Returns:
+        docs    A list of dictionaries for various projection.
+    '''
+    docs = list(iter_unsimulated_catalog_docs(adsorbate=adsorbate,
+                                              adsorbate_rotation_list=adsorbate_rotation_list,
+                                              vasp_settings=vasp_settings,
+                                              server_side=server_side))
+    return docs
+
+
+def iter_unsimulated_catalog_docs(adsorbate,
+                                  adsorbate_rotation_list=None,
+                                  vasp_settings=None,
+                                  server_side=True,
+                                  batch_size=1000):
+    '''
+    Generator version of `get_unsimulated_catalog_docs`. When done on the
+    server side, only the unsimulated documents are ever sent to us.
+
+    Args:
+        adsorbate               A string of the adsorbate that you want to get
+                                documents for.
+        adsorbate_rotation_list A list of dictionaries with the 'psi', 'theta',
+                                and 'phi' keys whose values are the rotation of
+                                the adsorbate for the calculations you want to
+                                check for. If `None`, then we'll just check for
+                                the default rotation only.
+        vasp_settings           [optional] An OrderedDict containing the VASP
+                                settings of the calculations to check for. If
+                                `None`, then pulls default settings.
+        server_side             A Boolean indicating whether to use a
+                                `$lookup` anti-join on the Mongo server
+                                (`True`) or to hash in Python (`False`)
+        batch_size              An integer indicating how many documents Mongo
+                                should send us per network round trip
+    Yields:
+        doc     A catalog document, with an added 'adsorbate_rotation' key,
+                whose site has not yet been attempted
+    '''
+    # Python doesn't like mutable default arguments
+    if vasp_settings is None:
+        vasp_settings = defaults.adslab_settings()['vasp']
+    if adsorbate_rotation_list is None:
+        adsorbate_rotation_list = [defaults.adslab_settings()['rotation']]
+
+    if server_side and not _share_database('catalog_readonly', 'adsorption'):
+        warnings.warn('The catalog and adsorption collections are not in the '
+                      'same database, so we cannot use `$lookup` to find '
+                      'unsimulated sites. Falling back to hashing.', RuntimeWarning)
+        server_side = False
+    if not server_side:
+        yield from _get_unsimulated_catalog_docs_by_hash(adsorbate,
+                                                         adsorbate_rotation_list,
+                                                         vasp_settings)
+        return
+
+    adsorption_collection_name = read_rc('mongo_info.adsorption')['collection_name']
+    projection = defaults.catalog_projection()
+    for adsorbate_rotation in adsorbate_rotation_list:
+        pipeline = [{'$project': projection},
+                    _make_validation_match(projection.keys()),
+                    _make_attempted_sites_lookup(adsorption_collection_name,
+                                                 adsorbate,
+                                                 adsorbate_rotation,
+                                                 vasp_settings),
+                    {'$match': {'attempts': {'$size': 0}}},
+                    {'$project': {'attempts': 0}},
+                    {'$addFields': {'adsorbate_rotation': {'$literal': dict(adsorbate_rotation)}}}]
+        print('Now pulling unsimulated catalog documents for rotation %s...'
+              % dict(adsorbate_rotation))
+        yield from _iter_aggregated_docs('catalog_readonly', pipeline, batch_size)
+
+
+def _share_database(*collection_tags):
+    '''
+    Mongo can only do a `$lookup` between collections that are in the same
+    database. This function checks whether that's the case.
+
+    Arg:
+        collection_tags     The tags of the collections you want to check. See
+                            `get_mongo_collection` for examples.
+    Returns:
+        A Boolean indicating whether all the collections are on the same host,
+        port, and database.
+    '''
+    mongo_info = read_rc('mongo_info')
+    locations = {(mongo_info[tag]['host'], int(mongo_info[tag]['port']), mongo_info[tag]['database'])
+                 for tag in collection_tags}
+    return len(locations) == 1
+
+
+def _make_attempted_sites_lookup(adsorption_collection_name, adsorbate,
+                                 adsorbate_rotation, vasp_settings):
+    '''
+    Creates a `$lookup` stage that attaches, to each catalog document, the
+    adsorption documents that have already attempted that site. Sites are
+    matched with a normalized key: mpid, Miller index, and top/bottom must be
+    identical, while the shift and the coordinates of the site are compared
+    after rounding to two decimal places. The adsorbate, its rotation, and the
+    VASP settings are matched as plain filters so that Mongo can use indices
+    for them.
+
+    The identical parts of the key go into the first `$match` of the
+    sub-pipeline as `$eq` comparisons next to the plain filters, so that Mongo
+    can answer them with the ('adsorbate', 'mpid', 'miller', 'top') index in
+    `INDEXES` (Mongo 5.0 and newer use the whole index here; older versions
+    use its 'adsorbate' prefix). Only the handful of adsorption documents on
+    the same surface ever reach the rounded comparisons of the second
+    `$match`.
+
+    Args:
+        adsorption_collection_name  A string indicating the name of the
+                                    collection that holds the adsorption
+                                    documents
+        adsorbate                   A string indicating the adsorbate
+        adsorbate_rotation          A dictionary with the 'phi', 'theta', and
+                                    'psi' keys
+        vasp_settings               An OrderedDict containing the VASP
+                                    settings of the calculations to look for
+    Returns:
+        lookup  A dictionary that you can use as a stage in a Mongo pipeline.
+                It adds an 'attempts' key to each document, which is empty if
+                the site has not yet been attempted.
+    '''
+    filters = {'vasp_settings.%s' % setting: value
+               for setting, value in vasp_settings.items()}
+    filters['adsorbate'] = adsorbate
+    for angle, value in adsorbate_rotation.items():
+        filters['adsorbate_rotation.%s' % angle] = value
+
+    filters['$expr'] = {'$and': [{'$eq': ['$mpid', '$$mpid']},
+                                 {'$eq': ['$miller', '$$miller']},
+                                 {'$eq': ['$top', '$$top']}]}
+
+    site_matches = [{'$eq': [_make_rounding_expression('$shift'),
+                             _make_rounding_expression('$$shift')]}]
+    for i in range(3):
+        site_matches.append({'$eq': [_make_rounding_expression({'$arrayElemAt': ['$initial_adsorption_site', i]}),
+                                     _make_rounding_expression({'$arrayElemAt': ['$$site', i]})]})
+
+    lookup = {'$lookup': {'from': adsorption_collection_name,
+                          'let': {'mpid': '$mpid',
+                                  'miller': '$miller',
+                                  'shift': '$shift',
+                                  'top': '$top',
+                                  'site': '$adsorption_site'},
+                          'pipeline': [{'$match': filters},
+                                       {'$match': {'$expr': {'$and': site_matches}}},
+                                       {'$limit': 1},
+                                       {'$project': {'_id': 1}}],
+                          'as': 'attempts'}}
+    return lookup
+
+
+def _make_rounding_expression(expression, decimals=2):
+    '''
+    Older versions of Mongo do not have `$round`, so we round half-up with
+    `$mod` instead. Credit to Vince Browdren on Stack Exchange.
+
+    Args:
+        expression  A Mongo aggregation expression that evaluates to a number,
+                    e.g., '$shift'
+        decimals    An integer indicating how many decimal places to round to
+    Returns:
+        rounded_expression  A Mongo aggregation expression that evaluates to
+                            the rounded number
+    '''
+    increment = 10 ** -decimals
+    shifted = {'$add': [expression, increment / 2]}
+    rounded_expression = {'$subtract': [shifted, {'$mod': [shifted, increment]}]}
+    return rounded_expression
+
+
+def _get_unsimulated_catalog_docs_by_hash(adsorbate, adsorbate_rotation_list, vasp_settings):
+    '''
+    The original, client-side version of `get_unsimulated_catalog_docs`. It
+    downloads the whole catalog and all of the attempted adsorption documents,
+    and then it filters out matching documents by hashing them.
+
+    Args:
+        adsorbate               A string of the adsorbate that you want to get
+                                documents for.
+        adsorbate_rotation_list A list of dictionaries with the 'psi', 'theta',
+                                and 'phi' keys
+        vasp_settings           An OrderedDict containing the VASP settings of
+                                the calculations to check for
     Returns:
-        docs    A list of dictionaries for various projection.
+        docs    A list of the catalog documents that have not been attempted
     '''
-    # Python doesn't like mutable default arguments
-    if vasp_settings is None:
-        vasp_settings = defaults.adslab_settings()['vasp']
-    if adsorbate_rotation_list is None:
-        adsorbate_rotation_list = [defaults.adslab_settings()['rotation']]
-
     docs_catalog = get_catalog_docs()
-    docs_catalog_with_rotation = _duplicate_docs_per_rotations(docs_catalog, adsorbate_rotation_list)
+    docs_catalog_with_rotation = _iter_docs_per_rotations(docs_catalog, adsorbate_rotation_list)
     docs_simulated = _get_attempted_adsorption_docs(adsorbate=adsorbate,
                                                     vasp_settings=vasp_settings)
 
@@ -406,15 +2480,16 @@ def get_unsimulated_catalog_docs(adsorbate,
     # in the catalog has been simulated or not
     print('Hashing catalog documents...')
     catalog_dict = {}
-    for doc in tqdm(docs_catalog_with_rotation):
+    for doc in tqdm(docs_catalog_with_rotation, total=len(docs_catalog)*len(adsorbate_rotation_list)):
         hash_ = _hash_doc(doc, ignore_keys=['natoms'])
         catalog_dict[hash_] = doc
 
-    # Filter out simulated documents
+    # Filter out simulated documents. Only the survivors get turned from
+    # rotation views into real documents.
     for doc in docs_simulated:
         hash_ = _hash_doc(doc, ignore_keys=['adsorbate', 'energy'])
         catalog_dict.pop(hash_, None)
-    docs = list(catalog_dict.values())
+    docs = [doc.copy() for doc in catalog_dict.values()]
 
     return docs
 
@@ -428,6 +2503,10 @@ def _duplicate_docs_per_rotations(docs, adsorbate_rotation_list):
     documents have a structure identical to the one returned by
     `gaspy.gasdb.get_catalog_docs`.
 
+    The "copies" are `_RotatedDoc` views, so the parent documents are neither
+    copied nor modified. If you want to avoid making the list, too, then use
+    `_iter_docs_per_rotations`.
+
     Args:
         docs                        A list of dictionaries (documents)
         adsorbate_rotation_list     A list of dictionaries whose keys are
@@ -438,35 +2517,84 @@ def _duplicate_docs_per_rotations(docs, adsorbate_rotation_list):
                             rotations in the `adsorbate_rotation_list`
                             argument.
     '''
-    # If we have more than one rotation, we'll need to copy and parse the
-    # documents
-    if len(adsorbate_rotation_list) > 1:
-        docs_with_rotation = []
-        for i, adsorbate_rotation in enumerate(adsorbate_rotation_list):
-            print('Making catalog copy number %i of %i...'
-                  % (i+1, len(adsorbate_rotation_list)))
-            docs_copy = deepcopy(docs)  # To make sure we don't modify the parent docs
-            for doc in tqdm(docs_copy):
-                doc['adsorbate_rotation'] = adsorbate_rotation
-            docs_with_rotation += docs_copy
-        return docs_with_rotation
-
-    # If we have only one rotation, we just need to add it. No copying
-    # necessary.
-    else:
+    docs_with_rotation = list(_iter_docs_per_rotations(docs, adsorbate_rotation_list))
+    return docs_with_rotation
+
+
+def _iter_docs_per_rotations(docs, adsorbate_rotation_list):
+    '''
+    Generator version of `_duplicate_docs_per_rotations`. We loop over
+    `docs` once per rotation, so it needs to be a sequence and not a
+    one-shot iterator.
+
+    Args:
+        docs                        A sequence of dictionaries (documents)
+        adsorbate_rotation_list     A list of dictionaries whose keys are
+                                    'phi', 'theta', and 'psi'.
+    Yields:
+        doc     A `_RotatedDoc` view of each document for each rotation, in
+                the same order that `_duplicate_docs_per_rotations` uses
+    '''
+    for adsorbate_rotation in adsorbate_rotation_list:
         for doc in docs:
-            doc['adsorbate_rotation'] = adsorbate_rotation_list[0]
-        return docs
+            yield _RotatedDoc(doc, adsorbate_rotation)
+
+
+class _RotatedDoc(Mapping):
+    '''
+    A read-only view of a document with an 'adsorbate_rotation' key laid over
+    it. This lets us pair one document with many rotations without copying
+    the document for each one.
+
+    Args:
+        doc                 The dictionary (document) to wrap. It is not
+                            copied, so do not modify it while you are using
+                            the view.
+        adsorbate_rotation  A dictionary whose keys are 'phi', 'theta', and
+                            'psi'
+    '''
+    __slots__ = ('_doc', '_adsorbate_rotation')
+
+    def __init__(self, doc, adsorbate_rotation):
+        self._doc = doc
+        self._adsorbate_rotation = adsorbate_rotation
+
+    def __getitem__(self, key):
+        if key == 'adsorbate_rotation':
+            return self._adsorbate_rotation
+        return self._doc[key]
+
+    def __iter__(self):
+        for key in self._doc:
+            if key != 'adsorbate_rotation':
+                yield key
+        yield 'adsorbate_rotation'
+
+    def __len__(self):
+        return len(self._doc) + int('adsorbate_rotation' not in self._doc)
+
+    def __repr__(self):
+        return repr(self.copy())
+
+    def copy(self):
+        '''
+        Returns a shallow copy as a plain dictionary, just like `dict.copy`.
+        `_hash_doc` relies on this to get something that `json` can serialize.
+        '''
+        doc = dict(self._doc)
+        doc['adsorbate_rotation'] = self._adsorbate_rotation
+        return doc
 
 
-def _get_attempted_adsorption_docs(adsorbate, vasp_settings=None):
+def _get_attempted_adsorption_docs(adsorbate, vasp_settings=None, strict=False):
     '''
     A wrapper for `collection.aggregate` that is tailored specifically for the
     collection that's tagged `adsorption`. This differs from
     `get_adsorption_docs` in two ways:  1) it does not filter out "bad
     adsorptions" and 2) it takes projections based on initial configurations,
     not final, post-relaxation cofigurations. Thus this function finds
-    everything that we've attempted.
+    everything that we've attempted. This is a list-returning wrapper for
+    `_iter_attempted_adsorption_docs`.
 
     Args:
         adsorbate       A string indicating the adsorbate that you want to find
@@ -477,12 +2605,46 @@ def _get_attempted_adsorption_docs(adsorbate, vasp_settings=None):
                         should be obtained (and modified, if necessary) from
                         `gaspy.defaults.adslab_settings()['vasp']`. If `None`,
                         then pulls default settings.
+        strict          A Boolean indicating whether to validate the documents
+                        in Python with `_clean_up_aggregated_docs` (`True`)
+                        instead of on the Mongo server (`False`)
     Returns:
         cleaned_docs    A list of dictionaries whose key/value pairings are the
                         ones given by `gaspy.defaults.adsorption_projection`.
                         Each document represents a calculation that we have
                         tried.
     '''
+    cleaned_docs = list(_iter_attempted_adsorption_docs(adsorbate=adsorbate,
+                                                        vasp_settings=vasp_settings,
+                                                        strict=strict))
+    return cleaned_docs
+
+
+def _iter_attempted_adsorption_docs(adsorbate, vasp_settings=None,
+                                    batch_size=1000, chunked=False, strict=False):
+    '''
+    Generator version of `_get_attempted_adsorption_docs`.
+
+    Args:
+        adsorbate       A string indicating the adsorbate that you want to find
+                        the attempted calculations for.
+        vasp_settings   [optional] An OrderedDict containing the VASP settings
+                        of the calculations you want to find. If `None`, then
+                        pulls default settings.
+        batch_size      An integer indicating how many documents Mongo should
+                        send us per network round trip. If `chunked` is
+                        `True`, then this is also the size of the lists that
+                        we yield.
+        chunked         A Boolean indicating whether you want to get documents
+                        one at a time (`False`) or in lists of size
+                        `batch_size` (`True`).
+        strict          A Boolean indicating whether to validate the documents
+                        in Python with `_clean_up_aggregated_docs` (`True`)
+                        instead of on the Mongo server (`False`)
+    Yields:
+        doc     A dictionary representing a calculation that we have tried, or
+                a list of them if `chunked` is `True`
+    '''
     # Get only the documents that have the right calculation settings and
     # adsorbates
     if vasp_settings is None:
@@ -506,13 +2668,12 @@ def _get_attempted_adsorption_docs(adsorbate, vasp_settings=None):
 
     # Get the documents and clean them up
     pipeline = [match, project]
-    with get_mongo_collection(collection_tag='adsorption') as collection:
-        print('Now pulling adsorption documents for sites we have attempted...')
-        cursor = collection.aggregate(pipeline=pipeline, allowDiskUse=True)
-        docs = [doc for doc in tqdm(cursor)]
-    cleaned_docs = _clean_up_aggregated_docs(docs, expected_keys=projection.keys())
-
-    return cleaned_docs
+    if not strict:
+        pipeline.append(_make_validation_match(projection.keys()))
+    print('Now pulling adsorption documents for sites we have attempted...')
+    docs = _iter_aggregated_docs('adsorption', pipeline, batch_size)
+    cleaned_docs = _iter_validated_docs(docs, projection.keys(), strict)
+    yield from _maybe_chunk(cleaned_docs, batch_size, chunked)
 
 
 def _hash_doc(doc, ignore_keys=None, _return_hash=True):
@@ -552,7 +2713,8 @@ def _hash_doc(doc, ignore_keys=None, _return_hash=True):
         return serialized_doc
 
 
-def get_low_coverage_docs(adsorbate, model_tag=defaults.model()):
+def get_low_coverage_docs(adsorbate, model_tag=defaults.model(),
+                          docs_dft=None, docs_ml=None):
     '''
     Each surface has many possible adsorption sites. The site with the most
     negative adsorption energy (i.e., the strongest-binding site) will tend to
@@ -577,57 +2739,120 @@ def get_low_coverage_docs(adsorbate, model_tag=defaults.model()):
                     `predictions.adsorption_energy` key in the catalog
                     documents for valid inputs. Note that these keys are
                     created by the `GASpy_regressions` submodule.
+        docs_dft    [Optional] The documents from `get_low_coverage_dft_docs`
+                    (or their `index_low_coverage_docs` index), if you already
+                    have them. We pull them if you don't.
+        docs_ml     [Optional] The documents from `get_low_coverage_ml_docs`,
+                    if you already have them. We pull them if you don't.
+    Returns:
+        docs    A list of the low-coverage documents, one per surface, each
+                with a 'DFT_calculated' key indicating whether its energy came
+                from DFT (`True`) or from `model_tag` (`False`)
+    '''
+    if docs_dft is None:
+        docs_dft = _pull_low_coverage_docs(adsorbate, LOW_COVERAGE_DFT_TAG)
+    if docs_ml is None:
+        docs_ml = _pull_low_coverage_docs(adsorbate, model_tag)
+    docs = merge_low_coverage_docs(docs_dft, docs_ml)
+    return docs
+
+
+def get_low_coverage_docs_by_model(adsorbate, model_tags):
+    '''
+    Calls `get_low_coverage_docs` for several models, but only pulls and
+    indexes the DFT documents once.
+
+    Args:
+        adsorbate   A string indicating the adsorbate you want to get the
+                    low-coverage sites for, e.g., 'CO' or 'H'
+        model_tags  A sequence of strings indicating the models you want to
+                    use for the non-DFT, predicted energies
     Returns:
-        docs    A dictionary whose keys are 4-tuples of the MPID, Miller index,
-                shift, and top/bottom of a surface and whose values are the
-                aggregated documents we get from either `get_adsorption_docs`
-                or `get_catalog_docs`
+        docs_by_model   A dictionary whose keys are the model tags and whose
+                        values are the outputs of `get_low_coverage_docs`
+    '''
+    docs_dft = index_low_coverage_docs(_pull_low_coverage_docs(adsorbate, LOW_COVERAGE_DFT_TAG))
+    docs_by_model = {}
+    for model_tag in model_tags:
+        docs_ml = _pull_low_coverage_docs(adsorbate, model_tag)
+        docs_by_model[model_tag] = merge_low_coverage_docs(docs_dft, docs_ml)
+    return docs_by_model
+
+
+def merge_low_coverage_docs(docs_dft, docs_ml):
     '''
-    docs_dft = get_low_coverage_dft_docs(adsorbate=adsorbate)
-    docs_ml = get_low_coverage_ml_docs(adsorbate=adsorbate, model_tag=model_tag)
-    docs_dft_by_surface = {get_surface_from_doc(doc): doc for doc in docs_dft}
-    docs_ml_by_surface = {get_surface_from_doc(doc): doc for doc in docs_ml}
+    Merges low-coverage DFT documents with low-coverage ML documents in one
+    pass. For each surface, DFT supersedes ML if it either predicts a lower
+    energy or if both predict the same site to have the lowest energy.
+    Surfaces that only have DFT data are kept, too. This might happen because
+    we still have data from old versions of our catalog.
 
-    # For each ML-predicted surface, figure out if DFT supersedes it
-    docs_by_surface = deepcopy(docs_ml_by_surface)
-    for surface, doc_ml in docs_by_surface.items():
+    Neither of the input documents are modified, so you can reuse them (e.g.,
+    the DFT documents across different models).
 
+    Args:
+        docs_dft    An iterable of the documents from
+                    `get_low_coverage_dft_docs`, or the dictionary that
+                    `index_low_coverage_docs` makes out of them
+        docs_ml     An iterable of the documents from
+                    `get_low_coverage_ml_docs`
+    Returns:
+        docs    A list of the low-coverage documents, one per surface, each
+                with a 'DFT_calculated' key
+    '''
+    if not isinstance(docs_dft, Mapping):
+        docs_dft = index_low_coverage_docs(docs_dft)
+
+    docs_by_surface = {}
+    for doc_ml in docs_ml:
+        surface = get_surface_from_doc(doc_ml)
         try:
-            # If DFT predicts a lower energy, then DFT supersedes ML
-            doc_dft = docs_dft_by_surface[surface].copy()
-            if doc_dft['energy'] < doc_ml['energy']:
-                docs_by_surface[surface] = doc_dft
-                docs_by_surface[surface]['DFT_calculated'] = True
-
-            # If both DFT and ML predict the same site to have the lowest
-            # energy, then DFT supersedes ML.
+            doc_dft, dft_site = docs_dft[surface]
+            if doc_dft['energy'] < doc_ml['energy'] or dft_site == _get_site_from_doc(doc_ml):
+                docs_by_surface[surface] = dict(doc_dft, DFT_calculated=True)
             else:
-                ml_site_hash = _hash_doc(doc_ml, ignore_keys=['adsorption_site', 'natoms', 'predictions'])
-                dft_site_hash = _hash_doc(doc_dft, ignore_keys=['energy', 'adsorbate'])
-                if dft_site_hash == ml_site_hash:
-                    docs_by_surface[surface] = doc_dft.copy()
-                    docs_by_surface[surface]['DFT_calculated'] = True
-                else:
-                    docs_by_surface[surface]['DFT_calculated'] = False
+                docs_by_surface[surface] = dict(doc_ml, DFT_calculated=False)
 
         # EAFP in case we don't have any DFT data for a surface.
         except KeyError:
-            docs_by_surface[surface]['DFT_calculated'] = False
+            docs_by_surface[surface] = dict(doc_ml, DFT_calculated=False)
 
-    # If we somehow have a DFT site that is on a surface that's not even in our
-    # catalog, then just add it. This might happen because we still have data
-    # from old versions of our catalog.
-    surfaces_ml = set(docs_ml_by_surface.keys())
-    for surface, doc_dft in docs_dft_by_surface.items():
-        if surface not in surfaces_ml:
-            docs_by_surface[surface] = doc_dft
-            docs_by_surface[surface]['DFT_calculated'] = True
+    for surface, (doc_dft, _) in docs_dft.items():
+        if surface not in docs_by_surface:
+            docs_by_surface[surface] = dict(doc_dft, DFT_calculated=True)
 
     docs = list(docs_by_surface.values())
     return docs
 
 
-def get_low_coverage_dft_docs(adsorbate, filters=None):
+def index_low_coverage_docs(docs):
+    '''
+    Indexes low-coverage documents by surface so that `merge_low_coverage_docs`
+    does not have to recompute the surface and site of each one every time.
+
+    Arg:
+        docs    An iterable of documents from `get_low_coverage_dft_docs`
+    Returns:
+        index   A dictionary whose keys are the surfaces from
+                `get_surface_from_doc` and whose values are 2-tuples of the
+                document and its site from `_get_site_from_doc`
+    '''
+    index = {get_surface_from_doc(doc): (doc, _get_site_from_doc(doc)) for doc in docs}
+    return index
+
+
+def _get_site_from_doc(doc):
+    '''
+    Identifies a site within a surface by its coordination and the
+    coordinations of its neighbors. Combined with the output of
+    `get_surface_from_doc`, this is what we use to tell whether a DFT document
+    and an ML document are about the same site.
+    '''
+    site = (doc['coordination'], tuple(doc['neighborcoord']))
+    return site
+
+
+def get_low_coverage_dft_docs(adsorbate, filters=None, strict=False):
     '''
     This function is analogous to the `get_adsorption_docs` function, except it
     only returns documents that represent the low-coverage sites for each
@@ -650,12 +2875,45 @@ def get_low_coverage_dft_docs(adsorbate, filters=None):
                     filters from `gaspy.defaults.adsorption_filters`. If you
                     want to modify them, we suggest simply fetching that
                     object, modifying it, and then passing it here.
+        strict      A Boolean indicating whether to validate the documents in
+                    Python with `_clean_up_aggregated_docs` (`True`) instead of
+                    on the Mongo server (`False`)
     Returns:
         docs    A list of aggregated Mongo documents (i.e., dictionaries) from
                 our `adsorption` Mongo collection that happen to have the
                 lowest adsorption energy on their respective surfaces, as
                 defined by their (mpid, miller, shift, top) values.
     '''
+    cleaned_docs = list(iter_low_coverage_dft_docs(adsorbate=adsorbate,
+                                                   filters=filters,
+                                                   strict=strict))
+    return cleaned_docs
+
+
+def iter_low_coverage_dft_docs(adsorbate, filters=None,
+                               batch_size=1000, chunked=False, strict=False):
+    '''
+    Generator version of `get_low_coverage_dft_docs`.
+
+    Arg:
+        adsorbate   A string of the adsorbate that you want to get calculations
+                    for.
+        filters     A dictionary of Mongo matching commands. If this argument
+                    is `None`, then it will fetch the default filters from
+                    `gaspy.defaults.adsorption_filters`.
+        batch_size  An integer indicating how many documents Mongo should send
+                    us per network round trip. If `chunked` is `True`, then
+                    this is also the size of the lists that we yield.
+        chunked     A Boolean indicating whether you want to get documents one
+                    at a time (`False`) or in lists of size `batch_size`
+                    (`True`).
+        strict      A Boolean indicating whether to validate the documents in
+                    Python with `_clean_up_aggregated_docs` (`True`) instead of
+                    on the Mongo server (`False`)
+    Yields:
+        doc     An aggregated document of the lowest-energy site on a surface,
+                or a list of them if `chunked` is `True`
+    '''
     # Set the filtering criteria of the documents we'll be getting
     if filters is None:
         filters = defaults.adsorption_filters(adsorbate)
@@ -664,10 +2922,9 @@ def get_low_coverage_dft_docs(adsorbate, filters=None):
     match = {'$match': filters}
 
     # Get the standard document projection, then round the shift so that we can
-    # group more easily. Credit to Vince Browdren on Stack Exchange
+    # group more easily
     projections = defaults.adsorption_projection()
-    projections['shift'] = {'$subtract': [{'$add': ['$shift', 0.0049999999999999999]},
-                                          {'$mod': [{'$add': ['$shift', 0.0049999999999999999]}, 0.01]}]}
+    projections['shift'] = _make_rounding_expression('$shift', decimals=2)
     project = {'$project': projections}
 
     # Now order the documents so that the low-coverage sites come first (i.e.,
@@ -687,16 +2944,25 @@ def get_low_coverage_dft_docs(adsorbate, filters=None):
 
     # Pull the documents
     pipeline = [match, project, sort, group]
-    with get_mongo_collection(collection_tag='adsorption') as collection:
-        print('Now pulling low coverage adsorption documents...')
-        cursor = collection.aggregate(pipeline=pipeline, allowDiskUse=True)
-        docs = [doc for doc in tqdm(cursor)]
+    if not strict:
+        pipeline.append(_make_validation_match(projections.keys()))
+    print('Now pulling low coverage adsorption documents...')
+    docs = _iter_aggregated_docs('adsorption', pipeline, batch_size)
 
     # Clean and return the documents
-    for doc in docs:
-        del doc['_id']
-    cleaned_docs = _clean_up_aggregated_docs(docs, expected_keys=projections.keys())
-    return cleaned_docs
+    docs = (_pop_group_id(doc) for doc in docs)
+    cleaned_docs = _iter_validated_docs(docs, projections.keys(), strict)
+    yield from _maybe_chunk(cleaned_docs, batch_size, chunked)
+
+
+def _pop_group_id(doc):
+    '''
+    Documents that come out of a `$group` stage have an `_id` that holds the
+    grouping fields. We already have those fields in the document, so this
+    function removes the `_id` and then gives the document back.
+    '''
+    del doc['_id']
+    return doc
 
 
 def get_surface_from_doc(doc):
@@ -730,7 +2996,7 @@ def round_(n, decimals=0):
     return math.floor(n*multiplier + 0.5) / multiplier
 
 
-def get_low_coverage_ml_docs(adsorbate, model_tag=defaults.model()):
+def get_low_coverage_ml_docs(adsorbate, model_tag=defaults.model(), strict=False):
     '''
     This function is analogous to the `get_catalog_docs` function, except
     it only returns documents that represent the low-coverage sites for
@@ -744,21 +3010,16 @@ def get_low_coverage_ml_docs(adsorbate, model_tag=defaults.model()):
                     will *not* get structures with only one of the adsorbates.
         model_tag   A string indicating which model you want to use to predict
                     the adsorption energy.
+        strict      A Boolean indicating whether to validate the documents in
+                    Python with `_clean_up_aggregated_docs` (`True`) instead of
+                    on the Mongo server (`False`)
     Returns:
         docs    A list of aggregated Mongo documents (i.e., dictionaries) from
                 our `catalog` Mongo collection that happen to have the lowest
                 ML-predicted adsorption energy on their respective surfaces, as
                 defined by their (mpid, miller, shift, top) values.
     '''
-    # Get the standard document projection, then round the shift so that we can
-    # group more easily. Credit to Vince Browdren on Stack Exchange
-    projections = defaults.catalog_projection()
-    projections['shift'] = {'$subtract': [{'$add': ['$shift', 0.0049999999999999999]},
-                                          {'$mod': [{'$add': ['$shift', 0.0049999999999999999]}, 0.01]}]}
-
-    # Add the predictions
-    data_location = 'predictions.adsorption_energy.%s.%s' % (adsorbate, model_tag)
-    projections['energy'] = {'$arrayElemAt': [{'$arrayElemAt': ['$'+data_location, -1]}, 1]}
+    projections = _make_low_coverage_ml_projection(adsorbate, model_tag)
     project = {'$project': projections}
 
     # Now order the documents so that the low-coverage sites come first (i.e.,
@@ -778,45 +3039,621 @@ def get_low_coverage_ml_docs(adsorbate, model_tag=defaults.model()):
 
     # Get the documents
     pipeline = [project, sort, group]
-    with get_mongo_collection(collection_tag='catalog') as collection:
-        print('Now pulling low coverage catalog documents...')
-        cursor = collection.aggregate(pipeline=pipeline, allowDiskUse=True)
-        docs = [doc for doc in tqdm(cursor)]
+    if not strict:
+        pipeline.append(_make_validation_match(projections.keys()))
+    print('Now pulling low coverage catalog documents...')
+    docs = _iter_aggregated_docs('catalog', pipeline)
 
     # Clean the documents up
-    for doc in docs:
-        del doc['_id']
-    cleaned_docs = _clean_up_aggregated_docs(docs, expected_keys=projections.keys())
+    docs = (_pop_group_id(doc) for doc in docs)
+    cleaned_docs = list(_iter_validated_docs(docs, projections.keys(), strict))
     return cleaned_docs
 
 
-def purge_adslabs(fwids):
+def _make_low_coverage_ml_projection(adsorbate, model_tag):
+    '''
+    Makes the projection of the catalog that `get_low_coverage_ml_docs` uses,
+    i.e., the standard catalog projection with a rounded shift and with the
+    latest prediction of `model_tag` in the 'energy' key.
+    '''
+    # Get the standard document projection, then round the shift so that we can
+    # group more easily
+    projections = defaults.catalog_projection()
+    projections['shift'] = _make_rounding_expression('$shift', decimals=2)
+
+    # Add the predictions
+    data_location = 'predictions.adsorption_energy.%s.%s' % (adsorbate, model_tag)
+    projections['energy'] = {'$arrayElemAt': [{'$arrayElemAt': ['$'+data_location, -1]}, 1]}
+    return projections
+
+
+# The low-coverage documents of each (surface, adsorbate, source) live in a
+# `low_coverage` sub-collection of the catalog, where the source is either a
+# model tag or `LOW_COVERAGE_DFT_TAG`. The status document in the catalog's
+# `metadata` sub-collection says which (adsorbate, source) pairs are in there.
+LOW_COVERAGE_COLLECTION = 'low_coverage'
+LOW_COVERAGE_STATUS_ID = 'low_coverage'
+LOW_COVERAGE_DFT_TAG = 'DFT'
+
+
+def rebuild_low_coverage_collection(adsorbates=None, model_tags=None):
+    '''
+    [Re]build the `low_coverage` sub-collection of the catalog from scratch.
+    This runs the full `get_low_coverage_dft_docs` and
+    `get_low_coverage_ml_docs` aggregations for every adsorbate and model, so
+    you should only need it to create the collection the first time or to
+    recover it. After that, `update_low_coverage_dft_docs` and
+    `update_low_coverage_ml_docs` keep it up to date.
+
+    We build everything in a staging collection and then swap it in, so
+    readers never see a half-built collection.
+
+    Args:
+        adsorbates  [Optional] An iterable of strings indicating the
+                    adsorbates to build. Defaults to every adsorbate in the
+                    prediction schema.
+        model_tags  [Optional] An iterable of strings indicating the models to
+                    build. Defaults to every model that the prediction schema
+                    has for each adsorbate.
+    Returns:
+        sources     A dictionary whose keys are the adsorbates we built and
+                    whose values are lists of their sources (i.e., model tags
+                    and `LOW_COVERAGE_DFT_TAG`)
+    '''
+    schema = get_prediction_schema(max_age=0)
+    if adsorbates is None:
+        adsorbates = schema['adsorption_energy'].keys()
+
+    sources = {}
+    with get_mongo_collection('catalog') as collection:
+        staging_collection = collection[LOW_COVERAGE_COLLECTION + '_staging']
+        staging_collection.drop()
+
+        for adsorbate in adsorbates:
+            print('Building the low-coverage documents of %s...' % adsorbate)
+            docs = get_low_coverage_dft_docs(adsorbate=adsorbate)
+            _replace_low_coverage_docs(staging_collection, docs, adsorbate, LOW_COVERAGE_DFT_TAG)
+            sources[adsorbate] = [LOW_COVERAGE_DFT_TAG]
+
+            models = schema['adsorption_energy'].get(adsorbate, []) if model_tags is None else model_tags
+            for model_tag in models:
+                docs = get_low_coverage_ml_docs(adsorbate=adsorbate, model_tag=model_tag)
+                _replace_low_coverage_docs(staging_collection, docs, adsorbate, model_tag)
+                sources[adsorbate].append(model_tag)
+
+        staging_collection.create_index([('adsorbate', ASCENDING), ('source', ASCENDING)])
+        staging_collection.rename(collection[LOW_COVERAGE_COLLECTION].name, dropTarget=True)
+        collection['metadata'].replace_one({'_id': LOW_COVERAGE_STATUS_ID},
+                                           {'sources': sources, 'mtime': datetime.utcnow()},
+                                           upsert=True)
+    return sources
+
+
+def update_low_coverage_dft_docs(adsorption_ids):
+    '''
+    Incrementally updates the DFT half of the `low_coverage` collection with
+    new documents in the `adsorption` collection. Whatever writes new
+    adsorption documents should call this afterwards. This does nothing for
+    adsorbates that are not in the `low_coverage` collection.
+
+    Arg:
+        adsorption_ids  An iterable of the Mongo `_id`s of the new adsorption
+                        documents
+    Returns:
+        n_updated   An integer indicating how many surfaces got a new
+                    low-coverage site
+    '''
+    adsorption_ids = list(adsorption_ids)
+    sources = _get_low_coverage_sources()
+    with get_mongo_collection('adsorption') as collection:
+        adsorbates = collection.distinct('adsorbate', {'_id': {'$in': adsorption_ids}})
+
+    n_updated = 0
+    for adsorbate in adsorbates:
+        if LOW_COVERAGE_DFT_TAG not in sources.get(adsorbate, []):
+            continue
+
+        # Project the new documents just like `iter_low_coverage_dft_docs` does
+        filters = defaults.adsorption_filters(adsorbate)
+        filters['adsorbate'] = adsorbate
+        filters['_id'] = {'$in': adsorption_ids}
+        projections = defaults.adsorption_projection()
+        projections['shift'] = _make_rounding_expression('$shift', decimals=2)
+        pipeline = [{'$match': filters},
+                    {'$project': projections},
+                    _make_validation_match(projections.keys())]
+        with get_mongo_collection('adsorption') as collection:
+            docs = list(collection.aggregate(pipeline))
+        n_updated += _upsert_low_coverage_docs(docs, adsorbate, LOW_COVERAGE_DFT_TAG)
+    return n_updated
+
+
+def update_low_coverage_ml_docs(adsorbate, model_tag, catalog_ids=None):
+    '''
+    Updates the ML half of the `low_coverage` collection for one adsorbate and
+    model. Whatever writes new predictions into the catalog should call this
+    afterwards (along with `register_predictions`).
+
+    Incremental updates can only lower the energy of a surface's
+    low-coverage site. So if you re-predict sites that already had
+    predictions (e.g., with a retrained model), then call this without
+    `catalog_ids` to recompute the whole model.
+
+    Args:
+        adsorbate   A string indicating the adsorbate of the predictions
+        model_tag   A string indicating the model that made the predictions
+        catalog_ids [Optional] An iterable of the Mongo `_id`s of the catalog
+                    documents that got new predictions. If you pass this, then
+                    we only look at those documents, and we do nothing if this
+                    adsorbate and model are not in the `low_coverage`
+                    collection yet. If you do not pass this, then we
+                    recompute (or add) the adsorbate and model from scratch.
+                    Readers see the old documents until the new ones replace
+                    them; refer to `_refresh_low_coverage_docs`.
+    Returns:
+        n_updated   An integer indicating how many surfaces got a new
+                    low-coverage site
+    '''
+    if catalog_ids is None:
+        docs = get_low_coverage_ml_docs(adsorbate=adsorbate, model_tag=model_tag)
+        with get_mongo_collection('catalog') as collection:
+            _refresh_low_coverage_docs(collection[LOW_COVERAGE_COLLECTION],
+                                       docs, adsorbate, model_tag)
+            collection['metadata'].update_one({'_id': LOW_COVERAGE_STATUS_ID},
+                                              {'$addToSet': {'sources.%s' % adsorbate: model_tag},
+                                               '$currentDate': {'mtime': True}},
+                                              upsert=True)
+        return len(docs)
+
+    if model_tag not in _get_low_coverage_sources().get(adsorbate, []):
+        return 0
+    projections = _make_low_coverage_ml_projection(adsorbate, model_tag)
+    pipeline = [{'$match': {'_id': {'$in': list(catalog_ids)}}},
+                {'$project': projections},
+                _make_validation_match(projections.keys())]
+    with get_mongo_collection('catalog') as collection:
+        docs = list(collection.aggregate(pipeline))
+    n_updated = _upsert_low_coverage_docs(docs, adsorbate, model_tag)
+    return n_updated
+
+
+def _pull_low_coverage_docs(adsorbate, source):
+    '''
+    Gets the low-coverage documents of an adsorbate from the `low_coverage`
+    collection if they are in there. Otherwise, we aggregate them with
+    `get_low_coverage_dft_docs` or `get_low_coverage_ml_docs`.
+
+    Args:
+        adsorbate   A string indicating the adsorbate
+        source      A string indicating the model tag, or
+                    `LOW_COVERAGE_DFT_TAG` for DFT
+    Returns:
+        docs    A list of the low-coverage documents
+    '''
+    if source in _get_low_coverage_sources().get(adsorbate, []):
+        with get_mongo_collection('catalog') as collection:
+            cursor = collection[LOW_COVERAGE_COLLECTION].find({'adsorbate': adsorbate,
+                                                               'source': source},
+                                                              {'_id': 0, 'doc': 1})
+            docs = [doc['doc'] for doc in cursor]
+
+    elif source == LOW_COVERAGE_DFT_TAG:
+        docs = get_low_coverage_dft_docs(adsorbate=adsorbate)
+    else:
+        docs = get_low_coverage_ml_docs(adsorbate=adsorbate, model_tag=source)
+    return docs
+
+
+def _get_low_coverage_sources():
+    '''
+    Reads which adsorbates and sources are in the `low_coverage` collection.
+
+    Returns:
+        sources     A dictionary whose keys are adsorbates and whose values are
+                    lists of the model tags (and `LOW_COVERAGE_DFT_TAG`) that
+                    the `low_coverage` collection has for them. This is empty
+                    if we have not built the collection.
+    '''
+    with get_mongo_collection('catalog') as collection:
+        status = collection['metadata'].find_one({'_id': LOW_COVERAGE_STATUS_ID})
+    sources = status.get('sources', {}) if status is not None else {}
+    return sources
+
+
+def _make_low_coverage_id(doc, adsorbate, source):
+    '''
+    Makes the `_id` of a document in the `low_coverage` collection. Mongo
+    compares embedded documents field by field in order, so always make them
+    here.
+    '''
+    low_coverage_id = OrderedDict([('adsorbate', adsorbate),
+                                   ('source', source),
+                                   ('mpid', doc['mpid']),
+                                   ('miller', doc['miller']),
+                                   ('shift', doc['shift']),
+                                   ('top', doc['top'])])
+    return low_coverage_id
+
+
+def _replace_low_coverage_docs(collection, docs, adsorbate, source):
+    '''
+    Replaces all of the low-coverage documents of an adsorbate and source.
+
+    Args:
+        collection  The `low_coverage` collection (or its staging collection)
+        docs        A list of low-coverage documents, one per surface
+        adsorbate   A string indicating the adsorbate
+        source      A string indicating the model tag, or
+                    `LOW_COVERAGE_DFT_TAG` for DFT
+    '''
+    collection.delete_many({'adsorbate': adsorbate, 'source': source})
+    if docs:
+        collection.insert_many([{'_id': _make_low_coverage_id(doc, adsorbate, source),
+                                 'adsorbate': adsorbate,
+                                 'source': source,
+                                 'energy': doc['energy'],
+                                 'doc': doc}
+                                for doc in docs], ordered=False)
+
+
+def _refresh_low_coverage_docs(collection, docs, adsorbate, source):
+    '''
+    Replaces all of the low-coverage documents of an adsorbate and source
+    without ever leaving them empty. We overwrite (or add) the documents of
+    every surface first and then delete the documents of the surfaces that
+    are not in `docs` anymore, so readers always see either the old or the
+    new document of each surface.
+
+    Args:
+        collection  The `low_coverage` collection
+        docs        A list of low-coverage documents, one per surface
+        adsorbate   A string indicating the adsorbate
+        source      A string indicating the model tag, or
+                    `LOW_COVERAGE_DFT_TAG` for DFT
+    '''
+    # Everything we write now gets the same tag, so everything without it is
+    # stale
+    refresh_id = ObjectId()
+    replacements = [ReplaceOne({'_id': _make_low_coverage_id(doc, adsorbate, source)},
+                               {'adsorbate': adsorbate,
+                                'source': source,
+                                'energy': doc['energy'],
+                                'doc': doc,
+                                'refresh_id': refresh_id},
+                               upsert=True)
+                    for doc in docs]
+    if replacements:
+        collection.bulk_write(replacements, ordered=False)
+    collection.delete_many({'adsorbate': adsorbate,
+                            'source': source,
+                            'refresh_id': {'$ne': refresh_id}})
+
+
+def _upsert_low_coverage_docs(docs, adsorbate, source):
+    '''
+    Puts sites into the `low_coverage` collection if they have lower energies
+    than the sites that are already there for their surfaces. The comparison
+    happens on the Mongo server, so concurrent writers cannot overwrite a
+    lower energy with a higher one.
+
+    Args:
+        docs        An iterable of documents of sites, projected the same way
+                    the low-coverage documents are
+        adsorbate   A string indicating the adsorbate
+        source      A string indicating the model tag, or
+                    `LOW_COVERAGE_DFT_TAG` for DFT
+    Returns:
+        n_updated   An integer indicating how many surfaces got a new
+                    low-coverage site
+    '''
+    updates = [UpdateOne({'_id': _make_low_coverage_id(doc, adsorbate, source),
+                          'energy': {'$gt': doc['energy']}},
+                         {'$set': {'adsorbate': adsorbate,
+                                   'source': source,
+                                   'energy': doc['energy'],
+                                   'doc': doc}},
+                         upsert=True)
+               for doc in docs]
+    if not updates:
+        return 0
+
+    # If a surface already has a lower energy, then the filter does not match
+    # and the upsert collides with the existing `_id`. That just means there
+    # is nothing to do for that surface.
+    with get_mongo_collection('catalog') as collection:
+        try:
+            result = collection[LOW_COVERAGE_COLLECTION].bulk_write(updates, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as error:
+            details = error.details
+            if any(write_error['code'] != 11000 for write_error in details['writeErrors']):
+                raise
+    n_updated = details['nModified'] + details['nUpserted']
+    return n_updated
+
+
+# Normalized site documents (see `gaspy.mongo.make_site_doc_from_atoms`)
+# refer to the tiled slabs in this sub-collection of the catalog by `_id`
+SLABS_COLLECTION = 'slabs'
+
+
+def insert_slab_docs(slab_docs):
+    '''
+    Adds slab documents to the `slabs` sub-collection of our catalog, so that
+    anyone who reads the normalized site documents that refer to them can
+    rebuild the sites. Slabs that are already there are left alone.
+
+    Arg:
+        slab_docs   An iterable of documents made by
+                    `gaspy.mongo.make_doc_from_atoms` with '_id' fields from
+                    `gaspy.mongo.make_slab_id`
+    Returns:
+        n_inserted  An integer indicating how many new slabs we added
+    '''
+    updates = [UpdateOne({'_id': slab_doc['_id']},
+                         {'$setOnInsert': {key: value for key, value in slab_doc.items()
+                                           if key != '_id'}},
+                         upsert=True)
+               for slab_doc in slab_docs]
+    if len(updates) == 0:
+        return 0
+    with get_mongo_collection('catalog') as collection:
+        result = collection[SLABS_COLLECTION].bulk_write(updates, ordered=False)
+    return result.upserted_count
+
+
+def get_slab_docs(slab_ids):
+    '''
+    Gets slab documents from the `slabs` sub-collection of our catalog. You
+    normally do not need this, because `gaspy.mongo.make_atoms_from_doc` calls
+    it for you.
+
+    Arg:
+        slab_ids    An iterable of the '_id's of the slabs you want
+    Returns:
+        slab_docs   A list of the slab documents that we found
+    '''
+    with get_mongo_collection('catalog') as collection:
+        slab_docs = list(collection[SLABS_COLLECTION].find({'_id': {'$in': list(slab_ids)}}))
+    return slab_docs
+
+
+def purge_adslabs(fwids, batch_size=1000):
     '''
     This function will "purge" adsorption calculations from our database by
     removing it from our Mongo collections and defusing them within FireWorks.
+    It also removes the catalog's adsorption energy predictions for the sites
+    of the purged calculations so that they get re-predicted.
+
+    We do all of this in batches, so purging thousands of calculations takes
+    a handful of round trips per batch instead of several per calculation.
 
     Arg:
-        fwids   The FireWorks IDs of the calculations in question
+        fwids       The FireWorks IDs of the calculations in question
+        batch_size  An integer indicating how many calculations to purge per
+                    batch
+    Returns:
+        report  A dictionary with the counts of what we did under the keys
+                'n_defused', 'n_defused_individually', 'n_missing_fws',
+                'n_atoms_removed', 'n_adsorption_removed', and
+                'n_catalog_predictions_removed'. It also has a 'seconds' key
+                with how long everything took.
     '''
+    start = time.time()
+    fwids = list(fwids)
     lpad = get_launchpad()
+    report = dict.fromkeys(['n_defused', 'n_defused_individually',
+                            'n_missing_fws', 'n_atoms_removed',
+                            'n_adsorption_removed',
+                            'n_catalog_predictions_removed'], 0)
 
     print('Defusing FWs...')
-    for fwid in tqdm(fwids):
+    for batch in tqdm(list(_chunk(fwids, batch_size))):
+        n_defused, n_defused_individually, n_missing_fws = _bulk_defuse_fws(lpad, batch)
+        report['n_defused'] += n_defused
+        report['n_defused_individually'] += n_defused_individually
+        report['n_missing_fws'] += n_missing_fws
+
+    print('Removing FWs from atoms, adsorption, and catalog collections...')
+    for batch in tqdm(list(_chunk(fwids, batch_size))):
+        with get_mongo_collection('adsorption') as collection:
+            query = {'fwids.slab+adsorbate': {'$in': batch}}
+            projection = {'adsorbate': 1, 'mpid': 1, 'miller': 1,
+                          'shift': 1, 'top': 1, 'initial_adsorption_site': 1}
+            adsorption_docs = list(collection.find(query, projection))
+            report['n_adsorption_removed'] += collection.delete_many(query).deleted_count
+        with get_mongo_collection('atoms') as collection:
+            report['n_atoms_removed'] += collection.delete_many({'fwid': {'$in': batch}}).deleted_count
+        report['n_catalog_predictions_removed'] += _remove_catalog_predictions(adsorption_docs)
+        _refresh_low_coverage_dft_docs(adsorption_docs)
+
+    report['seconds'] = time.time() - start
+    print('Defused %i FWs in bulk and %i individually (%i were not in FireWorks); '
+          'removed %i atoms documents, %i adsorption documents, and the '
+          'predictions of %i catalog sites in %.1f seconds.'
+          % (report['n_defused'], report['n_defused_individually'],
+             report['n_missing_fws'], report['n_atoms_removed'],
+             report['n_adsorption_removed'],
+             report['n_catalog_predictions_removed'], report['seconds']))
+    return report
+
+
+# These are the FireWorks states that `LaunchPad.defuse_fw` can defuse
+# directly. FWs in any other state get rerun first.
+DEFUSABLE_FW_STATES = {'DEFUSED', 'WAITING', 'READY', 'FIZZLED', 'PAUSED'}
+
+
+def _bulk_defuse_fws(lpad, fwids):
+    '''
+    Does what `LaunchPad.defuse_fw` does, but for many FWs at once. If a FW is
+    not in one of the `DEFUSABLE_FW_STATES`, then `defuse_fw` reruns it first,
+    which archives its launches and unsets its recovery information. We do the
+    same here.
+
+    We only do this in bulk for unlocked, single-FW workflows without
+    duplicate finders (i.e., the ones GASpy makes), because those are the only
+    ones whose workflow state we can set without rebuilding the workflow. We
+    also skip FWs with `spec._exception_details`, because FireWorks decides
+    whether to keep those when it reruns. We hand everything else to
+    `LaunchPad.defuse_fw`, including the workflows that someone locked while
+    we were working.
+
+    Args:
+        lpad    A `fireworks.LaunchPad` instance
+        fwids   A list of integers indicating the FireWorks IDs to defuse
+    Returns:
+        n_defused               An integer indicating how many FWs we defused
+                                in bulk
+        n_defused_individually  An integer indicating how many FWs we had to
+                                hand to `LaunchPad.defuse_fw`
+        n_missing_fws           An integer indicating how many of the FWIDs
+                                we could not find in FireWorks
+    '''
+    now = datetime.utcnow()
+    fw_docs = list(lpad.fireworks.find({'fw_id': {'$in': fwids}},
+                                       {'fw_id': 1, 'state': 1, 'launches': 1,
+                                        'spec._dupefinder': 1,
+                                        'spec._exception_details': 1}))
+    wf_docs = lpad.workflows.find({'nodes': {'$in': fwids}}, {'nodes': 1, 'locked': 1})
+    simple_fwids = {wf_doc['nodes'][0] for wf_doc in wf_docs
+                    if len(wf_doc['nodes']) == 1 and not wf_doc.get('locked')}
+
+    # Defuse the FWs
+    fw_updates = []
+    bulk_fwids = []
+    individual_fwids = []
+    for doc in fw_docs:
+        fwid = doc['fw_id']
+        spec = doc.get('spec', {})
+        if (fwid not in simple_fwids or doc['state'] == 'ARCHIVED' or
+                '_dupefinder' in spec or '_exception_details' in spec):
+            individual_fwids.append(fwid)
+            continue
+
+        update = {'$set': {'state': 'DEFUSED', 'updated_on': now}}
+        if doc['state'] not in DEFUSABLE_FW_STATES:
+            update['$set']['launches'] = []
+            update['$addToSet'] = {'archived_launches': {'$each': doc['launches']}}
+            update['$unset'] = {'spec._recovery': ''}
+        fw_updates.append(UpdateOne({'fw_id': fwid, 'state': doc['state']}, update))
+        bulk_fwids.append(fwid)
+    if fw_updates:
+        lpad.fireworks.bulk_write(fw_updates, ordered=False)
+
+    # If something changed a FW's state while we were working, then we did
+    # not touch it. Leave those to FireWorks, and refresh the rest of the
+    # workflows the same way `LaunchPad._refresh_wf` would. We respect the
+    # `WFLock` of FireWorks by not touching locked workflows.
+    not_defused = {doc['fw_id'] for doc in lpad.fireworks.find({'fw_id': {'$in': bulk_fwids},
+                                                                 'state': {'$ne': 'DEFUSED'}},
+                                                                {'fw_id': 1})}
+    defused_fwids = [fwid for fwid in bulk_fwids if fwid not in not_defused]
+    wf_updates = [UpdateOne({'nodes': fwid, 'locked': {'$ne': True}},
+                            {'$set': {'state': 'DEFUSED',
+                                      'fw_states.%i' % fwid: 'DEFUSED',
+                                      'updated_on': now}})
+                  for fwid in defused_fwids]
+    if wf_updates:
+        result = lpad.workflows.bulk_write(wf_updates, ordered=False)
+
+        # If someone locked a workflow before we got to it, then its FW is
+        # defused but the workflow is not. `LaunchPad.defuse_fw` will wait for
+        # the lock and then refresh the workflow.
+        if result.matched_count < len(wf_updates):
+            locked_wf_docs = lpad.workflows.find({'nodes': {'$in': defused_fwids},
+                                                  'state': {'$ne': 'DEFUSED'}},
+                                                 {'nodes': 1})
+            not_defused.update(wf_doc['nodes'][0] for wf_doc in locked_wf_docs)
+    individual_fwids.extend(not_defused)
+    for fwid in individual_fwids:
         lpad.defuse_fw(fwid)
 
-    print('Removing FWs from atoms collection...')
-    with get_mongo_collection('atoms') as collection:
-        collection.delete_many({'fwid': {'$in': fwids}})
+    n_defused = len(set(bulk_fwids) - not_defused)
+    n_defused_individually = len(individual_fwids)
+    n_missing_fws = len(set(fwids) - {doc['fw_id'] for doc in fw_docs})
+    if n_missing_fws:
+        warnings.warn('Could not find %i of the FWs to defuse in FireWorks'
+                      % n_missing_fws, RuntimeWarning)
+    return n_defused, n_defused_individually, n_missing_fws
 
-    print('Removing FWs from adsorption collection...')
-    with get_mongo_collection('adsorption') as collection:
-        collection.delete_many({'fwids.slab+adsorbate': {'$in': fwids}})
+
+def _remove_catalog_predictions(adsorption_docs):
+    '''
+    Removes the adsorption energy predictions of the catalog sites that match
+    some adsorption documents. We match them the same way
+    `_InsertSitesToCatalog` looks for duplicate sites.
+
+    Arg:
+        adsorption_docs An iterable of documents from the `adsorption`
+                        collection with the 'adsorbate', 'mpid', 'miller',
+                        'shift', 'top', and 'initial_adsorption_site' keys
+    Returns:
+        n_modified  An integer indicating how many catalog documents we
+                    modified
+    '''
+    updates = []
+    for doc in adsorption_docs:
+        query = {'mpid': doc['mpid'],
+                 'miller': doc['miller'],
+                 'shift': {'$gt': doc['shift'] - 0.01,
+                           '$lt': doc['shift'] + 0.01},
+                 'top': doc['top']}
+        for i, coordinate in enumerate(doc['initial_adsorption_site']):
+            query['adsorption_site.%i' % i] = {'$gt': coordinate - 0.01,
+                                               '$lt': coordinate + 0.01}
+        data_location = 'predictions.adsorption_energy.%s' % doc['adsorbate']
+        query[data_location] = {'$exists': True}
+        updates.append(UpdateMany(query, {'$unset': {data_location: ''}}))
+
+    if not updates:
+        return 0
+    with get_mongo_collection('catalog') as collection:
+        result = collection.bulk_write(updates, ordered=False)
+    return result.modified_count
+
+
+def _refresh_low_coverage_dft_docs(adsorption_docs):
+    '''
+    If we removed the low-coverage site of a surface from the `adsorption`
+    collection, then the `low_coverage` collection needs to fall back to the
+    next-lowest site. This function removes the low-coverage documents that
+    came from removed adsorption documents and then re-aggregates their
+    surfaces.
+
+    Arg:
+        adsorption_docs An iterable of the removed documents from the
+                        `adsorption` collection with the '_id', 'adsorbate',
+                        'mpid', 'miller', and 'top' keys
+    '''
+    sources = _get_low_coverage_sources()
+    docs_by_adsorbate = {}
+    for doc in adsorption_docs:
+        if LOW_COVERAGE_DFT_TAG in sources.get(doc['adsorbate'], []):
+            docs_by_adsorbate.setdefault(doc['adsorbate'], []).append(doc)
+
+    for adsorbate, docs in docs_by_adsorbate.items():
+        with get_mongo_collection('catalog') as collection:
+            result = collection[LOW_COVERAGE_COLLECTION].delete_many(
+                {'adsorbate': adsorbate,
+                 'source': LOW_COVERAGE_DFT_TAG,
+                 'doc.mongo_id': {'$in': [doc['_id'] for doc in docs]}})
+        if result.deleted_count == 0:
+            continue
+
+        # Aggregate the surfaces (at every shift) of the removed documents
+        filters = defaults.adsorption_filters(adsorbate)
+        filters['$or'] = [{'mpid': doc['mpid'], 'miller': doc['miller'], 'top': doc['top']}
+                          for doc in docs]
+        new_docs = get_low_coverage_dft_docs(adsorbate=adsorbate, filters=filters)
+        _upsert_low_coverage_docs(new_docs, adsorbate, LOW_COVERAGE_DFT_TAG)
 
 
 def get_electrochemical_stability(mpid, pH, potential):
     '''
     A wrapper for pymatgen to construct Pourbaix amd calculate electrochemical
     stability under reaction condition (i.e. at a given pH and applied potential).
+    If you need the stabilities of many materials or conditions, then use
+    `get_electrochemical_stabilities` instead.
 
     Arg:
         mpid         Materials project ID of a bulk composition. e.g. Pt: 'mp-126'.
@@ -828,18 +3665,179 @@ def get_electrochemical_stability(mpid, pH, potential):
         stability    Electrochemical stability of a composition under reaction condition,
                      unit is eV/atom.
     '''
-    mpr = MPRester(read_rc('matproj_api_key'))
-    try:
-        entry = mpr.get_entries(mpid)[0]
-        composition = entry.composition
-        comp_dict = {str(key): value for key, value in composition.items()
-                     if key not in ELEMENTS_HO}
-        entries = mpr.get_pourbaix_entries(list(comp_dict.keys()))
-        entry = [entry for entry in entries if entry.entry_id == mpid][0]
-        pbx = PourbaixDiagram(entries, comp_dict=comp_dict, filter_solids=False)
-        stability = pbx.get_decomposition_energy(entry, pH=pH, V=potential)
-        stability = round(stability, 3)
-    # Some mpid's stability are not available
-    except IndexError:
-        stability = np.nan
+    stabilities = get_electrochemical_stabilities([mpid], [pH], [potential], processes=1)
+    stability = float(stabilities[mpid][0, 0])
     return stability
+
+
+def get_electrochemical_stabilities(mpids, pHs, potentials, processes=32):
+    '''
+    Calculates the electrochemical stabilities of many materials over a grid
+    of pH and applied potentials. We group the materials by composition so that
+    we only build each `PourbaixDiagram` once, and we cache the Pourbaix
+    entries and diagrams in the `pourbaix_entries` and `pourbaix_diagrams`
+    folders of our `gasdb_path`. Each process handles a different composition.
+
+    Args:
+        mpids       A sequence of Materials Project IDs, e.g., ['mp-126']
+        pHs         A sequence of floats indicating the pH values of the grid
+        potentials  A sequence of floats indicating the applied potentials of
+                    the grid
+        processes   The number of processes you want to be using
+    Returns:
+        stabilities A dictionary whose keys are the mpids and whose values are
+                    arrays with the shape `(len(pHs), len(potentials))` of the
+                    electrochemical stabilities [eV/atom] at each pH and
+                    potential. Materials whose stabilities are not available
+                    get arrays of `np.nan`.
+    '''
+    pHs = np.asarray(pHs, dtype=float)
+    potentials = np.asarray(potentials, dtype=float)
+
+    # Group the materials by the composition of their non-H/O elements
+    mpids_by_composition = {}
+    stabilities = {}
+    print('Grouping materials by composition...')
+    for mpid in tqdm(set(mpids)):
+        try:
+            stoich = get_stoich_from_mpid(mpid)
+        # Some mpid's stability are not available
+        except IndexError:
+            stabilities[mpid] = np.full((len(pHs), len(potentials)), np.nan)
+            continue
+        composition = _get_pourbaix_composition(stoich)
+        if not composition:
+            stabilities[mpid] = np.full((len(pHs), len(potentials)), np.nan)
+            continue
+        mpids_by_composition.setdefault(composition, []).append(mpid)
+
+    print('Calculating electrochemical stabilities...')
+    inputs = [(composition, composition_mpids, pHs, potentials)
+              for composition, composition_mpids in mpids_by_composition.items()]
+    processes = max(min(processes, len(inputs)), 1)
+    for composition_stabilities in multimap(_calculate_stabilities_for_composition,
+                                            inputs, processes=processes,
+                                            n_calcs=len(inputs)):
+        stabilities.update(composition_stabilities)
+    return stabilities
+
+
+def _get_pourbaix_composition(stoich):
+    '''
+    Turns a stoichiometry into the hashable, fractional composition of its
+    non-H/O elements, which is what identifies a `PourbaixDiagram`.
+
+    Arg:
+        stoich  A dictionary whose keys are elements and whose values are
+                their amounts, e.g., {'Ir': 1, 'O': 2}
+    Returns:
+        composition A tuple of 2-tuples whose elements are the element and
+                    its fraction, sorted by element, e.g., (('Ir', 1.),)
+    '''
+    # `ELEMENTS_HO` has pymatgen `Element`s, but our stoichiometries have
+    # strings
+    elements_ho = {str(element) for element in ELEMENTS_HO}
+    amounts = {element: amount for element, amount in stoich.items()
+               if str(element) not in elements_ho}
+    total = sum(amounts.values())
+    if total == 0:
+        return ()
+    composition = tuple((element, round(amount / total, 6))
+                        for element, amount in sorted(amounts.items()))
+    return composition
+
+
+def _calculate_stabilities_for_composition(inputs):
+    '''
+    Calculates the electrochemical stabilities of the materials that share a
+    composition. This is the function that `get_electrochemical_stabilities`
+    maps over.
+
+    Arg:
+        inputs  A 4-tuple whose elements are the composition (from
+                `_get_pourbaix_composition`), a list of the mpids with that
+                composition, and the arrays of pHs and potentials
+    Returns:
+        stabilities A dictionary whose keys are the mpids and whose values are
+                    arrays of their stabilities over the pH/potential grid
+    '''
+    composition, mpids, pHs, potentials = inputs
+    elements = [element for element, _ in composition]
+    pH_grid, potential_grid = np.meshgrid(pHs, potentials, indexing='ij')
+
+    entries = _get_pourbaix_entries(elements)
+    entries_by_id = {entry.entry_id: entry for entry in entries}
+    pbx = None
+    stabilities = {}
+    for mpid in mpids:
+        try:
+            entry = entries_by_id[mpid]
+        # Some mpid's stability are not available
+        except KeyError:
+            stabilities[mpid] = np.full(pH_grid.shape, np.nan)
+            continue
+        if pbx is None:
+            pbx = _get_pourbaix_diagram(entries, composition)
+        stability = pbx.get_decomposition_energy(entry, pH=pH_grid, V=potential_grid)
+        stabilities[mpid] = np.round(np.broadcast_to(stability, pH_grid.shape), 3)
+    return stabilities
+
+
+def _get_pourbaix_entries(elements):
+    '''
+    Gets the Pourbaix entries of a chemical system from the Materials Project,
+    or from our cache of them if we have already done so.
+
+    Arg:
+        elements    A sequence of strings indicating the non-H/O elements of
+                    the chemical system
+    Returns:
+        entries A list of `pymatgen.analysis.pourbaix_diagram.PourbaixEntry`
+                objects
+    '''
+    cache_name = read_rc('gasdb_path') + '/pourbaix_entries/' + '-'.join(sorted(elements)) + '.pkl'
+    try:
+        with open(cache_name, 'rb') as file_handle:
+            entries = pickle.load(file_handle)
+
+    except (FileNotFoundError, EOFError):
+        with MPRester(read_rc('matproj_api_key')) as rester:
+            entries = rester.get_pourbaix_entries(list(elements))
+        _dump_pourbaix_cache(entries, cache_name)
+    return entries
+
+
+def _get_pourbaix_diagram(entries, composition):
+    '''
+    Builds the `PourbaixDiagram` of a composition, or loads it from our cache
+    if we have already built it.
+
+    Args:
+        entries     The list of Pourbaix entries from `_get_pourbaix_entries`
+        composition The composition from `_get_pourbaix_composition`
+    Returns:
+        pbx     An instance of `pymatgen.analysis.pourbaix_diagram.PourbaixDiagram`
+    '''
+    composition_name = '_'.join('%s%s' % (element, fraction) for element, fraction in composition)
+    cache_name = read_rc('gasdb_path') + '/pourbaix_diagrams/' + composition_name + '.pkl'
+    try:
+        with open(cache_name, 'rb') as file_handle:
+            pbx = pickle.load(file_handle)
+
+    except (FileNotFoundError, EOFError):
+        pbx = PourbaixDiagram(entries, comp_dict=dict(composition), filter_solids=False)
+        _dump_pourbaix_cache(pbx, cache_name)
+    return pbx
+
+
+def _dump_pourbaix_cache(obj, cache_name):
+    '''
+    Pickles something into our Pourbaix caches. We write to a temporary file
+    first so that processes working on the same chemical system do not read
+    each other's half-written files.
+    '''
+    os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+    temp_name = '%s.%i.tmp' % (cache_name, os.getpid())
+    with open(temp_name, 'wb') as file_handle:
+        pickle.dump(obj, file_handle)
+    os.replace(temp_name, cache_name)
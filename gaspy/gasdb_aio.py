@@ -0,0 +1,116 @@
+'''
+asyncio versions of the pull functions in `gaspy.gasdb`, so that independent
+pulls (e.g., the adsorption documents of several adsorbates plus the surface
+documents) can run concurrently from one event loop. For example:
+
+    from gaspy import gasdb_aio
+
+    docs_co, docs_h, surface_docs = gasdb_aio.run_concurrently(
+        gasdb_aio.get_adsorption_docs('CO'),
+        gasdb_aio.get_adsorption_docs('H'),
+        gasdb_aio.get_surface_docs())
+
+If you are already inside an event loop (e.g., in a Jupyter notebook or a
+dashboard), then await the pulls directly instead:
+
+    docs_co, docs_h, surface_docs = await asyncio.gather(
+        gasdb_aio.get_adsorption_docs('CO'),
+        gasdb_aio.get_adsorption_docs('H'),
+        gasdb_aio.get_surface_docs())
+
+Each pull runs in a thread of a shared, bounded thread pool and uses the same
+pooled `MongoClient`s as `gaspy.gasdb`. Pulls beyond `MAX_CONCURRENCY` wait for
+a thread to free up.
+'''
+
+__author__ = 'Kevin Tran'
+__email__ = 'ktran@andrew.cmu.edu'
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from . import gasdb
+
+
+MAX_CONCURRENCY = 4
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def set_max_concurrency(max_concurrency):
+    '''
+    Changes how many pulls may run at the same time. Pulls that are already
+    running will finish in the old thread pool.
+
+    Arg:
+        max_concurrency An integer indicating the maximum number of pulls that
+                        may run at the same time
+    '''
+    global MAX_CONCURRENCY, _EXECUTOR
+    with _EXECUTOR_LOCK:
+        MAX_CONCURRENCY = max_concurrency
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False)
+            _EXECUTOR = None
+
+
+def _get_executor():
+    ''' Gets the shared thread pool, and makes it if we have not yet '''
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY,
+                                           thread_name_prefix='gasdb_aio')
+        return _EXECUTOR
+
+
+def _make_async(function):
+    '''
+    Turns one of the blocking `gaspy.gasdb` functions into a coroutine
+    function with the same arguments that runs it in our thread pool.
+    '''
+    @functools.wraps(function)
+    async def async_function(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(),
+                                          functools.partial(function, *args, **kwargs))
+    async_function.__doc__ = ('asyncio version of `gaspy.gasdb.%s`.\n\n%s'
+                              % (function.__name__, function.__doc__))
+    return async_function
+
+
+get_adsorption_docs = _make_async(gasdb.get_adsorption_docs)
+get_surface_docs = _make_async(gasdb.get_surface_docs)
+get_catalog_docs = _make_async(gasdb.get_catalog_docs)
+get_catalog_docs_with_predictions = _make_async(gasdb.get_catalog_docs_with_predictions)
+get_catalog_frame = _make_async(gasdb.get_catalog_frame)
+get_adsorption_frame = _make_async(gasdb.get_adsorption_frame)
+get_unsimulated_catalog_docs = _make_async(gasdb.get_unsimulated_catalog_docs)
+get_low_coverage_docs = _make_async(gasdb.get_low_coverage_docs)
+get_low_coverage_dft_docs = _make_async(gasdb.get_low_coverage_dft_docs)
+get_low_coverage_ml_docs = _make_async(gasdb.get_low_coverage_ml_docs)
+
+
+def run_concurrently(*coroutines):
+    '''
+    Runs coroutines (e.g., the pull functions in this module) concurrently and
+    waits for all of them. This starts (and then closes) its own event loop
+    with `asyncio.run`, so it is only for when you are not already inside an
+    event loop. If you are (e.g., in a Jupyter notebook, a dashboard, or
+    another coroutine), then use `await asyncio.gather(*coroutines)` instead.
+
+    Arg:
+        coroutines  The coroutines you want to run
+    Returns:
+        results     A list of whatever the coroutines returned, in the same
+                    order as the coroutines
+    '''
+    results = asyncio.run(_gather(*coroutines))
+    return results
+
+
+async def _gather(*coroutines):
+    ''' `asyncio.run` needs a coroutine, but `asyncio.gather` gives a future '''
+    results = await asyncio.gather(*coroutines)
+    return results
@@ -7,35 +7,172 @@ This module will be like the ase-db but different in the following ways:
 1. Booleans are stored as booleans.
 2. There is no numeric id.
 3. Tags are stored in an array.
+
+There are two versions of the `atoms` sub-document. Version 1 (which has no
+'version' key) stores every atom as its own dictionary. Version 2 stores each
+per-atom property as one flat array instead (e.g., 'numbers' and
+'positions'), and it leaves out the optional arrays that are all zero. We
+write version 2 and read both. Use
+`gaspy.tasks.db_managers.migrations.migrate_atoms_docs` to convert old
+documents.
+
+You can also call `use_binary_arrays` to store the positions, cells, and
+forces of new documents as BSON binary blobs instead of nested lists of
+floats. We read both.
+
+Documents of adsorption sites may also be "normalized", i.e., their `atoms`
+sub-documents have only the site's own atoms plus a 'slab' reference to a slab
+document that many sites share. Refer to `make_site_doc_from_atoms`.
+`make_atoms_from_doc` puts the two back together.
 '''
 
 __authors__ = ['John Kitchin', 'Kevin Tran']
 __email__ = 'ktran@andrew.cmu.edu'
 
 import os
+import hashlib
+import pickle
+import threading
+import weakref
 from collections import OrderedDict
 import datetime
 import json
+import zlib
+from collections.abc import Mapping
 import spglib
 import numpy as np
-from ase import Atoms, Atom
+from bson.binary import Binary
+from ase import Atoms
+from ase.data import atomic_numbers
 from ase.calculators.singlepoint import SinglePointCalculator
 from ase.io.jsonio import encode
 from ase.constraints import dict2constraint
+from .utils import multimap, read_rc
+
+
+ATOMS_DOC_VERSION = 2
+
+# The optional per-atom arrays of version 2 `atoms` sub-documents, and the
+# keys they had in the per-atom dictionaries of version 1. We only store these
+# if they have something other than zeros in them.
+OPTIONAL_ATOMS_ARRAYS = OrderedDict([('tags', 'tag'),
+                                     ('magmoms', 'magmom'),
+                                     ('charges', 'charge'),
+                                     ('momenta', 'momentum')])
+
+# Whether `make_doc_from_atoms` should store positions, cells, and forces as
+# BSON binary blobs, and how to compress them. Refer to `use_binary_arrays`.
+BINARY_ARRAY_SETTINGS = {'enabled': False, 'compression': None}
+BINARY_ARRAY_COMPRESSORS = {'zlib': (zlib.compress, zlib.decompress)}
+
+
+def use_binary_arrays(enabled=True, compression=None):
+    '''
+    Tells `make_doc_from_atoms` to store the positions, cells, and forces of
+    the documents it makes as BSON binary blobs (with their dtypes and shapes)
+    instead of as nested lists of floats. They take up less space and are
+    faster for Mongo to encode and decode. `make_atoms_from_doc` reads
+    documents either way.
+
+    Binary documents cannot be serialized as json, so do not use them as
+    Luigi parameters.
+
+    Args:
+        enabled     A Boolean indicating whether to use binary arrays
+        compression A string indicating how to compress the blobs, e.g.,
+                    'zlib'. `None` means no compression, which is the fastest
+                    to read.
+    '''
+    if compression is not None and compression not in BINARY_ARRAY_COMPRESSORS:
+        raise ValueError('"%s" is not a compression we know. Use one of %s.'
+                         % (compression, sorted(BINARY_ARRAY_COMPRESSORS)))
+    BINARY_ARRAY_SETTINGS['enabled'] = enabled
+    BINARY_ARRAY_SETTINGS['compression'] = compression
+
+
+def encode_array(array, compression=None):
+    '''
+    Turns an array into a sub-document with a BSON binary blob in it.
+
+    Args:
+        array       Anything `numpy.asarray` can read
+        compression A string indicating how to compress the blob, e.g.,
+                    'zlib'. `None` means no compression.
+    Returns:
+        encoded_array   A dictionary with the 'dtype', 'shape', and 'data' of
+                        the array, plus the 'compression' if there is one
+    '''
+    array = np.ascontiguousarray(array)
+    data = array.tobytes()
+    encoded_array = OrderedDict(dtype=array.dtype.str, shape=list(array.shape))
+    if compression is not None:
+        compress, _ = BINARY_ARRAY_COMPRESSORS[compression]
+        data = compress(data)
+        encoded_array['compression'] = compression
+    encoded_array['data'] = Binary(data)
+    return encoded_array
+
+
+def decode_array(value):
+    '''
+    The inversion function for `encode_array`. Uncompressed blobs are read
+    without copying them, so the arrays you get from them are read-only.
+
+    Arg:
+        value   A sub-document made by `encode_array`, or a (nested) list of
+                numbers from older documents
+    Returns:
+        array   A numpy array
+    '''
+    if not isinstance(value, Mapping):
+        return np.asarray(value)
 
+    data = value['data']
+    compression = value.get('compression')
+    if compression is not None:
+        _, decompress = BINARY_ARRAY_COMPRESSORS[compression]
+        data = decompress(data)
+    array = np.frombuffer(data, dtype=np.dtype(value['dtype']))
+    return array.reshape(value['shape'])
 
-def make_doc_from_atoms(atoms, **kwargs):
+
+def _maybe_encode_array(array, binary_arrays=None):
+    '''
+    Encodes an array with `encode_array` if we are using binary arrays, or
+    turns it into a (nested) list if we are not.
+
+    Args:
+        array           A numpy array
+        binary_arrays   A Boolean indicating whether to use binary arrays.
+                        `None` means we follow `BINARY_ARRAY_SETTINGS`.
+    '''
+    if binary_arrays is None:
+        binary_arrays = BINARY_ARRAY_SETTINGS['enabled']
+    if binary_arrays:
+        return encode_array(array, BINARY_ARRAY_SETTINGS['compression'])
+    return np.asarray(array).tolist()
+
+
+def make_doc_from_atoms(atoms, binary_arrays=None, compute_spacegroup=True, **kwargs):
     '''
     Creates a Mongo document (i.e., dictionary/json) for pushing into
     a Mongo collection.
 
     Args:
-        atoms   ase.Atoms object
-        kwargs  Key-value pairs that you want to add  to the document
-                in addition to what's normally added
+        atoms           ase.Atoms object
+        binary_arrays   A Boolean indicating whether to store the positions,
+                        cell, and forces as binary blobs. `None` means we
+                        follow `use_binary_arrays`.
+        compute_spacegroup  True to find the spacegroup of the atoms now,
+                            False to leave it out of the document, or 'lazy'
+                            to find it only if someone asks the `atoms`
+                            sub-document for it. Refer to
+                            `_make_columnar_atoms_dict`.
+        kwargs          Key-value pairs that you want to add  to the document
+                        in addition to what's normally added
     Returns:
         doc A dictionary with the standard subdocuments:
-            atoms       See the `make_atoms_dict` function.
+            atoms       See the `_make_columnar_atoms_dict` function.
             calculator  Generated by the `calculator.todict` method
             results     Some information that we automatically parse
                         out from relxations like energy, forces, and stress
@@ -47,9 +184,9 @@ def make_doc_from_atoms(atoms, **kwargs):
     '''
     doc = OrderedDict()
 
-    atoms_dict = OrderedDict(_make_atoms_dict(atoms))
+    atoms_dict = _make_columnar_atoms_dict(atoms, binary_arrays, compute_spacegroup)
     calc_dict = _make_calculator_dict(atoms)
-    results_dict = _make_results_dict(atoms)
+    results_dict = _make_results_dict(atoms, binary_arrays)
     doc.update({'atoms': atoms_dict})
     doc.update({'calc': calc_dict})
     doc.update({'results': results_dict})
@@ -65,7 +202,9 @@ def make_doc_from_atoms(atoms, **kwargs):
 
 def _make_atoms_dict(atoms):
     '''
-    Convert an ase.Atoms object into a dictionary for json storage.
+    Convert an ase.Atoms object into a version 1 dictionary for json storage,
+    i.e., with one sub-dictionary per atom. We only write version 2 now (see
+    `_make_columnar_atoms_dict`), but we keep this around for reference.
 
     Arg:
         atoms   ase.Atoms object
@@ -107,18 +246,266 @@ def _make_atoms_dict(atoms):
                                  info=atoms.info,
                                  constraints=[c.todict() for c in atoms.constraints])
 
-    # Redundant information for search convenience.
+    _add_search_fields(atoms_dict, atoms)
+    return json.loads(encode(atoms_dict))
+
+
+def _make_columnar_atoms_dict(atoms, binary_arrays=None, compute_spacegroup=True):
+    '''
+    Convert an ase.Atoms object into a version 2 dictionary for json storage.
+    Instead of one sub-dictionary per atom, we store each per-atom property as
+    one flat array, e.g., 'positions' is `[x0, y0, z0, x1, y1, z1, ...]`. The
+    'tags', 'magmoms', 'charges', and 'momenta' arrays are left out if they
+    are all zero.
+
+    Args:
+        atoms           ase.Atoms object
+        binary_arrays   A Boolean indicating whether to store the positions
+                        and cell as binary blobs. Refer to `encode_array`.
+        compute_spacegroup  True to add the 'spacegroup' now, False to leave
+                            it out, or 'lazy' to return a `LazySpacegroupDict`
+                            that finds it the first time you look it up. Mongo
+                            only gets the spacegroup of lazy dictionaries if
+                            someone looked it up before the insert.
+    Returns:
+        atoms_dict  A dictionary with various atoms information stored
+    '''
+    if isinstance(compute_spacegroup, str) and compute_spacegroup != 'lazy':
+        raise ValueError('compute_spacegroup should be True, False, or "lazy", '
+                         'not "%s"' % compute_spacegroup)
+
+    # Get the magnetic moments from the calculator of relaxed structures, and
+    # from the atoms themselves otherwise. Refer to `_make_atoms_dict`.
+    try:
+        magmoms = atoms.get_magnetic_moments()
+    except RuntimeError:
+        magmoms = atoms.get_initial_magnetic_moments()
+
+    if compute_spacegroup == 'lazy':
+        atoms_dict = LazySpacegroupDict(make_spglib_cell_from_atoms(atoms))
+    else:
+        atoms_dict = OrderedDict()
+    atoms_dict.update(version=ATOMS_DOC_VERSION,
+                      numbers=atoms.get_atomic_numbers().tolist(),
+                      positions=_maybe_encode_array(atoms.get_positions().ravel(), binary_arrays))
+    optional_arrays = OrderedDict([('tags', atoms.get_tags()),
+                                   ('magmoms', np.asarray(magmoms)),
+                                   ('charges', atoms.get_initial_charges()),
+                                   ('momenta', atoms.get_momenta())])
+    for key, values in optional_arrays.items():
+        if values.any():
+            atoms_dict[key] = values.ravel().tolist()
+
+    # Only the small, irregular things need to go through the json encoder
+    atoms_dict['cell'] = _maybe_encode_array(np.asarray(atoms.get_cell()), binary_arrays)
+    atoms_dict['pbc'] = np.asarray(atoms.pbc).tolist()
+    atoms_dict.update(json.loads(encode(OrderedDict(info=atoms.info,
+                                                    constraints=[c.todict() for c in atoms.constraints]))))
+
+    _add_search_fields(atoms_dict, atoms, compute_spacegroup not in (False, 'lazy'))
+    atoms_dict['mass'] = float(atoms_dict['mass'])
+    if 'volume' in atoms_dict:
+        atoms_dict['volume'] = float(atoms_dict['volume'])
+    return atoms_dict
+
+
+def _add_search_fields(atoms_dict, atoms, add_spacegroup=True):
+    '''
+    Adds redundant information to an `atoms` sub-document for search
+    convenience.
+
+    Args:
+        atoms_dict      The dictionary from `_make_atoms_dict` or
+                        `_make_columnar_atoms_dict`. We modify it in place.
+        atoms           The ase.Atoms object that the dictionary came from
+        add_spacegroup  A Boolean indicating whether to add the spacegroup
+    '''
     atoms_dict['natoms'] = len(atoms)
     cell = atoms.get_cell()
     atoms_dict['mass'] = sum(atoms.get_masses())
     syms = atoms.get_chemical_symbols()
-    atoms_dict['spacegroup'] = spglib.get_spacegroup(make_spglib_cell_from_atoms(atoms))
+    if add_spacegroup:
+        atoms_dict['spacegroup'] = get_spacegroup(make_spglib_cell_from_atoms(atoms))
     atoms_dict['chemical_symbols'] = list(set(syms))
     atoms_dict['symbol_counts'] = {sym: syms.count(sym) for sym in syms}
     if cell is not None and np.linalg.det(cell) > 0:
         atoms_dict['volume'] = atoms.get_volume()
 
-    return json.loads(encode(atoms_dict))
+
+class LazySpacegroupDict(OrderedDict):
+    '''
+    An `atoms` sub-document that finds its 'spacegroup' the first time you
+    look it up (with `[]` or `get`) instead of when it is made.
+
+    Arg:
+        spglib_cell The output of `make_spglib_cell_from_atoms` for the atoms
+                    of this sub-document
+    '''
+    def __init__(self, spglib_cell, *args, **kwargs):
+        self.spglib_cell = spglib_cell
+        super().__init__(*args, **kwargs)
+
+    def __missing__(self, key):
+        if key != 'spacegroup':
+            raise KeyError(key)
+        spacegroup = get_spacegroup(self.spglib_cell)
+        self['spacegroup'] = spacegroup
+        return spacegroup
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        return (type(self), (self.spglib_cell, list(self.items())))
+
+
+# Spacegroups that we already found. `_SPACEGROUP_CACHE` is an LRU whose keys
+# come from `_get_structure_key` and whose values are spacegroup strings.
+SPACEGROUP_CACHE_SETTINGS = {'max_entries': 4096, 'persistent': False}
+_SPACEGROUP_CACHE = OrderedDict()
+_SPACEGROUP_CACHE_LOCK = threading.Lock()
+
+
+def cache_spacegroups(max_entries=4096, persistent=False):
+    '''
+    Changes how we remember the spacegroups that `make_doc_from_atoms` finds.
+    Structures are matched exactly (i.e., by their lattice, scaled positions,
+    and atomic numbers), so the cache never changes the spacegroups we get.
+
+    Args:
+        max_entries An integer indicating how many spacegroups to keep in
+                    memory. We forget the least recently used ones first. Use
+                    0 to stop caching in memory.
+        persistent  A Boolean indicating whether to also keep every
+                    spacegroup in the `spacegroups` folder of our
+                    `gasdb_path`, so that other processes and sessions (e.g.,
+                    Luigi workers) can reuse them
+    '''
+    with _SPACEGROUP_CACHE_LOCK:
+        SPACEGROUP_CACHE_SETTINGS.update(max_entries=max_entries, persistent=persistent)
+        while len(_SPACEGROUP_CACHE) > max_entries:
+            _SPACEGROUP_CACHE.popitem(last=False)
+
+
+def clear_spacegroup_cache(persistent=False):
+    '''
+    Forgets every spacegroup we remembered.
+
+    Arg:
+        persistent  A Boolean indicating whether to delete the ones on disk,
+                    too
+    '''
+    with _SPACEGROUP_CACHE_LOCK:
+        _SPACEGROUP_CACHE.clear()
+    if persistent:
+        cache_folder = read_rc('gasdb_path') + '/spacegroups/'
+        for root, _, file_names in os.walk(cache_folder):
+            for file_name in file_names:
+                if file_name.endswith('.pkl'):
+                    os.remove(os.path.join(root, file_name))
+
+
+def get_spacegroup(spglib_cell):
+    '''
+    A cached version of `spglib.get_spacegroup`. Refer to `cache_spacegroups`.
+
+    Arg:
+        spglib_cell The output of `make_spglib_cell_from_atoms`
+    Returns:
+        spacegroup  The spacegroup string from spglib, e.g., 'Fm-3m (225)'
+    '''
+    key = _get_structure_key(spglib_cell)
+    with _SPACEGROUP_CACHE_LOCK:
+        try:
+            _SPACEGROUP_CACHE.move_to_end(key)
+            return _SPACEGROUP_CACHE[key]
+        except KeyError:
+            pass
+
+    persistent = SPACEGROUP_CACHE_SETTINGS['persistent']
+    try:
+        if not persistent:
+            raise FileNotFoundError
+        with open(_get_spacegroup_cache_name(key), 'rb') as file_handle:
+            spacegroup = pickle.load(file_handle)
+    except (FileNotFoundError, EOFError):
+        spacegroup = spglib.get_spacegroup(spglib_cell)
+        if persistent:
+            _dump_spacegroup(key, spacegroup)
+
+    with _SPACEGROUP_CACHE_LOCK:
+        if SPACEGROUP_CACHE_SETTINGS['max_entries'] > 0:
+            _SPACEGROUP_CACHE[key] = spacegroup
+            while len(_SPACEGROUP_CACHE) > SPACEGROUP_CACHE_SETTINGS['max_entries']:
+                _SPACEGROUP_CACHE.popitem(last=False)
+    return spacegroup
+
+
+def _get_structure_key(spglib_cell):
+    ''' Makes an exact hash of a structure from its spglib cell '''
+    hasher = hashlib.sha224()
+    for array, dtype in zip(spglib_cell, ['double', 'double', 'intc']):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        hasher.update(str(array.shape).encode())
+        hasher.update(array.tobytes())
+    return hasher.hexdigest()
+
+
+def _get_spacegroup_cache_name(key):
+    '''
+    Figures out where the on-disk spacegroup of a structure should go. We
+    shard them by the first two characters of their keys so that no one
+    folder gets too big.
+    '''
+    cache_name = read_rc('gasdb_path') + '/spacegroups/' + key[:2] + '/' + key + '.pkl'
+    return cache_name
+
+
+def _dump_spacegroup(key, spacegroup):
+    ''' Saves a spacegroup to disk atomically '''
+    cache_name = _get_spacegroup_cache_name(key)
+    os.makedirs(os.path.dirname(cache_name), exist_ok=True)
+    temp_name = '%s.%i.tmp' % (cache_name, os.getpid())
+    with open(temp_name, 'wb') as file_handle:
+        pickle.dump(spacegroup, file_handle)
+    os.replace(temp_name, cache_name)
+
+
+def convert_atoms_dict_to_columnar(atoms_dict):
+    '''
+    Converts a version 1 `atoms` sub-document into a version 2 one without
+    making an `ase.Atoms` object out of it, so the redundant search fields
+    (e.g., 'spacegroup') are kept as they are.
+
+    Arg:
+        atoms_dict  The 'atoms' value of a document made by
+                    `make_doc_from_atoms`. Version 2 sub-documents are given
+                    back as they are.
+    Returns:
+        new_atoms_dict  A version 2 `atoms` sub-document
+    '''
+    if atoms_dict.get('version', 1) >= 2:
+        return atoms_dict
+
+    atoms = atoms_dict['atoms']
+    new_atoms_dict = OrderedDict(version=ATOMS_DOC_VERSION,
+                                 numbers=[atomic_numbers[atom['symbol']] for atom in atoms],
+                                 positions=[coordinate for atom in atoms
+                                            for coordinate in atom['position']])
+    for key, atom_key in OPTIONAL_ATOMS_ARRAYS.items():
+        values = [atom[atom_key] for atom in atoms]
+        if key == 'momenta':
+            values = [component for momentum in values for component in momentum]
+        if any(values):
+            new_atoms_dict[key] = values
+
+    for key, value in atoms_dict.items():
+        if key != 'atoms':
+            new_atoms_dict[key] = value
+    return new_atoms_dict
 
 
 def make_spglib_cell_from_atoms(atoms):
@@ -174,12 +561,14 @@ def _make_calculator_dict(atoms):
     return calc_dict
 
 
-def _make_results_dict(atoms):
+def _make_results_dict(atoms, binary_arrays=None):
     '''
     Create a dictionary from an ase.Atoms' object's `calculator` attribute
 
-    Arg:
-        atoms   ase.Atoms object
+    Args:
+        atoms           ase.Atoms object
+        binary_arrays   A Boolean indicating whether to store the forces as a
+                        binary blob. Refer to `encode_array`.
     Returns:
         results_dict    A dictionary with various calculator information stored.
                         Returns an empty dictionary if there is no calculator.
@@ -196,7 +585,7 @@ def _make_results_dict(atoms):
 
         if not calculator.calculation_required(atoms, ['forces']):
             forces = atoms.get_forces(apply_constraint=False)
-            results_dict['forces'] = forces.tolist()
+            results_dict['forces'] = _maybe_encode_array(forces, binary_arrays)
 
             # fmax will be the max force component w/ constraints applied
             results_dict['fmax'] = max(np.abs(atoms.get_forces().flatten()))
@@ -208,7 +597,7 @@ def make_atoms_from_doc(doc):
     '''
     This is the inversion function for `make_doc_from_atoms`; it takes
     Mongo documents created by that function and turns them back into
-    an ase.Atoms object.
+    an ase.Atoms object. It reads both versions of the `atoms` sub-document.
 
     Args:
         doc     Dictionary/json/Mongo document created by the
@@ -216,22 +605,360 @@ def make_atoms_from_doc(doc):
     Returns:
         atoms   ase.Atoms object with an ase.SinglePointCalculator attached
     '''
-    atoms = Atoms([Atom(atom['symbol'],
-                        atom['position'],
-                        tag=atom['tag'],
-                        momentum=atom['momentum'],
-                        magmom=atom['magmom'],
-                        charge=atom['charge'])
-                   for atom in doc['atoms']['atoms']],
-                  cell=doc['atoms']['cell'],
-                  pbc=doc['atoms']['pbc'],
-                  info=doc['atoms']['info'],
-                  constraint=[dict2constraint(constraint_dict)
-                              for constraint_dict in doc['atoms']['constraints']])
+    doc = _resolve_slab_reference(doc)
+    constraints = [dict2constraint(constraint_dict)
+                   for constraint_dict in doc['atoms']['constraints']]
+    return _make_atoms_from_doc(doc, constraints)
+
+
+def make_atoms_from_docs(docs, processes=1, chunksize=100):
+    '''
+    The batch version of `make_atoms_from_doc`. It can turn the documents into
+    atoms in parallel.
+
+    Args:
+        docs        An iterable of documents created by the
+                    `make_doc_from_atoms` function
+        processes   An integer indicating how many processes you want to use
+        chunksize   An integer indicating how many documents each process
+                    should turn into atoms at a time
+    Returns:
+        atoms_list  A list of ase.Atoms objects with ase.SinglePointCalculators
+                    attached, in the same order as the documents
+    '''
+    docs = list(docs)
+
+    # Find all the missing slabs at once instead of one site at a time, and
+    # before we fork any processes so that they get the slabs, too
+    slab_ids = {doc['atoms']['slab'] for doc in docs if 'slab' in doc['atoms']}
+    missing_slab_ids = set()
+    for slab_id in slab_ids:
+        try:
+            _get_registered_slab_doc(slab_id)
+        except KeyError:
+            missing_slab_ids.add(slab_id)
+    if len(missing_slab_ids) > 0:
+        _fetch_slab_docs(missing_slab_ids)
+
+    if processes == 1 or len(docs) <= chunksize:
+        return _make_atoms_from_doc_chunk(docs)
+
+    chunks = [docs[i:i+chunksize] for i in range(0, len(docs), chunksize)]
+    atoms_lists = multimap(_make_atoms_from_doc_chunk, chunks,
+                           processes=processes, n_calcs=len(chunks))
+    atoms_list = [atoms for atoms_chunk in atoms_lists for atoms in atoms_chunk]
+    return atoms_list
+
+
+def _make_atoms_from_doc_chunk(docs):
+    '''
+    Turns a list of documents into atoms. Each atoms object gets its own
+    constraints, because ASE modifies them in place (e.g., when you delete
+    atoms).
+
+    Arg:
+        docs    A list of documents created by the `make_doc_from_atoms`
+                function
+    Returns:
+        atoms_list  A list of ase.Atoms objects with
+                    ase.SinglePointCalculators attached
+    '''
+    atoms_list = []
+    for doc in docs:
+        doc = _resolve_slab_reference(doc)
+        constraints = [dict2constraint(constraint_dict)
+                       for constraint_dict in doc['atoms']['constraints']]
+        atoms = _make_atoms_from_doc(doc, constraints)
+        atoms_list.append(atoms)
+    return atoms_list
+
+
+def _make_atoms_from_doc(doc, constraints):
+    '''
+    Builds an ase.Atoms object straight from the arrays of a document instead
+    of from one ase.Atom object at a time.
+
+    Args:
+        doc         Dictionary/json/Mongo document created by the
+                    `make_doc_from_atoms` function
+        constraints A list of the ASE constraints to put on the atoms. They
+                    should not be shared with any other atoms.
+    Returns:
+        atoms   ase.Atoms object with an ase.SinglePointCalculator attached
+    '''
+    atoms_dict = doc['atoms']
+
+    if atoms_dict.get('version', 1) >= 2:
+        natoms = len(atoms_dict['numbers'])
+        numbers = atoms_dict['numbers']
+        positions = np.reshape(decode_array(atoms_dict['positions']), (natoms, 3))
+        tags = atoms_dict.get('tags')
+        momenta = atoms_dict.get('momenta')
+        if momenta is not None:
+            momenta = np.reshape(momenta, (natoms, 3))
+        magmoms = atoms_dict.get('magmoms')
+        charges = atoms_dict.get('charges')
+
+    # Version 1 documents have all of the arrays, so we set all of them (even
+    # the zeros) to get the same atoms as we used to from `ase.Atom` objects
+    else:
+        atom_dicts = atoms_dict['atoms']
+        numbers = [atomic_numbers[atom['symbol']] for atom in atom_dicts]
+        positions = [atom['position'] for atom in atom_dicts]
+        tags = [atom['tag'] for atom in atom_dicts]
+        momenta = [atom['momentum'] for atom in atom_dicts]
+        magmoms = [atom['magmom'] for atom in atom_dicts]
+        charges = [atom['charge'] for atom in atom_dicts]
+
+    atoms = Atoms(numbers=numbers,
+                  positions=positions,
+                  tags=tags,
+                  momenta=momenta,
+                  magmoms=magmoms,
+                  charges=charges,
+                  cell=decode_array(atoms_dict['cell']),
+                  pbc=atoms_dict['pbc'],
+                  info=atoms_dict['info'],
+                  constraint=constraints)
+
     results = doc['results']
+    forces = results.get('forces', None)
+    if forces is not None:
+        forces = decode_array(forces)
     calc = SinglePointCalculator(energy=results.get('energy', None),
-                                 forces=results.get('forces', None),
+                                 forces=forces,
                                  stress=results.get('stress', None),
                                  atoms=atoms)
     atoms.set_calculator(calc)
     return atoms
+
+
+# The slab documents that normalized site documents refer to, keyed by their
+# IDs from `make_slab_id`. `_SLAB_DOCS` is an LRU of the slabs that we
+# registered or pulled from Mongo. The slabs of each `SiteDocs` list can also
+# be found through `_LIVE_SITE_DOCS` for as long as that list is around.
+SLAB_CACHE_SETTINGS = {'max_entries': 1024}
+_SLAB_DOCS = OrderedDict()
+_SLAB_DOCS_LOCK = threading.Lock()
+_LIVE_SITE_DOCS = weakref.WeakValueDictionary()
+
+
+def cache_slab_docs(max_entries=1024):
+    '''
+    Changes how many slab documents we remember outside of `SiteDocs` lists.
+    Slabs that we forget are pulled from the catalog again when we need them.
+
+    Arg:
+        max_entries An integer indicating how many slab documents to keep in
+                    memory. We forget the least recently used ones first.
+    '''
+    with _SLAB_DOCS_LOCK:
+        SLAB_CACHE_SETTINGS['max_entries'] = max_entries
+        while len(_SLAB_DOCS) > max_entries:
+            _SLAB_DOCS.popitem(last=False)
+
+
+def make_slab_id(mpid, miller, shift, top, slab_repeat, settings):
+    '''
+    Makes the ID of a tiled slab, which normalized site documents use to refer
+    to it.
+
+    Args:
+        mpid        A string indicating the Materials Project ID of the bulk
+        miller      A sequence of the three Miller indices of the slab
+        shift       A float indicating the shift of the slab
+        top         A Boolean indicating whether the slab is facing up
+        slab_repeat A 2-tuple of integers indicating how many times the slab
+                    was tiled in the x and y directions
+        settings    A dictionary of the settings that the slab was made with,
+                    e.g., `min_xy` and `slab_generator_settings`
+    Returns:
+        slab_id     A string that is the same for the same slabs
+    '''
+    identity = [mpid,
+                [int(index) for index in miller],
+                round(float(shift), 4),
+                bool(top),
+                [int(repeat) for repeat in slab_repeat],
+                settings]
+    slab_id = hashlib.sha224(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+    return slab_id
+
+
+def make_site_doc_from_atoms(site_atoms, slab_doc, **kwargs):
+    '''
+    Makes a normalized site document, i.e., a document whose `atoms`
+    sub-document has only the atoms of the site (e.g., our uranium marker)
+    and a reference to a shared slab document. `make_atoms_from_doc` turns it
+    into the slab plus the site's atoms, just like a document made by
+    `make_doc_from_atoms` from the whole adslab.
+
+    Of the redundant search fields, the `atoms` sub-document only gets
+    'natoms'. The rest belong to the slab document.
+
+    Args:
+        site_atoms  ase.Atoms object of the atoms to put on the slab. Their
+                    cell, constraints, and so on are ignored.
+        slab_doc    A document made by `make_doc_from_atoms` for the slab
+                    with an '_id' from `make_slab_id`. We remember it, so that
+                    `make_atoms_from_doc` can find it.
+        kwargs      Key-value pairs that you want to add  to the document
+                    in addition to what's normally added
+    Returns:
+        doc     A normalized site document
+    '''
+    register_slab_docs([slab_doc])
+
+    atoms_dict = OrderedDict(version=ATOMS_DOC_VERSION,
+                             slab=slab_doc['_id'],
+                             numbers=site_atoms.get_atomic_numbers().tolist(),
+                             positions=site_atoms.get_positions().ravel().tolist())
+    tags = site_atoms.get_tags()
+    if tags.any():
+        atoms_dict['tags'] = tags.tolist()
+    atoms_dict['natoms'] = slab_doc['atoms']['natoms'] + len(site_atoms)
+
+    doc = OrderedDict(atoms=atoms_dict,
+                      calc=_make_calculator_dict(site_atoms),
+                      results=_make_results_dict(site_atoms))
+    doc['user'] = os.getenv('USER')
+    doc['ctime'] = datetime.datetime.utcnow()
+    doc['mtime'] = datetime.datetime.utcnow()
+    doc.update(kwargs)
+    return doc
+
+
+class SiteDocs(list):
+    '''
+    A list of site documents that also carries the slab documents that they
+    refer to, so that pickles of normalized site documents (e.g., Luigi task
+    outputs) store each slab only once and are still complete.
+    `make_atoms_from_doc` can find the slabs of every `SiteDocs` list that is
+    still in memory, no matter how many slabs `register_slab_docs` remembers.
+
+    Args:
+        docs        An iterable of site documents
+        slab_docs   A dictionary of the slab documents that the site documents
+                    refer to, keyed by their IDs
+    '''
+    def __init__(self, docs=(), slab_docs=None):
+        super().__init__(docs)
+        self.slab_docs = dict(slab_docs or {})
+        _LIVE_SITE_DOCS[id(self)] = self
+
+    def __reduce__(self):
+        return (type(self), (list(self), self.slab_docs))
+
+
+def register_slab_docs(slab_docs):
+    '''
+    Remembers slab documents so that `make_atoms_from_doc` can use them to
+    rebuild the site documents that refer to them. We only remember the
+    `SLAB_CACHE_SETTINGS['max_entries']` most recently used ones; refer to
+    `cache_slab_docs`.
+
+    Arg:
+        slab_docs   An iterable of documents made by `make_doc_from_atoms`
+                    with '_id' fields from `make_slab_id`
+    '''
+    with _SLAB_DOCS_LOCK:
+        for slab_doc in slab_docs:
+            _SLAB_DOCS[slab_doc['_id']] = slab_doc
+            _SLAB_DOCS.move_to_end(slab_doc['_id'])
+        while len(_SLAB_DOCS) > SLAB_CACHE_SETTINGS['max_entries']:
+            _SLAB_DOCS.popitem(last=False)
+
+
+def get_slab_doc(slab_id):
+    '''
+    Finds the slab document that site documents refer to, first in memory and
+    then in the `slabs` sub-collection of our catalog.
+
+    Arg:
+        slab_id     A string made by `make_slab_id`
+    Returns:
+        slab_doc    The document of the slab
+    '''
+    try:
+        return _get_registered_slab_doc(slab_id)
+    except KeyError:
+        pass
+
+    _fetch_slab_docs([slab_id])
+    try:
+        return _get_registered_slab_doc(slab_id)
+    except KeyError:
+        raise KeyError('We could not find the slab %s in memory or in the '
+                       'catalog. Did you insert it with '
+                       '`gaspy.gasdb.insert_slab_docs`?' % slab_id) from None
+
+
+def _get_registered_slab_doc(slab_id):
+    '''
+    Finds a slab document in memory, i.e., in our LRU or in a `SiteDocs` list.
+    Raises a `KeyError` if we do not have it.
+    '''
+    with _SLAB_DOCS_LOCK:
+        try:
+            _SLAB_DOCS.move_to_end(slab_id)
+            return _SLAB_DOCS[slab_id]
+        except KeyError:
+            pass
+
+    for site_docs in list(_LIVE_SITE_DOCS.values()):
+        try:
+            return site_docs.slab_docs[slab_id]
+        except KeyError:
+            pass
+    raise KeyError(slab_id)
+
+
+def _fetch_slab_docs(slab_ids):
+    ''' Pulls slab documents from Mongo and registers them '''
+    # Local import, because `gasdb` needs a lot more than we do and this is
+    # the only place we need Mongo
+    from .gasdb import get_slab_docs
+    register_slab_docs(get_slab_docs(slab_ids))
+
+
+def _resolve_slab_reference(doc):
+    '''
+    If a document is a normalized site document, then this gives you a copy
+    whose `atoms` sub-document has the slab in it, too.
+
+    Arg:
+        doc     A document made by `make_doc_from_atoms` or
+                `make_site_doc_from_atoms`
+    Returns:
+        doc     A document that `_make_atoms_from_doc` can read
+    '''
+    site_atoms_dict = doc['atoms']
+    try:
+        slab_id = site_atoms_dict['slab']
+    except KeyError:
+        return doc
+
+    slab_atoms_dict = get_slab_doc(slab_id)['atoms']
+    if slab_atoms_dict.get('version', 1) < 2:
+        slab_atoms_dict = convert_atoms_dict_to_columnar(slab_atoms_dict)
+    n_slab_atoms = len(slab_atoms_dict['numbers'])
+    n_site_atoms = len(site_atoms_dict['numbers'])
+
+    atoms_dict = OrderedDict(slab_atoms_dict)
+    atoms_dict['numbers'] = list(slab_atoms_dict['numbers']) + list(site_atoms_dict['numbers'])
+    atoms_dict['positions'] = np.concatenate([np.ravel(decode_array(slab_atoms_dict['positions'])),
+                                              np.ravel(decode_array(site_atoms_dict['positions']))])
+    for key in OPTIONAL_ATOMS_ARRAYS:
+        if key in slab_atoms_dict or key in site_atoms_dict:
+            width = 3 if key == 'momenta' else 1
+            slab_values = slab_atoms_dict.get(key, [0] * (n_slab_atoms * width))
+            site_values = site_atoms_dict.get(key, [0] * (n_site_atoms * width))
+            atoms_dict[key] = list(slab_values) + list(site_values)
+    for key, value in site_atoms_dict.items():
+        if key not in atoms_dict and key != 'slab':
+            atoms_dict[key] = value
+    atoms_dict['natoms'] = n_slab_atoms + n_site_atoms
+
+    doc = doc.copy()
+    doc['atoms'] = atoms_dict
+    return doc
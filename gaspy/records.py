@@ -0,0 +1,141 @@
+'''
+Compact record types for the documents that `gaspy.gasdb` pulls. A plain
+dictionary spends most of its memory on its hash table, which adds up when
+you pull millions of documents. These records store their values in
+`__slots__` instead, but you can still use them like (mutable) dictionaries,
+e.g., `record['energy']`, `record.get('shift')`, or `dict(record)`.
+
+Records only have the fields that their type was made with. Use
+`record.copy()` if you need a plain dictionary that you can add keys to.
+'''
+
+__author__ = 'Kevin Tran'
+__email__ = 'ktran@andrew.cmu.edu'
+
+from collections.abc import Mapping, MutableMapping
+from . import defaults
+
+
+class Record(MutableMapping):
+    '''
+    The base class of the record types that `make_record_type` makes. Do not
+    use it directly.
+
+    Arg:
+        doc     A dictionary (or other mapping) whose keys are fields of this
+                record type
+    '''
+    __slots__ = ()
+    _fields = ()
+    _slots = {}
+
+    def __init__(self, doc=()):
+        if isinstance(doc, Mapping):
+            doc = doc.items()
+        for key, value in doc:
+            self[key] = value
+
+    def __getitem__(self, key):
+        try:
+            return self._slots[key].__get__(self, type(self))
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            self._slots[key].__set__(self, value)
+        except KeyError:
+            raise KeyError('%s does not have a %r field. Use `copy` to get a '
+                           'dictionary that you can add keys to.'
+                           % (type(self).__name__, key)) from None
+
+    def __delitem__(self, key):
+        try:
+            self._slots[key].__delete__(self)
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        for field, slot in self._slots.items():
+            try:
+                slot.__get__(self, type(self))
+                yield field
+            except AttributeError:
+                pass
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.copy())
+
+    def __reduce__(self):
+        return (_make_record, (type(self).__name__, self._fields, self.copy()))
+
+    def copy(self):
+        ''' Returns a shallow copy as a plain dictionary '''
+        return dict(self.items())
+
+    @classmethod
+    def with_fields(cls, fields):
+        '''
+        Gets a record type with the fields of this one plus any others that
+        you need, e.g., for the extra projections of a pull.
+
+        Arg:
+            fields  An iterable of strings indicating the fields you need
+        Returns:
+            record_type     This record type if it already has all of the
+                            fields, or a record type of the same name that
+                            also has the missing ones
+        '''
+        missing_fields = tuple(field for field in fields
+                               if field not in cls._slots and field != '_id')
+        if not missing_fields:
+            return cls
+        return make_record_type(cls.__name__, cls._fields + missing_fields)
+
+
+# Record types that we already made, keyed by their names and fields, so that
+# the same name and fields always give the same class
+_RECORD_TYPES = {}
+
+
+def make_record_type(name, fields):
+    '''
+    Makes a `Record` subclass that stores the given fields in `__slots__`.
+
+    Args:
+        name    A string indicating the name of the class
+        fields  An iterable of strings indicating the fields of the records,
+                e.g., the keys of a projection from `gaspy.defaults`. We skip
+                '_id', because our projections exclude it.
+    Returns:
+        record_type     The `Record` subclass
+    '''
+    fields = tuple(field for field in fields if field != '_id')
+    try:
+        return _RECORD_TYPES[name, fields]
+    except KeyError:
+        pass
+
+    # Fields are not always valid attribute names (or they could shadow our
+    # methods), so the slots get their own names
+    slot_names = tuple('_field%i' % i for i in range(len(fields)))
+    record_type = type(name, (Record,), {'__slots__': slot_names,
+                                         '__module__': __name__,
+                                         '_fields': fields})
+    record_type._slots = {field: getattr(record_type, slot_name)
+                          for field, slot_name in zip(fields, slot_names)}
+    _RECORD_TYPES[name, fields] = record_type
+    return record_type
+
+
+def _make_record(name, fields, doc):
+    ''' Unpickles a record. Refer to `Record.__reduce__`. '''
+    return make_record_type(name, fields)(doc)
+
+
+AdsorptionRecord = make_record_type('AdsorptionRecord', defaults.adsorption_projection())
+CatalogRecord = make_record_type('CatalogRecord', defaults.catalog_projection())
+SurfaceRecord = make_record_type('SurfaceRecord', defaults.surface_projection())
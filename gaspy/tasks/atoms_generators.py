@@ -19,7 +19,11 @@ from pymatgen.ext.matproj import MPRester
 from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 from pymatgen.core.surface import get_symmetrically_distinct_miller_indices
 from .core import save_task_output, make_task_output_object, get_task_output
-from ..mongo import make_doc_from_atoms, make_atoms_from_doc
+from ..mongo import (make_doc_from_atoms,
+                     make_atoms_from_doc,
+                     make_slab_id,
+                     make_site_doc_from_atoms,
+                     SiteDocs)
 from ..atoms_operators import (make_slabs_from_bulk_atoms,
                                orient_atoms_upwards,
                                constrain_slab,
@@ -231,13 +235,16 @@ class GenerateAdsorptionSites(luigi.Task):
         bulk_vasp_settings      A dictionary containing the VASP settings of
                                 the relaxed bulk to enumerate slabs from
     Returns:
-        docs    A list of dictionaries (also known as "documents", because
-                they'll eventually be put into Mongo as documents) that contain
-                information about the sites. These documents can be fed to the
-                `gaspy.mongo.make_atoms_from_docs` function to be turned
-                into `ase.Atoms` objects. These objects have a uranium atom
-                placed at the adsorption site, and the uranium is tagged with
-                a `1`. These documents also contain the following fields:
+        docs    A `gaspy.mongo.SiteDocs` list of dictionaries (also known as
+                "documents", because they'll eventually be put into Mongo as
+                documents) that contain information about the sites. These
+                documents are normalized, i.e., they refer to tiled slabs that
+                are stored only once in the `slab_docs` attribute of the list.
+                They can still be fed to the `gaspy.mongo.make_atoms_from_docs`
+                function to be turned into `ase.Atoms` objects. These objects
+                have a uranium atom placed at the adsorption site, and the
+                uranium is tagged with a `1`. These documents also contain the
+                following fields:
                     fwids           A subdictionary containing the FWIDs of the
                                     prerequisite calculations
                     shift           Float indicating the shift/termination of
@@ -270,8 +277,13 @@ class GenerateAdsorptionSites(luigi.Task):
         with open(self.input().path, 'rb') as file_handle:
             slab_docs = pickle.load(file_handle)
 
+        settings = {'min_xy': self.min_xy,
+                    'slab_generator_settings': utils.unfreeze_dict(self.slab_generator_settings),
+                    'get_slab_settings': utils.unfreeze_dict(self.get_slab_settings),
+                    'bulk_vasp_settings': utils.unfreeze_dict(self.bulk_vasp_settings)}
+
         # For each slab, tile it and then find all the adsorption sites
-        docs_sites = []
+        docs_sites = SiteDocs()
         for slab_doc in slab_docs:
             slab_atoms = make_atoms_from_doc(slab_doc)
             slab_atoms_tiled, slab_repeat = tile_atoms(atoms=slab_atoms,
@@ -279,15 +291,29 @@ class GenerateAdsorptionSites(luigi.Task):
                                                        min_y=self.min_xy)
             sites = find_adsorption_sites(slab_atoms_tiled)
 
+            # Store the tiled slab once and have all of its sites refer to it.
+            # Nobody looks up the spacegroups of slabs, so we skip them.
+            slab_id = make_slab_id(self.mpid, self.miller_indices,
+                                   slab_doc['shift'], slab_doc['top'],
+                                   slab_repeat, settings)
+            tiled_slab_doc = make_doc_from_atoms(slab_atoms_tiled,
+                                                 compute_spacegroup=False,
+                                                 _id=slab_id,
+                                                 mpid=self.mpid,
+                                                 miller=list(self.miller_indices),
+                                                 shift=slab_doc['shift'],
+                                                 top=slab_doc['top'],
+                                                 slab_repeat=slab_repeat,
+                                                 **settings)
+            docs_sites.slab_docs[slab_id] = tiled_slab_doc
+
             # Place a uranium atom on the adsorption site and then tag it with
             # a `1`, which is our way of saying that it is an adsorbate
             for site in sites:
-                adsorbate = ase.Atoms('U')
+                adsorbate = ase.Atoms('U', tags=[1])
                 adsorbate.translate(site)
-                adslab_atoms = slab_atoms_tiled.copy() + adsorbate
-                adslab_atoms[-1].tag = 1
                 # Turn the atoms into a document, then save it
-                doc = make_doc_from_atoms(adslab_atoms)
+                doc = make_site_doc_from_atoms(adsorbate, tiled_slab_doc)
                 doc['fwids'] = slab_doc['fwids']
                 doc['shift'] = slab_doc['shift']
                 doc['top'] = slab_doc['top']
@@ -418,8 +444,9 @@ class GenerateAdslabs(luigi.Task):
                                              slab=slab,
                                              site=site_doc['adsorption_site'])
 
-            # Turn the adslab into a document, add the correct fields, and save
-            doc = make_doc_from_atoms(adslab)
+            # Turn the adslab into a document, add the correct fields, and
+            # save. These only go to FireWorks, so they need no spacegroups.
+            doc = make_doc_from_atoms(adslab, compute_spacegroup=False)
             doc['fwids'] = site_doc['fwids']
             doc['shift'] = site_doc['shift']
             doc['top'] = site_doc['top']
@@ -498,13 +525,15 @@ class GenerateAllSitesFromBulk(luigi.Task):
         # them in parallel instead of sequentially
         yield site_generators
 
-        # Concatenate, append, and save the sites we just enumerated
-        all_site_docs = []
+        # Concatenate, append, and save the sites we just enumerated. Older
+        # outputs are plain lists without slab documents.
+        all_site_docs = SiteDocs()
         for generator in site_generators:
             site_docs = get_task_output(generator)
             for doc in site_docs:
                 doc['miller'] = generator.miller_indices
             all_site_docs.extend(site_docs)
+            all_site_docs.slab_docs.update(getattr(site_docs, 'slab_docs', {}))
         save_task_output(self, all_site_docs)
 
     def output(self):
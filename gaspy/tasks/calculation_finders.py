@@ -495,8 +495,9 @@ class FindSurface(FindCalculation):
 
         # We want to pass the atoms object to the `MakeSurfaceFW` task, but
         # Luigi doesn't accept `ase.Atoms` arguments. So we package it into a
-        # dictionary/document.
-        atoms_doc = make_doc_from_atoms(atoms)
+        # dictionary/document. Luigi needs to serialize it as json, so no
+        # binary arrays either.
+        atoms_doc = make_doc_from_atoms(atoms, binary_arrays=False)
         # Delete some keys that Luigi doesn't like
         del atoms_doc['ctime']
         del atoms_doc['mtime']
@@ -12,6 +12,7 @@ from .catalog import update_catalog_collection
 from .atoms import update_atoms_collection
 from .adsorption import update_adsorption_collection
 from .surfaces import update_surface_energy_collection
+from .migrations import migrate_atoms_docs
 
 
 def update_all_collections(n_processes=1):
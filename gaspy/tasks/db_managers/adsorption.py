@@ -14,8 +14,8 @@ import luigi
 from ..core import get_task_output, schedule_tasks
 from ..metadata_calculators import CalculateAdsorptionEnergy
 from ...utils import print_dict, multimap
-from ...mongo import make_atoms_from_doc, make_doc_from_atoms
-from ...gasdb import get_mongo_collection
+from ...mongo import make_atoms_from_docs, make_doc_from_atoms
+from ...gasdb import get_mongo_collection, update_low_coverage_dft_docs
 from ...atoms_operators import fingerprint_adslab, find_max_movement
 
 
@@ -60,9 +60,10 @@ def update_adsorption_collection(n_processes=1):
         print('[%s] Creating %i new entries in the adsorption collection...'
               % (datetime.now(), len(adsorption_docs)))
         with get_mongo_collection('adsorption') as collection:
-            collection.insert_many(adsorption_docs)
+            result = collection.insert_many(adsorption_docs)
         print('[%s] Created %i new entries in the adsorption collection'
               % (datetime.now(), len(adsorption_docs)))
+        update_low_coverage_dft_docs(result.inserted_ids)
 
 
 def _find_atoms_docs_not_in_adsorption_collection():
@@ -201,10 +202,11 @@ def __create_adsorption_doc(energy_doc):
         slab_doc = list(collection.find({'fwid': energy_doc['fwids']['slab']}))[0]
 
     # Get some pertinent `ase.Atoms` objects
-    bare_slab_init = make_atoms_from_doc(slab_doc['initial_configuration'])
-    bare_slab_final = make_atoms_from_doc(slab_doc)
-    adslab_init = make_atoms_from_doc(adslab_doc['initial_configuration'])
-    adslab_final = make_atoms_from_doc(adslab_doc)
+    (bare_slab_init, bare_slab_final,
+     adslab_init, adslab_final) = make_atoms_from_docs([slab_doc['initial_configuration'],
+                                                        slab_doc,
+                                                        adslab_doc['initial_configuration'],
+                                                        adslab_doc])
     # In GASpy, atoms tagged with 0's are slab atoms. Atoms tagged with
     # integers > 0 are adsorbates. We use that information to pull our the slab
     # and adsorbate portions of the adslab.
@@ -223,9 +225,12 @@ def __create_adsorption_doc(energy_doc):
     max_slab_movement = find_max_movement(slab_init, slab_final)
     max_ads_movement = find_max_movement(adsorbate_init, adsorbate_final)
 
-    # Parse the data into a Mongo document
+    # Parse the data into a Mongo document. People search the adsorption
+    # collection by the spacegroups of the relaxed adslabs, so we keep those,
+    # but nobody searches by the spacegroups of the initial configurations.
     adsorption_doc = make_doc_from_atoms(adslab_final)
-    adsorption_doc['initial_configuration'] = make_doc_from_atoms(adslab_init)
+    adsorption_doc['initial_configuration'] = make_doc_from_atoms(adslab_init,
+                                                                  compute_spacegroup=False)
     adsorption_doc['adsorption_energy'] = energy_doc['adsorption_energy']
     adsorption_doc['adsorbate'] = adslab_doc['fwname']['adsorbate']
     adsorption_doc['adsorbate_rotation'] = adslab_doc['fwname']['adsorbate_rotation']
@@ -26,8 +26,8 @@ from ..core import (schedule_tasks,
 from ..atoms_generators import GenerateAllSitesFromBulk
 from ... import defaults
 from ...utils import read_rc, unfreeze_dict
-from ...mongo import make_atoms_from_doc
-from ...gasdb import get_mongo_collection
+from ...mongo import make_atoms_from_doc, SiteDocs
+from ...gasdb import get_mongo_collection, insert_slab_docs
 from ...atoms_operators import fingerprint_adslab
 
 BULK_SETTINGS = defaults.bulk_settings()
@@ -264,12 +264,17 @@ class _InsertSitesToCatalog(luigi.Task):
                     # save the document to one list that we'll write to
                     inserted_docs.append(doc)
 
-            # Add the documents to the catalog
+            # Add the documents to the catalog. The slabs go in first so that
+            # nobody finds a site whose slab is missing.
+            slab_docs = getattr(site_docs, 'slab_docs', {})
             if not _testing and len(inserted_docs) > 0:
+                slab_ids = {doc['atoms']['slab'] for doc in inserted_docs
+                            if 'slab' in doc['atoms']}
+                insert_slab_docs(slab_docs[slab_id] for slab_id in slab_ids)
                 collection.insert_many(inserted_docs)
                 print('[%s] Created %i new entries in the catalog collection'
                       % (datetime.now(), len(inserted_docs)))
-        save_task_output(self, incumbent_docs + inserted_docs)
+        save_task_output(self, SiteDocs(incumbent_docs + inserted_docs, slab_docs))
 
     def output(self):
         return make_task_output_object(self)
@@ -0,0 +1,105 @@
+'''
+This module houses functions that convert the documents already in our Mongo
+collections to newer formats.
+'''
+
+__author__ = 'Kevin Tran'
+__email__ = 'ktran@andrew.cmu.edu'
+
+from datetime import datetime
+from tqdm import tqdm
+from pymongo import UpdateOne
+from ...mongo import ATOMS_DOC_VERSION, convert_atoms_dict_to_columnar
+from ...gasdb import get_mongo_collection
+
+
+# Where the `atoms` sub-documents are in each collection that has them
+ATOMS_DOC_PATHS = {'atoms': ['atoms', 'initial_configuration.atoms'],
+                   'adsorption': ['atoms', 'initial_configuration.atoms'],
+                   'catalog': ['atoms']}
+
+
+def migrate_atoms_docs(collection_tag, batch_size=1000):
+    '''
+    Converts the old `atoms` sub-documents of a collection into the columnar
+    version that `gaspy.mongo.make_doc_from_atoms` makes now. Documents that
+    were already converted are skipped, so you can stop this and run it again
+    later.
+
+    Args:
+        collection_tag  A string indicating which collection to migrate.
+                        Should be one of the keys of `ATOMS_DOC_PATHS`.
+        batch_size      An integer indicating how many documents to read and
+                        write at a time
+    Returns:
+        n_migrated  An integer indicating how many documents we converted
+    '''
+    try:
+        paths = ATOMS_DOC_PATHS[collection_tag]
+    except KeyError:
+        raise ValueError('We do not know where the atoms documents are in the '
+                         '"%s" collection. Use one of %s.'
+                         % (collection_tag, sorted(ATOMS_DOC_PATHS))) from None
+
+    # Only look at the documents that have an old version somewhere
+    query = {'$or': [{path + '.version': {'$exists': False},
+                      path + '.atoms': {'$exists': True}}
+                     for path in paths]}
+    projection = {path: True for path in paths}
+
+    print('[%s] Migrating the atoms documents of the %s collection...'
+          % (datetime.now(), collection_tag))
+    n_migrated = 0
+    with get_mongo_collection(collection_tag) as collection:
+        n_docs = collection.count_documents(query)
+        last_id = None
+        with tqdm(total=n_docs) as progress_bar:
+            while True:
+                # Go through the collection in `_id` order instead of keeping
+                # one cursor open, so that long migrations do not time out
+                batch_query = query if last_id is None else {'$and': [query, {'_id': {'$gt': last_id}}]}
+                docs = list(collection.find(batch_query, projection)
+                            .sort('_id', 1).limit(batch_size))
+                if len(docs) == 0:
+                    break
+                last_id = docs[-1]['_id']
+
+                requests = [UpdateOne({'_id': doc['_id']}, {'$set': update})
+                            for doc in docs
+                            for update in [_make_atoms_doc_update(doc, paths)]
+                            if update]
+                if len(requests) > 0:
+                    collection.bulk_write(requests, ordered=False)
+                n_migrated += len(requests)
+                progress_bar.update(len(docs))
+
+    print('[%s] Migrated %i documents to version %i of the atoms documents'
+          % (datetime.now(), n_migrated, ATOMS_DOC_VERSION))
+    return n_migrated
+
+
+def _make_atoms_doc_update(doc, paths):
+    '''
+    Makes the `$set` part of a Mongo update that converts the `atoms`
+    sub-documents of a document.
+
+    Args:
+        doc     A Mongo document with (at least) the `paths` in it
+        paths   A list of strings indicating the dotted paths of the `atoms`
+                sub-documents, e.g., 'initial_configuration.atoms'
+    Returns:
+        update  A dictionary whose keys are the paths that need converting and
+                whose values are the converted sub-documents. Empty if there
+                was nothing to convert.
+    '''
+    update = {}
+    for path in paths:
+        atoms_dict = doc
+        try:
+            for key in path.split('.'):
+                atoms_dict = atoms_dict[key]
+        except KeyError:
+            continue
+        if atoms_dict.get('version', 1) < ATOMS_DOC_VERSION:
+            update[path] = convert_atoms_dict_to_columnar(atoms_dict)
+    return update
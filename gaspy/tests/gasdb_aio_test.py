@@ -0,0 +1,75 @@
+''' Tests for the `gasdb_aio` submodule '''
+
+__author__ = 'Kevin Tran'
+__email__ = 'ktran@andrew.cmu.edu'
+
+# Modify the python path so that we find/use the .gaspyrc.json in the testing
+# folder instead of the main folder
+import os
+os.environ['PYTHONPATH'] = '/home/GASpy/gaspy/tests:' + os.environ['PYTHONPATH']
+
+# Things we're testing
+from ..gasdb_aio import (set_max_concurrency,
+                         _get_executor,
+                         _make_async,
+                         get_adsorption_docs,
+                         get_surface_docs,
+                         get_catalog_docs_with_predictions,
+                         run_concurrently)
+
+# Things we need to do the tests
+import time
+import threading
+from .. import gasdb
+
+
+def __sort_by_mongo_id(docs):
+    return sorted(docs, key=lambda doc: str(doc['mongo_id']))
+
+
+def test_concurrent_pulls():
+    docs_co, docs_h, surface_docs, catalog_docs = run_concurrently(get_adsorption_docs('CO'),
+                                                                   get_adsorption_docs('H'),
+                                                                   get_surface_docs(),
+                                                                   get_catalog_docs_with_predictions())
+
+    assert __sort_by_mongo_id(docs_co) == __sort_by_mongo_id(gasdb.get_adsorption_docs('CO'))
+    assert __sort_by_mongo_id(docs_h) == __sort_by_mongo_id(gasdb.get_adsorption_docs('H'))
+    assert __sort_by_mongo_id(surface_docs) == __sort_by_mongo_id(gasdb.get_surface_docs())
+    assert __sort_by_mongo_id(catalog_docs) == __sort_by_mongo_id(gasdb.get_catalog_docs_with_predictions())
+
+
+def test_set_max_concurrency():
+    max_concurrency = _get_executor()._max_workers
+    try:
+        set_max_concurrency(2)
+        assert _get_executor()._max_workers == 2
+
+        # Make sure that no more than two things run at once
+        lock = threading.Lock()
+        n_running = [0]
+        max_running = [0]
+
+        def sleep():
+            with lock:
+                n_running[0] += 1
+                max_running[0] = max(max_running[0], n_running[0])
+            time.sleep(0.1)
+            with lock:
+                n_running[0] -= 1
+            return True
+
+        async_sleep = _make_async(sleep)
+        results = run_concurrently(*[async_sleep() for _ in range(6)])
+        assert results == [True] * 6
+        assert max_running[0] == 2
+
+    finally:
+        set_max_concurrency(max_concurrency)
+    assert _get_executor()._max_workers == max_concurrency
+
+
+def test__make_async():
+    async_function = _make_async(gasdb.get_adsorption_docs)
+    assert async_function.__name__ == 'get_adsorption_docs'
+    assert 'asyncio version' in async_function.__doc__
@@ -16,42 +16,135 @@ os.environ['PYTHONPATH'] = '/home/GASpy/gaspy/tests:' + os.environ['PYTHONPATH']
 
 # Things we're testing
 from ..gasdb import (get_mongo_collection,
+                     _get_mongo_client,
+                     close_mongo_clients,
+                     _is_pooled_client,
                      ConnectableCollection,
+                     INDEXES,
+                     ensure_indexes,
+                     explain_hot_queries,
+                     _make_hot_queries,
+                     _get_plan_stages,
                      get_adsorption_docs,
+                     iter_adsorption_docs,
+                     _iter_aggregated_docs,
+                     memoize_pipelines,
+                     get_pipeline_memo_stats,
+                     clear_pipeline_memo,
+                     PIPELINE_MEMO_SETTINGS,
+                     _PIPELINE_MEMO,
+                     _get_pipeline_memo_key,
+                     _get_pipeline_memo_name,
+                     _get_collection_version,
+                     _iter_partitioned_docs,
+                     _get_id_ranges,
+                     _pull_partition,
+                     _iter_resumable_docs,
+                     _pull_chunk,
+                     _get_pull_checkpoint_names,
+                     _load_pull_checkpoint,
+                     _maybe_chunk,
+                     _iter_records,
+                     FINGERPRINT_KEYS,
+                     FingerprintVocabulary,
+                     _iter_encoded_fingerprints,
+                     _intern_fingerprint,
                      _clean_up_aggregated_docs,
+                     _is_clean_doc,
+                     _make_validation_match,
+                     iter_surface_docs,
+                     _LazyDoc,
+                     _LazyFieldLoader,
                      get_catalog_docs,
+                     iter_catalog_docs,
+                     _pull_catalog_with_snapshot,
+                     _get_catalog_snapshot_name,
                      _pull_catalog_from_mongo,
+                     get_catalog_frame,
+                     get_adsorption_frame,
+                     _make_frame,
                      get_catalog_docs_with_predictions,
                      _add_adsorption_energy_predictions_to_projection,
                      _add_orr_predictions_to_projection,
+                     get_prediction_schema,
+                     update_prediction_schema,
+                     register_predictions,
+                     _PREDICTION_SCHEMA_CACHE,
                      get_surface_docs,
                      get_unsimulated_catalog_docs,
+                     iter_unsimulated_catalog_docs,
+                     _share_database,
+                     _make_attempted_sites_lookup,
+                     _make_rounding_expression,
                      _get_attempted_adsorption_docs,
+                     _iter_attempted_adsorption_docs,
                      _duplicate_docs_per_rotations,
+                     _iter_docs_per_rotations,
+                     _RotatedDoc,
                      _hash_doc,
                      get_low_coverage_docs,
+                     get_low_coverage_docs_by_model,
+                     merge_low_coverage_docs,
+                     index_low_coverage_docs,
+                     _get_site_from_doc,
+                     LOW_COVERAGE_COLLECTION,
+                     LOW_COVERAGE_STATUS_ID,
+                     LOW_COVERAGE_DFT_TAG,
+                     rebuild_low_coverage_collection,
+                     update_low_coverage_dft_docs,
+                     update_low_coverage_ml_docs,
+                     _pull_low_coverage_docs,
+                     _get_low_coverage_sources,
+                     _make_low_coverage_id,
+                     _refresh_low_coverage_docs,
+                     _upsert_low_coverage_docs,
                      get_low_coverage_dft_docs,
+                     iter_low_coverage_dft_docs,
                      get_surface_from_doc,
                      get_low_coverage_ml_docs,
-                     get_electrochemical_stability)
+                     SLABS_COLLECTION,
+                     insert_slab_docs,
+                     get_slab_docs,
+                     purge_adslabs,
+                     _bulk_defuse_fws,
+                     _remove_catalog_predictions,
+                     get_electrochemical_stability,
+                     get_electrochemical_stabilities,
+                     _get_pourbaix_composition)
 
 # Things we need to do the tests
 import math
+import fcntl
 import pytest
 import warnings
+import gc
 import copy
 import pickle
+import weakref
 import random
 import hashlib
 from datetime import datetime
 from bson.objectid import ObjectId
 from pymongo import MongoClient
 from pymongo.collection import Collection
-from pymongo.errors import OperationFailure
+from pymongo.errors import OperationFailure, ConnectionFailure, CursorNotFound
+import numpy as np
+import numpy.testing as npt
+import pandas as pd
 import ase
+from pymatgen.ext.matproj import MPRester
+from pymatgen.analysis.pourbaix_diagram import PourbaixDiagram, ELEMENTS_HO
+from fireworks import Firework, Workflow, ScriptTask, FWorker, FWAction
 from ..utils import read_rc
 from ..defaults import catalog_projection, adslab_settings
-from ..mongo import make_atoms_from_doc
+from ..mongo import (make_atoms_from_doc,
+                     make_doc_from_atoms,
+                     make_slab_id,
+                     make_site_doc_from_atoms,
+                     _SLAB_DOCS)
+from ..records import Record, AdsorptionRecord, CatalogRecord, SurfaceRecord
+from ..fireworks_helper_scripts import get_launchpad
+from .test_cases.mongo_test_collections.mongo_utils import populate_unit_testing_collection
 
 REGRESSION_BASELINES_LOCATION = '/home/GASpy/gaspy/tests/regression_baselines/gasdb/'
 
@@ -70,6 +163,50 @@ def test_get_mongo_collection(collection_tag):
         assert False
 
 
+def test_get_mongo_collection_pooling():
+    '''
+    Collections should share the same client, and leaving a `with` block
+    should not close that client
+    '''
+    with get_mongo_collection('adsorption') as collection:
+        client = collection.database.client
+        _ = collection.count_documents({})  # noqa: F841
+    assert _is_pooled_client(client)
+
+    with get_mongo_collection('catalog') as collection:
+        assert collection.database.client is client
+        _ = collection.count_documents({})  # noqa: F841
+
+
+def test__get_mongo_client():
+    mongo_info = read_rc('mongo_info.adsorption')
+    kwargs = dict(host=mongo_info['host'], port=int(mongo_info['port']),
+                  user=mongo_info['user'], password=mongo_info['password'],
+                  auth_source=mongo_info['database'])
+    client = _get_mongo_client(**kwargs)
+    assert _get_mongo_client(**kwargs) is client
+
+    # Pretend that we forked. The child should make its own client.
+    from .. import gasdb
+    gasdb._MONGO_REGISTRY_PID = -1
+    child_client = _get_mongo_client(**kwargs)
+    assert child_client is not client
+    assert not _is_pooled_client(client)
+    client.close()
+
+
+def test_close_mongo_clients():
+    with get_mongo_collection('adsorption') as collection:
+        client = collection.database.client
+    close_mongo_clients()
+    assert not _is_pooled_client(client)
+
+    # Make sure we can still connect afterwards
+    with get_mongo_collection('adsorption') as collection:
+        assert collection.database.client is not client
+        _ = collection.count_documents({})  # noqa: F841
+
+
 @pytest.mark.parametrize('collection_tag', ['adsorption'])
 def test_ConnectableCollection(collection_tag):
     '''
@@ -99,6 +236,46 @@ def test_ConnectableCollection(collection_tag):
     assert '__exit__' in dir(collection)
 
 
+def test_ensure_indexes():
+    index_names = ensure_indexes()
+
+    for collection_tag, indexes in INDEXES.items():
+        with get_mongo_collection(collection_tag) as collection:
+            index_info = collection.index_information()
+        index_keys = [info['key'] for info in index_info.values()]
+        for keys in indexes:
+            assert keys in index_keys
+        assert len(index_names[collection_tag]) == len(indexes)
+
+    # Doing it again should be harmless
+    assert ensure_indexes() == index_names
+
+
+def test_explain_hot_queries():
+    ensure_indexes()
+    report = explain_hot_queries()
+
+    assert len(report) == len(_make_hot_queries())
+    for query_report in report:
+        assert query_report['collection_scan'] is False
+        assert 'IXSCAN' in query_report['stages']
+
+
+def test__make_hot_queries():
+    for name, collection_tag, query in _make_hot_queries():
+        assert collection_tag in INDEXES
+        with get_mongo_collection(collection_tag) as collection:
+            list(collection.find(query).limit(1))   # Make sure Mongo accepts it
+
+
+def test__get_plan_stages():
+    plan = {'stage': 'FETCH',
+            'inputStage': {'stage': 'OR',
+                           'inputStages': [{'stage': 'IXSCAN'},
+                                           {'stage': 'COLLSCAN'}]}}
+    assert _get_plan_stages(plan) == ['FETCH', 'OR', 'IXSCAN', 'COLLSCAN']
+
+
 @pytest.mark.filterwarnings('ignore:  You are using adsorption document filters '
                             'for a set of adsorbate that we have not yet '
                             'established valid energy bounds for, yet.')
@@ -142,6 +319,437 @@ def test_get_adsorption_docs(adsorbate, extra_projections):
                 assert projection in doc
 
 
+@pytest.mark.parametrize('adsorbate', ['H', 'CO'])
+def test_iter_adsorption_docs(adsorbate):
+    expected_docs = get_adsorption_docs(adsorbate)
+
+    docs = iter_adsorption_docs(adsorbate, batch_size=2)
+    assert not isinstance(docs, list)
+    assert list(docs) == expected_docs
+
+    # Make sure the chunks are the right size and that nothing gets lost
+    chunks = list(iter_adsorption_docs(adsorbate, batch_size=2, chunked=True))
+    assert all(len(chunk) == 2 for chunk in chunks[:-1])
+    assert 1 <= len(chunks[-1]) <= 2
+    assert [doc for chunk in chunks for doc in chunk] == expected_docs
+
+
+@pytest.mark.parametrize('adsorbate, ordered', [('CO', True), ('H', False)])
+def test_get_adsorption_docs_partitioned(adsorbate, ordered):
+    expected_docs = get_adsorption_docs(adsorbate)
+    docs = get_adsorption_docs(adsorbate, n_partitions=3, processes=2, ordered=ordered)
+    assert __sort_by_mongo_id(docs) == __sort_by_mongo_id(expected_docs)
+
+
+def test_get_catalog_docs_partitioned():
+    expected_docs = get_catalog_docs()
+    docs = get_catalog_docs(n_partitions=4)
+    assert __sort_by_mongo_id(docs) == __sort_by_mongo_id(expected_docs)
+
+
+def test__iter_partitioned_docs():
+    pipeline = [{'$project': {'_id': 1}}]
+    docs = list(_iter_partitioned_docs('catalog', pipeline, n_partitions=5, processes=2))
+
+    # Ordered partitions of `_id` should come out sorted by `_id`, and each
+    # document should come out exactly once
+    mongo_ids = [doc['_id'] for doc in docs]
+    assert mongo_ids == sorted(mongo_ids)
+    with get_mongo_collection('catalog') as collection:
+        assert len(set(mongo_ids)) == len(mongo_ids) == collection.count_documents({})
+
+
+@pytest.mark.parametrize('n_partitions', [1, 3, 10**6])
+def test__get_id_ranges(n_partitions):
+    id_ranges = _get_id_ranges('adsorption', n_partitions)
+    assert 1 <= len(id_ranges) <= n_partitions
+
+    with get_mongo_collection('adsorption') as collection:
+        n_docs = collection.count_documents({})
+        n_docs_per_range = [collection.count_documents({'_id': id_range} if id_range else {})
+                            for id_range in id_ranges]
+    assert sum(n_docs_per_range) == n_docs
+
+
+def test__pull_partition():
+    pipeline = [{'$match': {}}, {'$project': {'_id': 1}}]
+    docs = _pull_partition(('adsorption', pipeline, 2))
+    with get_mongo_collection('adsorption') as collection:
+        expected_docs = list(collection.aggregate(pipeline))
+    assert docs == expected_docs
+
+
+@pytest.mark.parametrize('adsorbate', ['H', 'CO'])
+def test_get_adsorption_docs_resumable(adsorbate):
+    expected_docs = get_adsorption_docs(adsorbate)
+    docs = get_adsorption_docs(adsorbate, resumable=True)
+    assert __sort_by_mongo_id(docs) == __sort_by_mongo_id(expected_docs)
+
+
+def test_get_catalog_docs_resumable():
+    expected_docs = get_catalog_docs()
+    docs = get_catalog_docs(resumable=True)
+    assert __sort_by_mongo_id(docs) == __sort_by_mongo_id(expected_docs)
+
+
+def test__iter_resumable_docs(monkeypatch):
+    monkeypatch.setattr('gaspy.gasdb.PULL_CHECKPOINT_SIZE', 3)
+    pipeline = [{'$project': {'_id': 1}}]
+    with get_mongo_collection('adsorption') as collection:
+        expected_docs = list(collection.aggregate([{'$sort': {'_id': 1}}] + pipeline))
+
+    # Stop partway through, which should leave a checkpoint behind
+    checkpoint_name, spill_name, _ = _get_pull_checkpoint_names('adsorption', pipeline)
+    docs = _iter_resumable_docs('adsorption', pipeline)
+    for _ in range(4):
+        next(docs)
+    docs.close()
+    version = _get_collection_version('adsorption')
+    checkpoint = _load_pull_checkpoint(checkpoint_name, spill_name, version)
+    assert checkpoint['n_docs'] == 6
+    assert checkpoint['last_id'] == expected_docs[5]['_id']
+    assert checkpoint['version'] == version
+
+    # Resuming should give us everything, and then clean up after itself
+    docs = list(_iter_resumable_docs('adsorption', pipeline))
+    assert docs == expected_docs
+    assert not os.path.isfile(checkpoint_name)
+    assert not os.path.isfile(spill_name)
+
+
+def test__iter_resumable_docs_locked(monkeypatch):
+    monkeypatch.setattr('gaspy.gasdb.PULL_CHECKPOINT_SIZE', 3)
+    pipeline = [{'$project': {'_id': 1}}]
+    with get_mongo_collection('adsorption') as collection:
+        expected_docs = list(collection.aggregate([{'$sort': {'_id': 1}}] + pipeline))
+
+    # If another process is pulling the same thing, then we should still get
+    # everything without touching its checkpoint
+    checkpoint_name, spill_name, lock_name = _get_pull_checkpoint_names('adsorption', pipeline)
+    os.makedirs(os.path.dirname(lock_name), exist_ok=True)
+    with open(lock_name, 'a') as lock_handle:
+        fcntl.flock(lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with pytest.warns(RuntimeWarning, match='not be resumable'):
+            docs = list(_iter_resumable_docs('adsorption', pipeline))
+    assert docs == expected_docs
+    assert not os.path.isfile(checkpoint_name)
+    assert not os.path.isfile(spill_name)
+
+
+def test__load_pull_checkpoint(monkeypatch):
+    pipeline = [{'$project': {'_id': 1}}]
+    checkpoint_name, spill_name, _ = _get_pull_checkpoint_names('adsorption', pipeline)
+    version = _get_collection_version('adsorption')
+    try:
+        # Start fresh if there is nothing to resume
+        checkpoint = _load_pull_checkpoint(checkpoint_name, spill_name, version)
+        assert checkpoint['last_id'] is None
+        assert checkpoint['n_docs'] == 0
+        assert checkpoint['version'] == version
+
+        # Resume from good checkpoints
+        with open(spill_name, 'wb') as file_handle:
+            pickle.dump([{'_id': 1}], file_handle)
+        checkpoint = dict(checkpoint, last_id=1, n_docs=1, spill_size=os.path.getsize(spill_name))
+        with open(checkpoint_name, 'wb') as file_handle:
+            pickle.dump(checkpoint, file_handle)
+        assert _load_pull_checkpoint(checkpoint_name, spill_name, version) == checkpoint
+
+        # Start over if the collection changed or if the checkpoint is too old
+        new_version = (version[0] + 1,) + version[1:]
+        assert _load_pull_checkpoint(checkpoint_name, spill_name, new_version)['n_docs'] == 0
+        monkeypatch.setattr('gaspy.gasdb.PULL_CHECKPOINT_MAX_AGE', 0.)
+        assert _load_pull_checkpoint(checkpoint_name, spill_name, version)['n_docs'] == 0
+
+    finally:
+        for file_name in [checkpoint_name, spill_name]:
+            if os.path.isfile(file_name):
+                os.remove(file_name)
+
+
+def test__pull_chunk(monkeypatch):
+    monkeypatch.setattr('gaspy.gasdb.PULL_CHECKPOINT_SIZE', 2)
+    pipeline = [{'$project': {'_id': 1}}]
+    with get_mongo_collection('adsorption') as collection:
+        expected_docs = list(collection.aggregate([{'$sort': {'_id': 1}}] + pipeline))
+
+    docs, last_id = _pull_chunk('adsorption', pipeline, None, batch_size=1000)
+    assert docs == expected_docs[:2]
+    assert last_id == expected_docs[1]['_id']
+    docs, last_id = _pull_chunk('adsorption', pipeline, last_id, batch_size=1000)
+    assert docs == expected_docs[2:4]
+
+    docs, last_id = _pull_chunk('adsorption', pipeline, expected_docs[-1]['_id'], batch_size=1000)
+    assert docs == []
+    assert last_id is None
+
+
+def test__pull_chunk_retries(monkeypatch):
+    monkeypatch.setattr('gaspy.gasdb.PULL_CHECKPOINT_SIZE', 2)
+    monkeypatch.setattr('gaspy.gasdb.PULL_MAX_RETRIES', 2)
+    monkeypatch.setattr('gaspy.gasdb.PULL_RETRY_DELAY', 1.)
+    delays = []
+    monkeypatch.setattr('gaspy.gasdb.time.sleep', delays.append)
+    pipeline = [{'$project': {'_id': 1}}]
+    with get_mongo_collection('adsorption') as collection:
+        expected_docs = list(collection.aggregate([{'$sort': {'_id': 1}}] + pipeline))
+
+    # Pretend that Mongo fails on us a few times
+    errors = []
+
+    def flaky_get_mongo_collection(collection_tag):
+        if errors:
+            raise errors.pop(0)
+        return get_mongo_collection(collection_tag)
+
+    monkeypatch.setattr('gaspy.gasdb.get_mongo_collection', flaky_get_mongo_collection)
+
+    # We should back off exponentially and then get the chunk
+    errors.extend([ConnectionFailure('Network blip'), CursorNotFound('Cursor timed out')])
+    with pytest.warns(RuntimeWarning, match='retrying'):
+        docs, last_id = _pull_chunk('adsorption', pipeline, None, batch_size=1000)
+    assert docs == expected_docs[:2]
+    assert last_id == expected_docs[1]['_id']
+    assert delays == [1., 2.]
+
+    # We should give up once we run out of retries
+    errors.extend([ConnectionFailure('Network blip')] * 3)
+    with pytest.warns(RuntimeWarning), pytest.raises(ConnectionFailure):
+        _pull_chunk('adsorption', pipeline, None, batch_size=1000)
+    assert delays == [1., 2., 1., 2.]
+
+
+@pytest.mark.parametrize('pull_function, kwargs, record_type',
+                         [(get_adsorption_docs, {'adsorbate': 'CO'}, AdsorptionRecord),
+                          (get_adsorption_docs, {'adsorbate': 'CO', 'extra_projections': {'dates': '$calculation_dates'}},
+                           AdsorptionRecord),
+                          (get_catalog_docs, {}, CatalogRecord),
+                          (get_surface_docs, {}, SurfaceRecord)])
+def test_pulling_records(pull_function, kwargs, record_type):
+    expected_docs = pull_function(**kwargs)
+    records = pull_function(record_type=record_type, **kwargs)
+    assert all(isinstance(record, record_type) for record in records)
+    assert records == expected_docs
+
+
+@pytest.mark.parametrize('pull_function, kwargs',
+                         [(get_adsorption_docs, {'adsorbate': 'CO'}),
+                          (get_catalog_docs, {}),
+                          (get_catalog_docs, {'cache': True})])
+def test_pulling_encoded_fingerprints(pull_function, kwargs):
+    expected_docs = pull_function(**kwargs)
+
+    # Interned documents should be equal to the normal ones, and they should
+    # share their strings
+    docs = pull_function(fingerprints='intern', **kwargs)
+    assert docs == expected_docs
+    coordinations = {}
+    for doc in docs:
+        coordination = coordinations.setdefault(doc['coordination'], doc['coordination'])
+        assert doc['coordination'] is coordination
+
+    # Encoded documents should decode back into the normal ones
+    vocabulary = FingerprintVocabulary()
+    docs = pull_function(fingerprints=vocabulary, **kwargs)
+    for doc, expected_doc in zip(docs, expected_docs):
+        for key in FINGERPRINT_KEYS:
+            if key in doc:
+                assert isinstance(doc[key], int)
+                doc[key] = vocabulary.decode(doc[key])
+        assert doc == expected_doc
+
+    # We should not have changed any cached documents
+    assert pull_function(**kwargs) == expected_docs
+
+
+def test_FingerprintVocabulary():
+    vocabulary = FingerprintVocabulary()
+    assert vocabulary.encode('Cu-Cu') == 0
+    assert vocabulary.encode(['Cu:Cu-Cu', 'Cu:Cu']) == 1
+    assert vocabulary.encode('Cu-Cu') == 0
+    assert vocabulary.encode(['Cu:Cu-Cu', 'Cu:Cu']) == 1
+    assert len(vocabulary) == 2
+    assert vocabulary.decode(0) == 'Cu-Cu'
+    assert vocabulary.decode(1) == ['Cu:Cu-Cu', 'Cu:Cu']
+
+
+def test__iter_encoded_fingerprints():
+    def make_docs():
+        return [{'coordination': 'Cu-Cu', 'neighborcoord': ['Cu:Cu'], 'energy': 0.},
+                {'coordination': 'Cu', 'neighborcoord': ['Cu:Cu'], 'energy': 1.}]
+
+    docs = make_docs()
+    assert list(_iter_encoded_fingerprints(iter(docs), None)) == make_docs()
+    docs = list(_iter_encoded_fingerprints(iter(docs), FingerprintVocabulary()))
+    assert docs == [{'coordination': 0, 'neighborcoord': 1, 'energy': 0.},
+                    {'coordination': 2, 'neighborcoord': 1, 'energy': 1.}]
+
+    with pytest.raises(ValueError):
+        list(_iter_encoded_fingerprints(iter(make_docs()), 'codes'))
+
+
+def test__intern_fingerprint():
+    # Build the strings at runtime so that Python does not intern them for us
+    value = ''.join(['Cu:', 'Cu-Cu'])
+    assert _intern_fingerprint(value) is _intern_fingerprint(''.join(['Cu:', 'Cu-Cu']))
+    assert _intern_fingerprint([value])[0] is _intern_fingerprint(value)
+
+
+def test__iter_records():
+    docs = [{'foo': 1}, {'foo': 2}]
+    assert list(_iter_records(iter(docs), None, ['foo'])) == docs
+
+    records = list(_iter_records(iter(docs), AdsorptionRecord, ['foo']))
+    assert all(isinstance(record, Record) for record in records)
+    assert records == docs
+
+
+def test__iter_aggregated_docs():
+    pipeline = [{'$project': catalog_projection()}]
+    docs = _iter_aggregated_docs('catalog_readonly', pipeline, batch_size=3)
+    assert not isinstance(docs, list)
+    assert list(docs) == _pull_catalog_from_mongo(pipeline)
+
+
+def test_memoize_pipelines():
+    pipeline = [{'$project': catalog_projection()}]
+    try:
+        clear_pipeline_memo()
+        memoize_pipelines(max_entries=1)
+        docs = list(_iter_aggregated_docs('catalog_readonly', pipeline))
+        docs_memoized = list(_iter_aggregated_docs('catalog_readonly', pipeline))
+        stats = get_pipeline_memo_stats()
+        assert docs_memoized == docs
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+
+        # Callers should get copies that they can change freely
+        docs_memoized[0]['foo'] = 'bar'
+        assert 'foo' not in next(_iter_aggregated_docs('catalog_readonly', pipeline))
+
+        # We should only remember as many pulls as we are told to
+        list(_iter_aggregated_docs('catalog_readonly', [{'$project': {'_id': 1}}]))
+        assert get_pipeline_memo_stats()['entries'] == 1
+
+    finally:
+        memoize_pipelines(enabled=False)
+        clear_pipeline_memo()
+    assert PIPELINE_MEMO_SETTINGS['enabled'] is False
+    assert len(_PIPELINE_MEMO) == 0
+
+
+def test_memoize_pipelines_on_disk():
+    pipeline = [{'$project': {'_id': 1}}]
+    key = _get_pipeline_memo_key('adsorption', pipeline)
+    try:
+        clear_pipeline_memo(disk=True)
+        memoize_pipelines(disk=True)
+        docs = list(_iter_aggregated_docs('adsorption', pipeline))
+        assert os.path.isfile(_get_pipeline_memo_name(key))
+
+        # If we forget the pull in memory, then we should find it on disk
+        _PIPELINE_MEMO.clear()
+        assert list(_iter_aggregated_docs('adsorption', pipeline)) == docs
+        assert get_pipeline_memo_stats()['disk_hits'] == 1
+
+    finally:
+        memoize_pipelines(enabled=False)
+        clear_pipeline_memo(disk=True)
+    assert not os.path.isfile(_get_pipeline_memo_name(key))
+
+
+def test_memoize_pipelines_invalidation():
+    pipeline = [{'$project': {'_id': 1}}]
+    try:
+        clear_pipeline_memo()
+        memoize_pipelines()
+        list(_iter_aggregated_docs('adsorption', pipeline))
+
+        # Pretend that the collection changed since we memoized the pull
+        key = _get_pipeline_memo_key('adsorption', pipeline)
+        _, docs = _PIPELINE_MEMO[key]
+        _PIPELINE_MEMO[key] = ('stale', docs)
+        list(_iter_aggregated_docs('adsorption', pipeline))
+        stats = get_pipeline_memo_stats()
+        assert stats['invalidations'] == 1
+        assert stats['misses'] == 2
+        assert _PIPELINE_MEMO[key][0] == _get_collection_version('adsorption')
+
+    finally:
+        memoize_pipelines(enabled=False)
+        clear_pipeline_memo()
+
+
+def test__get_pipeline_memo_key():
+    pipeline = [{'$match': {'adsorbate': 'CO', 'results.energy': {'$exists': True}}}]
+    reordered_pipeline = [{'$match': {'results.energy': {'$exists': True}, 'adsorbate': 'CO'}}]
+    key = _get_pipeline_memo_key('adsorption', pipeline)
+    assert key == _get_pipeline_memo_key('adsorption', reordered_pipeline)
+    assert key != _get_pipeline_memo_key('catalog', pipeline)
+    assert key != _get_pipeline_memo_key('adsorption', [{'$match': {'adsorbate': 'H'}}])
+
+
+def test__get_collection_version():
+    version = _get_collection_version('adsorption')
+    assert version == _get_collection_version('adsorption')
+
+    with get_mongo_collection('adsorption') as collection:
+        n_docs = collection.count_documents({})
+    assert n_docs in version
+
+
+@pytest.mark.parametrize('n_docs, batch_size', [(0, 3), (7, 3), (9, 3), (2, 5)])
+def test__maybe_chunk(n_docs, batch_size):
+    docs = [{'foo': i} for i in range(n_docs)]
+    assert list(_maybe_chunk(iter(docs), batch_size, chunked=False)) == docs
+
+    chunks = list(_maybe_chunk(iter(docs), batch_size, chunked=True))
+    assert len(chunks) == math.ceil(n_docs / batch_size)
+    assert all(len(chunk) == batch_size for chunk in chunks[:-1])
+    assert [doc for chunk in chunks for doc in chunk] == docs
+
+
+def test__is_clean_doc():
+    expected_keys = {'mpid', 'neighborcoord'}
+    assert _is_clean_doc({'mpid': 'mp-30', 'neighborcoord': ['Cu:Cu-Cu']}, expected_keys)
+    assert not _is_clean_doc({'mpid': 'mp-30'}, expected_keys)
+    assert not _is_clean_doc({'mpid': None, 'neighborcoord': ['Cu:Cu-Cu']}, expected_keys)
+    assert not _is_clean_doc({'mpid': '', 'neighborcoord': ['Cu:Cu-Cu']}, expected_keys)
+    assert not _is_clean_doc({'mpid': 'mp-30', 'neighborcoord': ['Cu:Cu-Cu', 'Al:']}, expected_keys)
+
+
+@pytest.mark.parametrize('pull_function, kwargs',
+                         [(get_adsorption_docs, {'adsorbate': 'CO'}),
+                          (get_adsorption_docs, {'adsorbate': 'H'}),
+                          (get_surface_docs, {}),
+                          (get_catalog_docs, {}),
+                          (get_catalog_docs_with_predictions, {}),
+                          (_get_attempted_adsorption_docs, {'adsorbate': 'CO'}),
+                          (get_low_coverage_dft_docs, {'adsorbate': 'CO'}),
+                          (get_low_coverage_ml_docs, {'adsorbate': 'CO'})])
+def test_server_side_validation(pull_function, kwargs):
+    '''
+    The `$match` stage from `_make_validation_match` should give us the same
+    documents as the Python checker in `_clean_up_aggregated_docs`
+    '''
+    docs_server = pull_function(strict=False, **kwargs)
+    docs_python = pull_function(strict=True, **kwargs)
+    assert sorted(docs_server, key=str) == sorted(docs_python, key=str)
+
+
+def test__make_validation_match():
+    expected_keys = catalog_projection().keys()
+    match = _make_validation_match(expected_keys)
+
+    filters = match['$match']
+    assert '_id' not in filters
+    assert set(filters.keys()) == set(expected_keys) - {'_id'}
+    for key, filter_ in filters.items():
+        assert filter_['$nin'] == [None, '']
+    assert filters['neighborcoord']['$not'].search('Cu:')
+    assert not filters['neighborcoord']['$not'].search('Cu:Cu-Cu')
+
+
 def test__clean_up_aggregated_docs():
     docs = get_adsorption_docs('CO')
     dirty_docs = __make_documents_dirty(docs)
@@ -201,6 +809,65 @@ def test_get_surface_docs(extra_projections):
                 assert projection in doc
 
 
+def test_iter_surface_docs():
+    expected_docs = get_surface_docs()
+    chunks = list(iter_surface_docs(batch_size=2, chunked=True))
+    assert [doc for chunk in chunks for doc in chunk] == expected_docs
+
+
+def test_get_surface_docs_lazy():
+    expected_docs = get_surface_docs()
+    docs = get_surface_docs(lazy=True)
+    assert len(docs) == len(expected_docs)
+
+    expected_docs_by_id = {doc['mongo_id']: doc for doc in expected_docs}
+    for doc in docs:
+        assert isinstance(doc, _LazyDoc)
+        assert 'thinnest_structure' not in doc.keys()
+    for doc in docs:
+        expected_doc = expected_docs_by_id[doc['mongo_id']]
+        assert doc['thinnest_structure'] == expected_doc['thinnest_structure']
+        assert dict(doc) == expected_doc
+
+
+def test__LazyDoc():
+    with get_mongo_collection('surface_energy') as collection:
+        mongo_ids = [doc['_id'] for doc in collection.find({}, {'_id': 1}).limit(3)]
+    loader = _LazyFieldLoader('surface_energy', {'mpid': '$mpid'}, batch_size=2)
+    docs = [loader.add({'mongo_id': mongo_id}) for mongo_id in mongo_ids]
+
+    # Asking for one field should load it for a whole batch of documents
+    assert isinstance(docs[1]['mpid'], str)
+    assert sum('mpid' in doc.keys() for doc in docs) == 2
+    assert docs[2].get('mpid') is not None
+    assert all('mpid' in doc.keys() for doc in docs)
+
+    # Fields that aren't lazy are not loaded
+    with pytest.raises(KeyError):
+        docs[0]['foo']
+    assert docs[0].get('foo', 'bar') == 'bar'
+
+    # Pickles and copies should be plain old dictionaries
+    assert type(pickle.loads(pickle.dumps(docs[0]))) is dict
+    assert type(docs[0].copy()) is dict
+    assert pickle.loads(pickle.dumps(docs[0])) == docs[0]
+
+
+def test__LazyDoc_garbage_collection():
+    ''' The loader shouldn't keep documents alive that nobody is using '''
+    with get_mongo_collection('surface_energy') as collection:
+        mongo_ids = [doc['_id'] for doc in collection.find({}, {'_id': 1}).limit(3)]
+    loader = _LazyFieldLoader('surface_energy', {'mpid': '$mpid'}, batch_size=3)
+    doc = loader.add({'mongo_id': mongo_ids[0]})
+    dropped_doc = weakref.ref(loader.add({'mongo_id': mongo_ids[1]}))
+    kept_doc = loader.add({'mongo_id': mongo_ids[2]})
+    gc.collect()
+    assert dropped_doc() is None
+
+    # The documents that are still around should still be batched together
+    assert isinstance(doc['mpid'], str)
+    assert 'mpid' in kept_doc.keys()
+
 
 def test_get_catalog_docs():
     docs = get_catalog_docs()
@@ -219,6 +886,61 @@ def test_get_catalog_docs():
         assert all(isinstance(coordinate, float) for coordinate in doc['adsorption_site'])
 
 
+def test_get_catalog_docs_with_cache():
+    expected_docs = get_catalog_docs()
+    docs_fresh = get_catalog_docs(cache=True, refresh_cache=True)
+    docs_cached = get_catalog_docs(cache=True)
+    assert __sort_by_mongo_id(docs_fresh) == __sort_by_mongo_id(expected_docs)
+    assert __sort_by_mongo_id(docs_cached) == __sort_by_mongo_id(expected_docs)
+
+
+def __sort_by_mongo_id(docs):
+    ''' Helper function to compare lists of documents regardless of order '''
+    return sorted(docs, key=lambda doc: doc['mongo_id'])
+
+
+def test__pull_catalog_with_snapshot():
+    projection = catalog_projection()
+    pipeline = [{'$project': projection}]
+    expected_docs = __sort_by_mongo_id(_pull_catalog_with_snapshot(pipeline, projection.keys(),
+                                                                   refresh=True))
+    cache_name = _get_catalog_snapshot_name(pipeline)
+
+    # Pretend that the snapshot is missing the newest document, then make sure
+    # that we pull it incrementally
+    with open(cache_name, 'rb') as file_handle:
+        snapshot = pickle.load(file_handle)
+    with get_mongo_collection('catalog_readonly') as collection:
+        second_newest_id = list(collection.find({}, {'_id': 1}).sort('_id', -1).limit(2))[-1]['_id']
+    snapshot['docs'] = [doc for doc in snapshot['docs'] if doc['mongo_id'] <= second_newest_id]
+    snapshot['n_docs_pulled'] -= 1
+    snapshot['max_id'] = second_newest_id
+    with open(cache_name, 'wb') as file_handle:
+        pickle.dump(snapshot, file_handle)
+    docs = _pull_catalog_with_snapshot(pipeline, projection.keys())
+    assert __sort_by_mongo_id(docs) == expected_docs
+
+    # Pretend that something was deleted from the catalog, then make sure
+    # that we rebuild the snapshot
+    with open(cache_name, 'rb') as file_handle:
+        snapshot = pickle.load(file_handle)
+    snapshot['docs'] = snapshot['docs'][1:]
+    snapshot['n_docs_pulled'] += 1
+    with open(cache_name, 'wb') as file_handle:
+        pickle.dump(snapshot, file_handle)
+    docs = _pull_catalog_with_snapshot(pipeline, projection.keys())
+    assert __sort_by_mongo_id(docs) == expected_docs
+
+
+def test_iter_catalog_docs():
+    expected_docs = get_catalog_docs()
+    assert list(iter_catalog_docs(batch_size=5)) == expected_docs
+
+    chunks = list(iter_catalog_docs(batch_size=5, chunked=True))
+    assert all(len(chunk) == 5 for chunk in chunks[:-1])
+    assert [doc for chunk in chunks for doc in chunk] == expected_docs
+
+
 def test__pull_catalog_from_mongo():
     projection = catalog_projection()
     project = {'$project': projection}
@@ -239,6 +961,60 @@ def test__pull_catalog_from_mongo():
                     raise
 
 
+def test_get_catalog_frame():
+    docs = get_catalog_docs()
+    frame = get_catalog_frame()
+
+    assert isinstance(frame, pd.DataFrame)
+    assert len(frame) == len(docs)
+    assert list(frame['mpid']) == [doc['mpid'] for doc in docs]
+    assert frame['shift'].dtype == np.float64
+    assert frame['top'].dtype == np.int8
+    npt.assert_allclose(frame[['adsorption_site_x', 'adsorption_site_y', 'adsorption_site_z']].values,
+                        [doc['adsorption_site'] for doc in docs])
+
+    arrays = get_catalog_frame(as_dataframe=False)
+    assert arrays['miller'].shape == (len(docs), 3)
+    npt.assert_array_equal(arrays['miller'], [doc['miller'] for doc in docs])
+    neighborcoords = arrays['neighborcoord_categories'][arrays['neighborcoord']]
+    assert [list(coord) for coord in neighborcoords] == [doc['neighborcoord'] for doc in docs]
+
+
+@pytest.mark.parametrize('adsorbate', ['H', 'CO'])
+def test_get_adsorption_frame(adsorbate):
+    docs = get_adsorption_docs(adsorbate)
+    arrays = get_adsorption_frame(adsorbate, as_dataframe=False)
+
+    npt.assert_allclose(arrays['energy'], [doc['energy'] for doc in docs])
+    npt.assert_array_equal(arrays['top'], [doc['top'] for doc in docs])
+    mpids = arrays['mpid_categories'][arrays['mpid']]
+    assert list(mpids) == [doc['mpid'] for doc in docs]
+
+
+def test__make_frame():
+    docs = [{'mpid': 'mp-30', 'miller': [1, 1, 1], 'shift': 0., 'top': True,
+             'neighborcoord': ['Cu:Cu-Cu', 'Cu:Cu-Cu'], 'extra': [1, 2]},
+            {'mpid': 'mp-2', 'miller': [2, 1, 0], 'shift': 0.25, 'top': False,
+             'neighborcoord': ['Pd:Cu-Cu', 'Cu:Cu-Cu'], 'extra': [3, 4]},
+            {'mpid': 'mp-30', 'miller': [1, 1, 1], 'shift': 0.5, 'top': True,
+             'neighborcoord': ['Cu:Cu-Cu', 'Cu:Cu-Cu'], 'extra': [5, 6]}]
+
+    arrays = _make_frame(iter(docs), as_dataframe=False)
+    npt.assert_array_equal(arrays['mpid'], [0, 1, 0])
+    assert list(arrays['mpid_categories']) == ['mp-30', 'mp-2']
+    npt.assert_array_equal(arrays['neighborcoord'], [0, 1, 0])
+    assert arrays['miller'].dtype == np.int8
+    npt.assert_array_equal(arrays['miller'], [[1, 1, 1], [2, 1, 0], [1, 1, 1]])
+    npt.assert_array_equal(arrays['top'], [1, 0, 1])
+    assert arrays['extra'].shape == (3,)
+
+    frame = _make_frame(iter(docs))
+    assert list(frame['miller_h']) == [1, 2, 1]
+    assert frame['mpid'].dtype.name == 'category'
+    assert frame['neighborcoord'][1] == ('Pd:Cu-Cu', 'Cu:Cu-Cu')
+    assert list(frame['extra']) == [[1, 2], [3, 4], [5, 6]]
+
+
 @pytest.mark.parametrize('latest_predictions', [True, False])
 def test_get_catalog_docs_with_predictions(latest_predictions):
     docs = get_catalog_docs_with_predictions(latest_predictions=latest_predictions)
@@ -263,20 +1039,19 @@ def test__add_adsorption_energy_predictions_to_projections(latest_predictions):
 
     # Get ALL of the adsorbates and models in the unit testing collection
     with get_mongo_collection('catalog') as collection:
-        cursor = collection.aggregate([{"$sample": {"size": 1}}])
-        docs = list(cursor)
+        docs = list(collection.find({'predictions': {'$exists': True}}, {'predictions': 1}))
     adsorbates = set()
     models = set()
     for doc in docs:
         predictions = doc['predictions']['adsorption_energy']
         new_adsorbates = set(predictions.keys())
-        new_models = set(model for adsorbate in adsorbates for model in predictions[adsorbate])
         adsorbates.update(new_adsorbates)
-        models.update(new_models)
+        models.update((adsorbate, model) for adsorbate in new_adsorbates
+                      for model in predictions[adsorbate])
 
     # Make sure that every single query is there
     for adsorbate in adsorbates:
-        for model in models:
+        for model in (model for _adsorbate, model in models if _adsorbate == adsorbate):
             data_location = 'predictions.adsorption_energy.%s.%s' % (adsorbate, model)
             if latest_predictions:
                 assert projections[data_location] == {'$arrayElemAt': ['$'+data_location, -1]}
@@ -291,8 +1066,7 @@ def test__add_orr_predictions_to_projections(latest_predictions):
 
     # Get ALL of the models in the unit testing collection
     with get_mongo_collection('catalog') as collection:
-        cursor = collection.aggregate([{"$sample": {"size": 1}}])
-        docs = list(cursor)
+        docs = list(collection.find({'predictions': {'$exists': True}}, {'predictions': 1}))
     models = set()
     for doc in docs:
         predictions = doc['predictions']['orr_onset_potential_4e']
@@ -308,6 +1082,61 @@ def test__add_orr_predictions_to_projections(latest_predictions):
             assert projections[data_location] == '$'+data_location
 
 
+def test_update_prediction_schema():
+    schema = update_prediction_schema()
+
+    # Find every adsorbate/model combination the slow way
+    adsorption_energy = {}
+    orr_onset_potential_4e = set()
+    with get_mongo_collection('catalog') as collection:
+        docs = list(collection.find({'predictions': {'$exists': True}}, {'predictions': 1}))
+    for doc in docs:
+        for adsorbate, models in doc['predictions'].get('adsorption_energy', {}).items():
+            adsorption_energy.setdefault(adsorbate, set()).update(models)
+        orr_onset_potential_4e.update(doc['predictions'].get('orr_onset_potential_4e', {}))
+
+    assert {adsorbate: set(models) for adsorbate, models in schema['adsorption_energy'].items()} == adsorption_energy
+    assert set(schema['orr_onset_potential_4e']) == orr_onset_potential_4e
+
+    # Make sure it got saved, too
+    with get_mongo_collection('catalog') as collection:
+        doc = collection['metadata'].find_one({'_id': 'prediction_schema'})
+    assert doc['adsorption_energy'] == schema['adsorption_energy']
+    assert doc['orr_onset_potential_4e'] == schema['orr_onset_potential_4e']
+
+
+def test_get_prediction_schema():
+    expected_schema = update_prediction_schema()
+    _PREDICTION_SCHEMA_CACHE.clear()
+    schema = get_prediction_schema()
+    assert schema == expected_schema
+
+    # The second call should come from the in-process cache
+    assert get_prediction_schema() is schema
+    assert get_prediction_schema(max_age=0) is not schema
+
+
+def test_register_predictions():
+    update_prediction_schema()
+    try:
+        register_predictions('unit_testing_model', adsorbates=['CO', 'H'],
+                             orr_onset_potential_4e=True)
+        schema = get_prediction_schema()
+        assert 'unit_testing_model' in schema['adsorption_energy']['CO']
+        assert 'unit_testing_model' in schema['adsorption_energy']['H']
+        assert 'unit_testing_model' in schema['orr_onset_potential_4e']
+
+        # Registering twice should not duplicate anything
+        register_predictions('unit_testing_model', adsorbates=['CO'])
+        schema = get_prediction_schema()
+        assert schema['adsorption_energy']['CO'].count('unit_testing_model') == 1
+
+    # There are no such predictions, so rebuilding should clean up after us
+    finally:
+        schema = update_prediction_schema()
+    assert 'unit_testing_model' not in schema['orr_onset_potential_4e']
+
+
 @pytest.mark.baseline
 @pytest.mark.parametrize('adsorbate, adsorbate_rotation_list',
                          [('H', [{'phi': 0., 'theta': 0., 'psi': 0.}]),
@@ -347,6 +1176,66 @@ def test_get_unsimulated_catalog_docs(adsorbate, adsorbate_rotation_list):
     assert len(expected_docs) == 0
 
 
+@pytest.mark.parametrize('adsorbate, adsorbate_rotation_list',
+                         [('H', [{'phi': 0., 'theta': 0., 'psi': 0.}]),
+                          ('CO', [{'phi': 0., 'theta': 0., 'psi': 0.},
+                                  {'phi': 0., 'theta': 30., 'psi': 0.}])])
+def test_iter_unsimulated_catalog_docs(adsorbate, adsorbate_rotation_list):
+    '''
+    The server-side anti-join should find the same sites as the hashing we do
+    in Python
+    '''
+    docs_server = list(iter_unsimulated_catalog_docs(adsorbate=adsorbate,
+                                                     adsorbate_rotation_list=adsorbate_rotation_list,
+                                                     server_side=True))
+    docs_hash = get_unsimulated_catalog_docs(adsorbate=adsorbate,
+                                             adsorbate_rotation_list=adsorbate_rotation_list,
+                                             server_side=False)
+
+    def make_key(doc):
+        return (doc['mongo_id'], tuple(sorted(doc['adsorbate_rotation'].items())))
+    assert sorted(docs_server, key=make_key) == sorted(docs_hash, key=make_key)
+
+
+def test__share_database():
+    assert _share_database('catalog', 'catalog_readonly')
+    assert _share_database('catalog_readonly', 'adsorption')
+
+
+def test__make_attempted_sites_lookup():
+    rotation = {'phi': 0., 'theta': 30., 'psi': 0.}
+    vasp_settings = adslab_settings()['vasp']
+    lookup = _make_attempted_sites_lookup('foo', 'CO', rotation, vasp_settings)['$lookup']
+
+    assert lookup['from'] == 'foo'
+    assert lookup['as'] == 'attempts'
+    filters = lookup['pipeline'][0]['$match']
+    assert filters['adsorbate'] == 'CO'
+    assert filters['adsorbate_rotation.theta'] == 30.
+    for setting, value in vasp_settings.items():
+        assert filters['vasp_settings.%s' % setting] == value
+
+    # The exact parts of the site should be matched with the plain filters
+    # so that they can use the index, leaving only the rounding for later
+    assert filters['$expr'] == {'$and': [{'$eq': ['$mpid', '$$mpid']},
+                                         {'$eq': ['$miller', '$$miller']},
+                                         {'$eq': ['$top', '$$top']}]}
+    site_matches = lookup['pipeline'][1]['$match']['$expr']['$and']
+    assert len(site_matches) == 4
+    assert [('adsorbate', 1), ('mpid', 1), ('miller', 1), ('top', 1)] in INDEXES['adsorption']
+
+
+@pytest.mark.parametrize('number, expected_number',
+                         [(0.004, 0.), (0.005, 0.01), (0.2549, 0.25), (1.0, 1.0)])
+def test__make_rounding_expression(number, expected_number):
+    ''' Let Mongo evaluate the expression for us '''
+    expression = _make_rounding_expression({'$literal': number})
+    with get_mongo_collection('catalog') as collection:
+        docs = list(collection.aggregate([{'$limit': 1},
+                                          {'$project': {'rounded': expression}}]))
+    assert math.isclose(docs[0]['rounded'], expected_number, abs_tol=1e-9)
+
+
 def test__duplicate_docs_per_rotation():
     docs = [dict.fromkeys(range(i)) for i in range(10)]
     rotation_list = [{'phi': 0., 'theta': 0., 'psi': 0.},
@@ -371,6 +1260,44 @@ def test__duplicate_docs_per_rotation():
         assert doc['adsorbate_rotation'] == rotation_list[0]
 
 
+def test__iter_docs_per_rotations():
+    docs = [{'mpid': 'mp-%i' % i} for i in range(10)]
+    docs_original = copy.deepcopy(docs)
+    rotation_list = [{'phi': 0., 'theta': 0., 'psi': 0.},
+                     {'phi': 180., 'theta': 180., 'psi': 180.}]
+    iterator = _iter_docs_per_rotations(docs, rotation_list)
+    assert not isinstance(iterator, list)
+
+    expected_docs = [dict(doc, adsorbate_rotation=rotation)
+                     for rotation in rotation_list for doc in docs_original]
+    assert list(iterator) == expected_docs
+
+    # Make sure we did not touch the parent documents
+    assert docs == docs_original
+
+
+def test__RotatedDoc():
+    doc = {'mpid': 'mp-30', 'miller': [1, 1, 1], 'natoms': 5}
+    rotation = {'phi': 0., 'theta': 30., 'psi': 0.}
+    view = _RotatedDoc(doc, rotation)
+    expected_doc = dict(doc, adsorbate_rotation=rotation)
+
+    assert view['adsorbate_rotation'] == rotation
+    assert view['mpid'] == 'mp-30'
+    assert len(view) == len(expected_doc)
+    assert set(view.keys()) == set(expected_doc.keys())
+    assert view == expected_doc
+    assert 'adsorbate_rotation' not in doc
+
+    # `_hash_doc` should not be able to tell the difference between a view
+    # and a real document
+    copy_ = view.copy()
+    assert type(copy_) is dict
+    assert copy_ == expected_doc
+    assert (_hash_doc(view, ignore_keys=['natoms'], _return_hash=False) ==
+            _hash_doc(expected_doc, ignore_keys=['natoms'], _return_hash=False))
+
+
 @pytest.mark.parametrize('adsorbate', ['H', 'CO'])
 def test__get_attempted_adsorption_docs(adsorbate):
     attempted_docs = _get_attempted_adsorption_docs(adsorbate=adsorbate)
@@ -381,6 +1308,13 @@ def test__get_attempted_adsorption_docs(adsorbate):
     assert len(attempted_docs) == len(all_docs)
 
 
+@pytest.mark.parametrize('adsorbate', ['H', 'CO'])
+def test__iter_attempted_adsorption_docs(adsorbate):
+    expected_docs = _get_attempted_adsorption_docs(adsorbate=adsorbate)
+    docs = list(_iter_attempted_adsorption_docs(adsorbate=adsorbate, batch_size=2))
+    assert docs == expected_docs
+
+
 @pytest.mark.baseline
 @pytest.mark.parametrize('ignore_keys', [None, ['mpid'], ['mpid', 'top']])
 def test_to_create_hashed_doc(ignore_keys):
@@ -458,6 +1392,208 @@ def test_get_low_coverage_docs(adsorbate, model_tag):
                 continue
 
 
+
+@pytest.mark.parametrize('adsorbate, model_tag',
+                         [('H', 'model0'),
+                          ('CO', 'model0')])
+def test_get_low_coverage_docs_prefetched(adsorbate, model_tag):
+    docs_dft = get_low_coverage_dft_docs(adsorbate)
+    docs_ml = get_low_coverage_ml_docs(adsorbate, model_tag)
+    docs = get_low_coverage_docs(adsorbate, model_tag,
+                                 docs_dft=index_low_coverage_docs(docs_dft),
+                                 docs_ml=docs_ml)
+
+    expected_docs = get_low_coverage_docs(adsorbate, model_tag)
+    docs_by_surface = {get_surface_from_doc(doc): doc for doc in docs}
+    expected_docs_by_surface = {get_surface_from_doc(doc): doc for doc in expected_docs}
+    assert docs_by_surface.keys() == expected_docs_by_surface.keys()
+    for surface, doc in docs_by_surface.items():
+        assert doc['DFT_calculated'] == expected_docs_by_surface[surface]['DFT_calculated']
+        assert doc['energy'] == expected_docs_by_surface[surface]['energy']
+
+    # The merge should not have touched the documents we gave it
+    for doc in docs_dft + docs_ml:
+        assert 'DFT_calculated' not in doc
+
+
+@pytest.mark.parametrize('adsorbate', ['H', 'CO'])
+def test_get_low_coverage_docs_by_model(adsorbate):
+    docs_by_model = get_low_coverage_docs_by_model(adsorbate, ['model0'])
+    expected_docs = get_low_coverage_docs(adsorbate, 'model0')
+    assert len(docs_by_model['model0']) == len(expected_docs)
+
+
+def test_merge_low_coverage_docs():
+    def make_doc(mpid, coordination, energy):
+        return {'mpid': mpid, 'miller': [1, 1, 1], 'shift': 0., 'top': True,
+                'coordination': coordination, 'neighborcoord': [coordination + ':'],
+                'energy': energy}
+    docs_dft = [make_doc('mp-1', 'Cu', -1.),    # DFT is lower, so it wins
+                make_doc('mp-2', 'Cu', 0.5),    # Same site as ML, so DFT wins
+                make_doc('mp-3', 'Cu', 0.5),    # Different site and higher, so ML wins
+                make_doc('mp-5', 'Cu', 0.)]     # Not in the catalog, so DFT wins
+    docs_ml = [make_doc('mp-1', 'Pt', 0.),
+               make_doc('mp-2', 'Cu', 0.),
+               make_doc('mp-3', 'Pt', 0.),
+               make_doc('mp-4', 'Pt', 0.)]      # No DFT, so ML wins
+    docs = merge_low_coverage_docs(docs_dft, docs_ml)
+
+    docs_by_mpid = {doc['mpid']: doc for doc in docs}
+    assert docs_by_mpid['mp-1'] == dict(docs_dft[0], DFT_calculated=True)
+    assert docs_by_mpid['mp-2'] == dict(docs_dft[1], DFT_calculated=True)
+    assert docs_by_mpid['mp-3'] == dict(docs_ml[2], DFT_calculated=False)
+    assert docs_by_mpid['mp-4'] == dict(docs_ml[3], DFT_calculated=False)
+    assert docs_by_mpid['mp-5'] == dict(docs_dft[3], DFT_calculated=True)
+    assert len(docs) == 5
+    for doc in docs_dft + docs_ml:
+        assert 'DFT_calculated' not in doc
+
+
+def test__get_site_from_doc():
+    doc = {'coordination': 'Cu-Cu', 'neighborcoord': ['Cu:Cu-Pd', 'Cu:Cu-Cu'], 'energy': 0.}
+    assert _get_site_from_doc(doc) == ('Cu-Cu', ('Cu:Cu-Pd', 'Cu:Cu-Cu'))
+
+
+def __drop_low_coverage_collection():
+    with get_mongo_collection('catalog') as collection:
+        collection[LOW_COVERAGE_COLLECTION].drop()
+        collection['metadata'].delete_one({'_id': LOW_COVERAGE_STATUS_ID})
+
+
+@pytest.mark.parametrize('adsorbate, model_tag',
+                         [('H', 'model0'),
+                          ('CO', 'model0')])
+def test_rebuild_low_coverage_collection(adsorbate, model_tag):
+    expected_docs = get_low_coverage_docs(adsorbate, model_tag)
+    try:
+        sources = rebuild_low_coverage_collection(adsorbates=[adsorbate], model_tags=[model_tag])
+        assert sources == {adsorbate: [LOW_COVERAGE_DFT_TAG, model_tag]}
+        assert _get_low_coverage_sources() == sources
+
+        # Reading from the materialized collection should give the same answer
+        docs = get_low_coverage_docs(adsorbate, model_tag)
+        assert __sort_by_mongo_id(docs) == __sort_by_mongo_id(expected_docs)
+    finally:
+        __drop_low_coverage_collection()
+    assert _get_low_coverage_sources() == {}
+
+
+def test_update_low_coverage_dft_docs():
+    adsorbate = 'CO'
+    try:
+        rebuild_low_coverage_collection(adsorbates=[adsorbate], model_tags=[])
+        expected_docs = _pull_low_coverage_docs(adsorbate, LOW_COVERAGE_DFT_TAG)
+
+        # Re-adding the documents we already have should not change anything
+        with get_mongo_collection('adsorption') as collection:
+            adsorption_ids = [doc['_id'] for doc in collection.find({'adsorbate': adsorbate}, {'_id': 1})]
+        assert update_low_coverage_dft_docs(adsorption_ids) == 0
+        docs = _pull_low_coverage_docs(adsorbate, LOW_COVERAGE_DFT_TAG)
+        assert __sort_by_mongo_id(docs) == __sort_by_mongo_id(expected_docs)
+    finally:
+        __drop_low_coverage_collection()
+
+
+def test_update_low_coverage_ml_docs():
+    adsorbate = 'CO'
+    model_tag = 'model0'
+    try:
+        # Nothing should happen incrementally until we build the model
+        assert update_low_coverage_ml_docs(adsorbate, model_tag, catalog_ids=[]) == 0
+        n_docs = update_low_coverage_ml_docs(adsorbate, model_tag)
+        assert _get_low_coverage_sources() == {adsorbate: [model_tag]}
+
+        docs = _pull_low_coverage_docs(adsorbate, model_tag)
+        expected_docs = get_low_coverage_ml_docs(adsorbate, model_tag)
+        assert len(docs) == n_docs
+        assert __sort_by_mongo_id(docs) == __sort_by_mongo_id(expected_docs)
+    finally:
+        __drop_low_coverage_collection()
+
+
+def test_update_low_coverage_ml_docs_incremental():
+    adsorbate = 'CO'
+    model_tag = 'model0'
+    data_location = 'predictions.adsorption_energy.%s.%s' % (adsorbate, model_tag)
+    try:
+        update_low_coverage_ml_docs(adsorbate, model_tag)
+        low_coverage_doc = _pull_low_coverage_docs(adsorbate, model_tag)[0]
+        mongo_id = low_coverage_doc['mongo_id']
+
+        # Re-predicting a site with a lower energy should make it the new
+        # low-coverage site of its surface
+        energy = low_coverage_doc['energy'] - 1.
+        with get_mongo_collection('catalog') as collection:
+            collection.update_one({'_id': mongo_id},
+                                  {'$push': {data_location: [datetime.utcnow(), energy]}})
+        assert update_low_coverage_ml_docs(adsorbate, model_tag, catalog_ids=[mongo_id]) == 1
+        docs = [doc for doc in _pull_low_coverage_docs(adsorbate, model_tag)
+                if doc['mongo_id'] == mongo_id]
+        assert len(docs) == 1
+        assert docs[0]['energy'] == energy
+
+        # Higher energies should not replace it
+        with get_mongo_collection('catalog') as collection:
+            collection.update_one({'_id': mongo_id},
+                                  {'$push': {data_location: [datetime.utcnow(), energy + 2.]}})
+        assert update_low_coverage_ml_docs(adsorbate, model_tag, catalog_ids=[mongo_id]) == 0
+
+    finally:
+        __drop_low_coverage_collection()
+        with get_mongo_collection('catalog') as collection:
+            collection.delete_many({})
+        populate_unit_testing_collection('catalog')
+
+
+def test__refresh_low_coverage_docs():
+    def make_doc(shift, energy):
+        return {'mpid': 'mp-1', 'miller': [1, 1, 1], 'shift': shift, 'top': True, 'energy': energy}
+    try:
+        with get_mongo_collection('catalog') as collection:
+            low_coverage_collection = collection[LOW_COVERAGE_COLLECTION]
+            _refresh_low_coverage_docs(low_coverage_collection,
+                                       [make_doc(0., 0.), make_doc(0.5, 0.)], 'CO', 'unit_testing')
+            _refresh_low_coverage_docs(low_coverage_collection,
+                                       [make_doc(0., 1.)], 'CO', 'unit_testing')
+            _refresh_low_coverage_docs(low_coverage_collection,
+                                       [make_doc(0., 2.)], 'H', 'unit_testing')
+
+            # Refreshing should replace energies (even higher ones), drop the
+            # surfaces that are gone, and leave other adsorbates alone
+            docs = list(low_coverage_collection.find({'source': 'unit_testing'}))
+        energies = {(doc['adsorbate'], doc['doc']['shift']): doc['energy'] for doc in docs}
+        assert energies == {('CO', 0.): 1., ('H', 0.): 2.}
+    finally:
+        __drop_low_coverage_collection()
+
+
+def test__upsert_low_coverage_docs():
+    def make_doc(shift, energy):
+        return {'mpid': 'mp-1', 'miller': [1, 1, 1], 'shift': shift, 'top': True, 'energy': energy}
+    try:
+        assert _upsert_low_coverage_docs([make_doc(0., 0.), make_doc(0.5, 0.)], 'CO', 'unit_testing') == 2
+        # Only lower energies should replace what is already there
+        assert _upsert_low_coverage_docs([make_doc(0., 1.), make_doc(0.5, -1.)], 'CO', 'unit_testing') == 1
+
+        with get_mongo_collection('catalog') as collection:
+            docs = list(collection[LOW_COVERAGE_COLLECTION].find({'source': 'unit_testing'}))
+        energies = {doc['doc']['shift']: doc['energy'] for doc in docs}
+        assert energies == {0.: 0., 0.5: -1.}
+    finally:
+        __drop_low_coverage_collection()
+
+
+def test__make_low_coverage_id():
+    doc = {'energy': 0., 'top': True, 'shift': 0.25, 'miller': [1, 1, 0], 'mpid': 'mp-1'}
+    low_coverage_id = _make_low_coverage_id(doc, 'CO', 'model0')
+    assert list(low_coverage_id.items()) == [('adsorbate', 'CO'),
+                                             ('source', 'model0'),
+                                             ('mpid', 'mp-1'),
+                                             ('miller', [1, 1, 0]),
+                                             ('shift', 0.25),
+                                             ('top', True)]
+
+
 @pytest.mark.parametrize('adsorbate', ['H', 'CO'])
 def test_get_low_coverage_dft_docs(adsorbate):
     '''
@@ -477,6 +1613,17 @@ def test_get_low_coverage_dft_docs(adsorbate):
         assert low_cov_energy <= energy
 
 
+@pytest.mark.parametrize('adsorbate', ['H', 'CO'])
+def test_iter_low_coverage_dft_docs(adsorbate):
+    expected_docs = get_low_coverage_dft_docs(adsorbate)
+    docs = list(iter_low_coverage_dft_docs(adsorbate, batch_size=2))
+
+    # Ordering out of `$group` is not guaranteed, so compare by surface
+    docs_by_surface = {get_surface_from_doc(doc): doc for doc in docs}
+    expected_docs_by_surface = {get_surface_from_doc(doc): doc for doc in expected_docs}
+    assert docs_by_surface == expected_docs_by_surface
+
+
 def test_get_surface_from_doc():
     doc = {'mpid': 'mp-23',
            'miller': [1, 0, 0],
@@ -509,6 +1656,204 @@ def test_get_low_coverage_ml_docs(adsorbate, model_tag):
         assert low_cov_energy <= energy
 
 
+def test_insert_slab_docs():
+    slab = ase.Atoms('Pt4', positions=np.random.RandomState(42).rand(4, 3) * 5.,
+                     cell=[5., 5., 20.], pbc=True)
+    slab_id = make_slab_id('mp-126', (1, 1, 1), 0., True, (1, 1), {'min_xy': 4.5})
+    slab_doc = make_doc_from_atoms(slab, _id=slab_id)
+    site_doc = make_site_doc_from_atoms(ase.Atoms('U', positions=[[1., 1., 10.]], tags=[1]),
+                                        slab_doc)
+    try:
+        assert insert_slab_docs([slab_doc]) == 1
+        assert insert_slab_docs([slab_doc]) == 0
+        slab_docs = get_slab_docs([slab_id])
+        assert [doc['_id'] for doc in slab_docs] == [slab_id]
+
+        # Sites should find their slabs in Mongo if they are not in memory
+        _SLAB_DOCS.clear()
+        atoms = make_atoms_from_doc(site_doc)
+        assert len(atoms) == len(slab) + 1
+        assert atoms[-1].symbol == 'U'
+        npt.assert_allclose(atoms.positions[:-1], slab.positions)
+
+    finally:
+        with get_mongo_collection('catalog') as collection:
+            collection[SLABS_COLLECTION].delete_many({'_id': slab_id})
+
+
+def test_purge_adslabs(monkeypatch):
+    with get_mongo_collection('adsorption') as collection:
+        doc = collection.find_one()
+    fwid = doc['fwids']['slab+adsorbate']
+    with get_mongo_collection('atoms') as collection:
+        n_atoms_docs = collection.count_documents({'fwid': fwid})
+
+    # `_bulk_defuse_fws` has its own tests, and the FWs of our unit testing
+    # documents are not in the unit testing launchpad
+    defused_fwids = []
+
+    def fake_bulk_defuse_fws(lpad, fwids):
+        defused_fwids.extend(fwids)
+        return len(fwids), 0, 0
+
+    monkeypatch.setattr('gaspy.gasdb._bulk_defuse_fws', fake_bulk_defuse_fws)
+
+    try:
+        report = purge_adslabs([fwid])
+        assert defused_fwids == [fwid]
+        assert report['n_defused'] == 1
+        assert report['n_adsorption_removed'] == 1
+        assert report['n_atoms_removed'] == n_atoms_docs
+        with get_mongo_collection('adsorption') as collection:
+            assert collection.count_documents({'fwids.slab+adsorbate': fwid}) == 0
+        with get_mongo_collection('atoms') as collection:
+            assert collection.count_documents({'fwid': fwid}) == 0
+
+    finally:
+        for collection_tag in ['adsorption', 'atoms', 'catalog']:
+            with get_mongo_collection(collection_tag) as collection:
+                collection.delete_many({})
+            populate_unit_testing_collection(collection_tag)
+
+
+@pytest.mark.parametrize('state', ['READY', 'PAUSED', 'FIZZLED', 'DEFUSED',
+                                   'RESERVED', 'RUNNING', 'COMPLETED'])
+def test__bulk_defuse_fws(state, tmpdir):
+    lpad = get_launchpad()
+    fwid, expected_fwid = __make_identical_fws(lpad, state, str(tmpdir))
+    try:
+        assert _bulk_defuse_fws(lpad, [fwid]) == (1, 0, 0)
+        lpad.defuse_fw(expected_fwid)
+
+        # Defusing in bulk should leave the same documents behind as FireWorks
+        fw_doc, wf_doc = __get_defused_docs(lpad, fwid)
+        expected_fw_doc, expected_wf_doc = __get_defused_docs(lpad, expected_fwid)
+        assert fw_doc['state'] == 'DEFUSED'
+        assert fw_doc == expected_fw_doc
+        assert wf_doc == expected_wf_doc
+
+    finally:
+        lpad.delete_wf(fwid)
+        lpad.delete_wf(expected_fwid)
+
+
+def test__bulk_defuse_fws_locked(tmpdir, monkeypatch):
+    lpad = get_launchpad()
+    fwids = __make_identical_fws(lpad, 'COMPLETED', str(tmpdir))
+    fwid = fwids[0]
+
+    # Pretend that FireWorks locked the workflow right after we defused its FW
+    bulk_write = lpad.fireworks.bulk_write
+
+    def locking_bulk_write(*args, **kwargs):
+        result = bulk_write(*args, **kwargs)
+        lpad.workflows.update_one({'nodes': fwid}, {'$set': {'locked': True}})
+        return result
+
+    monkeypatch.setattr(lpad.fireworks, 'bulk_write', locking_bulk_write)
+    individually_defused_fwids = []
+    monkeypatch.setattr(lpad, 'defuse_fw', individually_defused_fwids.append)
+
+    try:
+        # We should leave locked workflows alone and hand them to FireWorks
+        assert _bulk_defuse_fws(lpad, [fwid]) == (0, 1, 0)
+        assert individually_defused_fwids == [fwid]
+        wf_doc = lpad.workflows.find_one({'nodes': fwid})
+        assert wf_doc['locked'] is True
+        assert wf_doc['state'] == 'COMPLETED'
+
+        # Workflows that were locked from the start should not be touched at all
+        individually_defused_fwids.clear()
+        assert _bulk_defuse_fws(lpad, [fwids[1]]) == (1, 0, 0)
+        lpad.workflows.update_one({'nodes': fwids[1]}, {'$set': {'locked': True}})
+        assert _bulk_defuse_fws(lpad, [fwids[1]]) == (0, 1, 0)
+        assert individually_defused_fwids == [fwids[1]]
+
+    finally:
+        for fwid in fwids:
+            lpad.delete_wf(fwid)
+
+
+def __make_identical_fws(lpad, state, launch_dir):
+    '''
+    Adds two identical, single-FW workflows to a launchpad and then moves both
+    of their FWs into the same state.
+
+    Args:
+        lpad        A `fireworks.LaunchPad` instance
+        state       A string indicating the FireWorks state to move the FWs to
+        launch_dir  A string indicating where to pretend to launch the FWs
+    Returns:
+        fwids   A list of the two FireWorks IDs
+    '''
+    fwids = []
+    for _ in range(2):
+        fw = Firework(ScriptTask.from_str('echo unit_testing'), name='unit_testing')
+        fwid = list(lpad.add_wf(Workflow([fw])).values())[0]
+        if state == 'RESERVED':
+            lpad.reserve_fw(FWorker(), launch_dir, fw_id=fwid)
+        elif state in {'RUNNING', 'COMPLETED', 'FIZZLED'}:
+            _, launch_id = lpad.checkout_fw(FWorker(), launch_dir, fw_id=fwid)
+            if state != 'RUNNING':
+                lpad.complete_launch(launch_id, FWAction(), state)
+        elif state == 'PAUSED':
+            lpad.pause_fw(fwid)
+        elif state == 'DEFUSED':
+            lpad.defuse_fw(fwid)
+        fwids.append(fwid)
+    return fwids
+
+
+def __get_defused_docs(lpad, fwid):
+    '''
+    Gets the FW and workflow documents of a FW without the things that are
+    different between identical FWs, e.g., their IDs and timestamps.
+    '''
+    fw_doc = lpad.fireworks.find_one({'fw_id': fwid}, {'_id': 0, 'fw_id': 0,
+                                                        'created_on': 0, 'updated_on': 0})
+    fw_doc['launches'] = len(fw_doc['launches'])
+    fw_doc['archived_launches'] = len(fw_doc.get('archived_launches', []))
+
+    wf_doc = lpad.workflows.find_one({'nodes': fwid}, {'_id': 0, 'nodes': 0, 'links': 0,
+                                                       'parent_links': 0, 'created_on': 0,
+                                                       'updated_on': 0})
+    wf_doc['fw_states'] = list(wf_doc['fw_states'].values())
+    return fw_doc, wf_doc
+
+
+def test__remove_catalog_predictions():
+    with get_mongo_collection('catalog') as collection:
+        catalog_doc = collection.find_one({'predictions.adsorption_energy.CO': {'$exists': True}})
+    predictions = catalog_doc['predictions']['adsorption_energy']
+
+    # Sites within our tolerances of each other should be the same site
+    adsorption_doc = {'adsorbate': 'CO',
+                      'mpid': catalog_doc['mpid'],
+                      'miller': catalog_doc['miller'],
+                      'shift': catalog_doc['shift'] + 0.005,
+                      'top': catalog_doc['top'],
+                      'initial_adsorption_site': [coordinate - 0.005 for coordinate
+                                                  in catalog_doc['adsorption_site']]}
+
+    try:
+        assert _remove_catalog_predictions([adsorption_doc]) == 1
+        with get_mongo_collection('catalog') as collection:
+            doc = collection.find_one({'_id': catalog_doc['_id']})
+        new_predictions = doc['predictions']['adsorption_energy']
+        assert 'CO' not in new_predictions
+        assert new_predictions == {adsorbate: prediction for adsorbate, prediction in predictions.items()
+                                   if adsorbate != 'CO'}
+
+        # There should be nothing left to remove
+        assert _remove_catalog_predictions([adsorption_doc]) == 0
+        assert _remove_catalog_predictions([]) == 0
+
+    finally:
+        with get_mongo_collection('catalog') as collection:
+            collection.delete_many({})
+        populate_unit_testing_collection('catalog')
+
+
 def test_get_electrochemical_stability():
     # at pH=0, V=0.9
     expected_stabilities = {'mp-126': 0.861,  # Pt
@@ -516,4 +1861,42 @@ def test_get_electrochemical_stability():
                             'mp-2723': 0.0}   #IrO2
     for mpid, expected_stability in expected_stabilities.items():
         stability = get_electrochemical_stability(mpid, 0, 0.9)
+        assert isinstance(stability, float)
         assert math.isclose(stability, expected_stability, rel_tol=1e-6)
+
+
+def test_get_electrochemical_stabilities():
+    mpids = ['mp-126', 'mp-81', 'mp-2723']
+    pHs = [0., 7., 14.]
+    potentials = [0., 0.9]
+    stabilities = get_electrochemical_stabilities(mpids, pHs, potentials, processes=2)
+
+    for mpid in mpids:
+        assert stabilities[mpid].shape == (len(pHs), len(potentials))
+        for i, pH in enumerate(pHs):
+            for j, potential in enumerate(potentials):
+                expected_stability = _calculate_stability_directly(mpid, pH, potential)
+                assert math.isclose(stabilities[mpid][i, j], expected_stability, rel_tol=1e-6)
+
+
+def _calculate_stability_directly(mpid, pH, potential):
+    '''
+    Calculates an electrochemical stability the slow way, i.e., with a fresh
+    `PourbaixDiagram` and without any of our caching or grouping
+    '''
+    with MPRester(read_rc('matproj_api_key')) as rester:
+        entry = rester.get_entries(mpid)[0]
+        comp_dict = {str(key): value for key, value in entry.composition.items()
+                     if key not in ELEMENTS_HO}
+        entries = rester.get_pourbaix_entries(list(comp_dict.keys()))
+    entry = [entry for entry in entries if entry.entry_id == mpid][0]
+    pbx = PourbaixDiagram(entries, comp_dict=comp_dict, filter_solids=False)
+    stability = round(pbx.get_decomposition_energy(entry, pH=pH, V=potential), 3)
+    return stability
+
+
+def test__get_pourbaix_composition():
+    assert _get_pourbaix_composition({'Ir': 1, 'O': 2}) == (('Ir', 1.),)
+    assert _get_pourbaix_composition({'Pt': 3, 'Ni': 1}) == (('Ni', 0.25), ('Pt', 0.75))
+    assert _get_pourbaix_composition({'Pt': 6., 'Ni': 2.}) == _get_pourbaix_composition({'Pt': 3, 'Ni': 1})
+    assert _get_pourbaix_composition({'H': 2, 'O': 1}) == ()
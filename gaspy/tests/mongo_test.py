@@ -3,23 +3,54 @@
 __author__ = 'Kevin Tran'
 __email__ = 'ktran@andrew.cmu.edu'
 
+# Modify the python path so that we find/use the .gaspyrc.json in the testing
+# folder instead of the main folder
+import os
+os.environ['PYTHONPATH'] = '/home/GASpy/gaspy/tests:' + os.environ['PYTHONPATH']
+
 # Things we're testing
-from ..mongo import (make_doc_from_atoms,
+from ..mongo import (ATOMS_DOC_VERSION,
+                     make_doc_from_atoms,
                      _make_atoms_dict,
+                     _make_columnar_atoms_dict,
+                     convert_atoms_dict_to_columnar,
                      make_spglib_cell_from_atoms,
                      _make_calculator_dict,
                      _make_results_dict,
-                     make_atoms_from_doc)
+                     make_atoms_from_doc,
+                     make_atoms_from_docs,
+                     use_binary_arrays,
+                     encode_array,
+                     decode_array,
+                     LazySpacegroupDict,
+                     SPACEGROUP_CACHE_SETTINGS,
+                     _SPACEGROUP_CACHE,
+                     cache_spacegroups,
+                     clear_spacegroup_cache,
+                     get_spacegroup,
+                     _get_structure_key,
+                     _get_spacegroup_cache_name,
+                     make_slab_id,
+                     make_site_doc_from_atoms,
+                     SiteDocs,
+                     cache_slab_docs,
+                     register_slab_docs,
+                     get_slab_doc,
+                     SLAB_CACHE_SETTINGS,
+                     _SLAB_DOCS,
+                     _get_registered_slab_doc)
 
 # Things we need to do the tests
+import gc
 import pytest
-import os
 from collections import OrderedDict
 import datetime
 import pickle
 import numpy as np
 import numpy.testing as npt
+import spglib
 import ase.io
+from bson import BSON
 from . import test_cases
 
 REGRESSION_BASELINES_LOCATION = '/home/GASpy/gaspy/tests/regression_baselines/mongo/'
@@ -41,7 +72,7 @@ def test_make_doc_from_atoms_concatenation(bulk_atoms_name):
     del doc['ctime']
     del doc['mtime']
 
-    atoms_dict = _make_atoms_dict(atoms)
+    atoms_dict = _make_columnar_atoms_dict(atoms)
     calculator_dict = _make_calculator_dict(atoms)
     results_dict = _make_results_dict(atoms)
     expected = OrderedDict(atoms=atoms_dict,
@@ -105,6 +136,43 @@ def test__make_atoms_dict():
         assert atoms_dict == expected_atoms_dict
 
 
+def test__make_columnar_atoms_dict():
+    for filename in ['bulks/Cu_FCC.traj', 'relaxed/Pt_slab.traj']:
+        atoms = ase.io.read('/home/GASpy/gaspy/tests/test_cases/' + filename)
+        atoms_dict = _make_columnar_atoms_dict(atoms)
+
+        assert atoms_dict['version'] == ATOMS_DOC_VERSION
+        assert atoms_dict['numbers'] == atoms.get_atomic_numbers().tolist()
+        npt.assert_allclose(atoms_dict['positions'], atoms.get_positions().ravel())
+        assert atoms_dict['natoms'] == len(atoms)
+        assert 'atoms' not in atoms_dict
+
+        # The optional arrays should be there only if they are not all zeros
+        for key, values in [('tags', atoms.get_tags()),
+                            ('charges', atoms.get_initial_charges()),
+                            ('momenta', atoms.get_momenta())]:
+            if values.any():
+                npt.assert_allclose(atoms_dict[key], values.ravel())
+            else:
+                assert key not in atoms_dict
+
+
+def test_convert_atoms_dict_to_columnar():
+    for filename in ['bulks/Cu_FCC.traj', 'relaxed/Pt_slab.traj']:
+        atoms = ase.io.read('/home/GASpy/gaspy/tests/test_cases/' + filename)
+        old_atoms_dict = _make_atoms_dict(atoms)
+        atoms_dict = convert_atoms_dict_to_columnar(old_atoms_dict)
+        expected_atoms_dict = _make_columnar_atoms_dict(atoms)
+
+        assert set(atoms_dict.keys()) == set(expected_atoms_dict.keys())
+        for key in ['version', 'numbers', 'tags', 'natoms', 'spacegroup', 'symbol_counts']:
+            assert atoms_dict.get(key) == expected_atoms_dict.get(key)
+        npt.assert_allclose(atoms_dict['positions'], expected_atoms_dict['positions'])
+
+        # Converting a converted dictionary should not do anything
+        assert convert_atoms_dict_to_columnar(atoms_dict) == atoms_dict
+
+
 def test_make_spglib_cell_from_atoms():
     atoms = test_cases.get_bulk_atoms('Cu_FCC.traj')
     lattice, positions, numbers = make_spglib_cell_from_atoms(atoms)
@@ -188,3 +256,219 @@ def test_make_atoms_from_doc(bulk_atoms_name):
     doc = make_doc_from_atoms(expected_atoms)
     atoms = make_atoms_from_doc(doc)
     assert atoms == expected_atoms
+
+
+@pytest.mark.parametrize('bulk_atoms_name', ['Cu_FCC.traj'])
+def test_make_atoms_from_doc_version_1(bulk_atoms_name):
+    ''' We should still be able to read the old, per-atom documents '''
+    expected_atoms = test_cases.get_bulk_atoms(bulk_atoms_name)
+    expected_atoms = test_cases.relax_atoms(expected_atoms)
+    doc = make_doc_from_atoms(expected_atoms)
+    doc['atoms'] = _make_atoms_dict(expected_atoms)
+    atoms = make_atoms_from_doc(doc)
+    assert atoms == expected_atoms
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_make_atoms_from_docs(processes):
+    docs = []
+    expected_atoms_list = []
+    for filename in ['bulks/Cu_FCC.traj', 'relaxed/Pt_slab.traj']:
+        atoms = ase.io.read('/home/GASpy/gaspy/tests/test_cases/' + filename)
+        atoms = test_cases.relax_atoms(atoms)
+        doc = make_doc_from_atoms(atoms)
+        docs.extend([doc] * 3)
+        expected_atoms_list.extend([make_atoms_from_doc(doc)] * 3)
+
+    atoms_list = make_atoms_from_docs(docs, processes=processes, chunksize=2)
+    assert len(atoms_list) == len(expected_atoms_list)
+    for atoms, expected_atoms in zip(atoms_list, expected_atoms_list):
+        assert atoms == expected_atoms
+        assert [c.todict() for c in atoms.constraints] == [c.todict() for c in expected_atoms.constraints]
+        assert atoms.get_potential_energy() == expected_atoms.get_potential_energy()
+        npt.assert_allclose(atoms.get_forces(), expected_atoms.get_forces())
+
+    # Atoms should not share their constraints, because ASE changes them
+    assert atoms_list[3].constraints[0] is not atoms_list[4].constraints[0]
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_encode_array(compression):
+    array = np.random.RandomState(42).normal(size=(7, 3))
+    encoded_array = encode_array(array, compression)
+    assert encoded_array['dtype'] == array.dtype.str
+    assert encoded_array['shape'] == [7, 3]
+    assert encoded_array.get('compression') == compression
+
+    # Make sure it survives a trip through BSON
+    encoded_array = BSON.encode({'array': encoded_array}).decode()['array']
+    npt.assert_array_equal(decode_array(encoded_array), array)
+
+
+def test_decode_array_lists():
+    ''' Older documents have lists, which we should still read '''
+    array = decode_array([[1., 2., 3.], [4., 5., 6.]])
+    npt.assert_array_equal(array, np.array([[1., 2., 3.], [4., 5., 6.]]))
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_make_doc_from_atoms_binary_arrays(compression):
+    expected_atoms = test_cases.get_bulk_atoms('Cu_FCC.traj')
+    expected_atoms = test_cases.relax_atoms(expected_atoms)
+    use_binary_arrays(True, compression=compression)
+    try:
+        doc = make_doc_from_atoms(expected_atoms)
+    finally:
+        use_binary_arrays(False)
+    for array in [doc['atoms']['positions'], doc['atoms']['cell'], doc['results']['forces']]:
+        assert set(array.keys()) >= {'dtype', 'shape', 'data'}
+
+    doc = BSON.encode(doc).decode()
+    atoms = make_atoms_from_doc(doc)
+    assert atoms == expected_atoms
+    npt.assert_allclose(atoms.get_forces(), expected_atoms.get_forces())
+
+    # You should be able to turn them off per document, too
+    use_binary_arrays(True, compression=compression)
+    try:
+        doc = make_doc_from_atoms(expected_atoms, binary_arrays=False)
+    finally:
+        use_binary_arrays(False)
+    assert isinstance(doc['atoms']['positions'], list)
+
+
+def test_get_spacegroup():
+    atoms = test_cases.get_bulk_atoms('Cu_FCC.traj')
+    spglib_cell = make_spglib_cell_from_atoms(atoms)
+    clear_spacegroup_cache()
+    try:
+        spacegroup = get_spacegroup(spglib_cell)
+        assert spacegroup == spglib.get_spacegroup(spglib_cell)
+        assert _SPACEGROUP_CACHE[_get_structure_key(spglib_cell)] == spacegroup
+
+        # Moving an atom should make it a different structure
+        atoms.positions[0] += 0.1
+        assert _get_structure_key(make_spglib_cell_from_atoms(atoms)) not in _SPACEGROUP_CACHE
+
+        # The LRU should not get bigger than we tell it to
+        cache_spacegroups(max_entries=1)
+        get_spacegroup(make_spglib_cell_from_atoms(atoms))
+        assert len(_SPACEGROUP_CACHE) == 1
+        assert _get_structure_key(spglib_cell) not in _SPACEGROUP_CACHE
+
+    finally:
+        cache_spacegroups()
+        clear_spacegroup_cache()
+
+
+def test_get_spacegroup_persistent():
+    atoms = test_cases.get_bulk_atoms('Cu_FCC.traj')
+    spglib_cell = make_spglib_cell_from_atoms(atoms)
+    cache_name = _get_spacegroup_cache_name(_get_structure_key(spglib_cell))
+    try:
+        clear_spacegroup_cache(persistent=True)
+        cache_spacegroups(persistent=True)
+        spacegroup = get_spacegroup(spglib_cell)
+        assert os.path.isfile(cache_name)
+
+        # If we forget it in memory, then we should find it on disk
+        _SPACEGROUP_CACHE.clear()
+        assert get_spacegroup(spglib_cell) == spacegroup
+
+    finally:
+        cache_spacegroups()
+        clear_spacegroup_cache(persistent=True)
+    assert SPACEGROUP_CACHE_SETTINGS['persistent'] is False
+    assert not os.path.isfile(cache_name)
+
+
+def test_make_doc_from_atoms_spacegroup():
+    atoms = test_cases.get_bulk_atoms('Cu_FCC.traj')
+    expected_spacegroup = spglib.get_spacegroup(make_spglib_cell_from_atoms(atoms))
+    assert make_doc_from_atoms(atoms)['atoms']['spacegroup'] == expected_spacegroup
+    assert 'spacegroup' not in make_doc_from_atoms(atoms, compute_spacegroup=False)['atoms']
+    assert make_doc_from_atoms(atoms, compute_spacegroup=1)['atoms']['spacegroup'] == expected_spacegroup
+    assert 'spacegroup' not in make_doc_from_atoms(atoms, compute_spacegroup=0)['atoms']
+    with pytest.raises(ValueError):
+        make_doc_from_atoms(atoms, compute_spacegroup='later')
+
+    # Lazy documents should find the spacegroup only when we ask for it
+    atoms_dict = make_doc_from_atoms(atoms, compute_spacegroup='lazy')['atoms']
+    assert isinstance(atoms_dict, LazySpacegroupDict)
+    assert 'spacegroup' not in atoms_dict
+    assert atoms_dict['spacegroup'] == expected_spacegroup
+    assert 'spacegroup' in atoms_dict
+    assert pickle.loads(pickle.dumps(atoms_dict)) == atoms_dict
+
+
+def test_make_slab_id():
+    settings = {'min_xy': 4.5, 'slab_generator_settings': {'max_normal_search': 1}}
+    slab_id = make_slab_id('mp-2', (1, 1, 1), 0.25, True, (2, 2), settings)
+    assert slab_id == make_slab_id('mp-2', [1, 1, 1], 0.25000001, True, [2, 2], settings)
+    assert slab_id != make_slab_id('mp-2', (1, 1, 1), 0.25, False, (2, 2), settings)
+    assert slab_id != make_slab_id('mp-2', (1, 1, 1), 0.25, True, (2, 2), {'min_xy': 8.})
+
+
+def test_make_site_doc_from_atoms():
+    slab = ase.io.read('/home/GASpy/gaspy/tests/test_cases/relaxed/Pt_slab.traj')
+    slab_id = make_slab_id('mp-126', (1, 1, 1), 0., True, (1, 1), {})
+    slab_doc = make_doc_from_atoms(slab, _id=slab_id)
+    sites = [[1., 1., 20.], [2., 1., 20.]]
+    site_docs = []
+    for site in sites:
+        marker = ase.Atoms('U', positions=[site], tags=[1])
+        site_docs.append(make_site_doc_from_atoms(marker, slab_doc, adsorption_site=site))
+
+    for site, site_doc in zip(sites, site_docs):
+        assert site_doc['atoms']['slab'] == slab_id
+        assert site_doc['atoms']['natoms'] == len(slab) + 1
+
+        # Site documents should make the same atoms as whole adslab documents
+        expected_atoms = slab.copy() + ase.Atoms('U', positions=[site], tags=[1])
+        atoms = make_atoms_from_doc(site_doc)
+        assert atoms == expected_atoms
+        npt.assert_array_equal(atoms.get_tags(), expected_atoms.get_tags())
+        assert [c.todict() for c in atoms.constraints] == [c.todict() for c in expected_atoms.constraints]
+
+    # Pickles of the sites should bring their slabs with them
+    site_docs = pickle.loads(pickle.dumps(SiteDocs(site_docs, {slab_id: slab_doc})))
+    _SLAB_DOCS.clear()
+    site_docs = pickle.loads(pickle.dumps(site_docs))
+    assert isinstance(site_docs, SiteDocs)
+    assert get_slab_doc(slab_id) == slab_doc
+    assert len(make_atoms_from_docs(site_docs)) == len(sites)
+
+    # ...but only for as long as we have the sites
+    del site_docs
+    gc.collect()
+    with pytest.raises(KeyError):
+        _get_registered_slab_doc(slab_id)
+
+
+def test_cache_slab_docs():
+    slab_docs = [{'_id': 'slab%i' % i, 'atoms': {}} for i in range(3)]
+    _SLAB_DOCS.clear()
+    try:
+        cache_slab_docs(max_entries=2)
+        register_slab_docs(slab_docs[:2])
+        assert list(_SLAB_DOCS) == ['slab0', 'slab1']
+
+        # Using a slab should keep it around longer than the others
+        assert get_slab_doc('slab0') is slab_docs[0]
+        register_slab_docs(slab_docs[2:])
+        assert list(_SLAB_DOCS) == ['slab0', 'slab2']
+
+        # Slabs of `SiteDocs` lists should not be evicted while we have them
+        site_docs = SiteDocs([], {'slab1': slab_docs[1]})
+        assert get_slab_doc('slab1') is slab_docs[1]
+        assert len(_SLAB_DOCS) == 2
+
+        # Shrinking the LRU should evict the least recently used slabs
+        cache_slab_docs(max_entries=1)
+        assert list(_SLAB_DOCS) == ['slab2']
+        del site_docs
+
+    finally:
+        cache_slab_docs()
+        _SLAB_DOCS.clear()
+    assert SLAB_CACHE_SETTINGS['max_entries'] == 1024
@@ -0,0 +1,107 @@
+''' Tests for the `records` submodule '''
+
+__author__ = 'Kevin Tran'
+__email__ = 'ktran@andrew.cmu.edu'
+
+# Modify the python path so that we find/use the .gaspyrc.json in the testing
+# folder instead of the main folder
+import os
+os.environ['PYTHONPATH'] = '/home/GASpy/gaspy/tests:' + os.environ['PYTHONPATH']
+
+# Things we're testing
+from ..records import (Record,
+                       make_record_type,
+                       AdsorptionRecord,
+                       CatalogRecord,
+                       SurfaceRecord)
+
+# Things we need to do the tests
+import sys
+import copy
+import pickle
+import pytest
+from ..defaults import adsorption_projection, catalog_projection, surface_projection
+
+
+def __make_adsorption_doc():
+    doc = {'mongo_id': 'foo',
+           'adsorbate': 'CO',
+           'mpid': 'mp-2',
+           'miller': [1, 1, 1],
+           'shift': 0.25,
+           'top': True,
+           'coordination': 'Pd-Pd',
+           'neighborcoord': ['Pd:Pd-Pd', 'Pd:Pd-Pd'],
+           'energy': -1.}
+    return doc
+
+
+@pytest.mark.parametrize('record_type, projection',
+                         [(AdsorptionRecord, adsorption_projection()),
+                          (CatalogRecord, catalog_projection()),
+                          (SurfaceRecord, surface_projection())])
+def test_record_types(record_type, projection):
+    assert issubclass(record_type, Record)
+    assert set(record_type._fields) == set(projection.keys()) - {'_id'}
+    assert not hasattr(record_type(), '__dict__')
+
+
+def test_Record():
+    doc = __make_adsorption_doc()
+    record = AdsorptionRecord(doc)
+
+    # Records should act like the dictionaries they came from
+    assert record == doc
+    assert dict(record) == doc
+    assert record.copy() == doc
+    assert len(record) == len(doc)
+    assert list(record.keys()) == list(doc.keys())
+    assert record['energy'] == -1.
+    assert record.get('foo') is None
+    assert 'mpid' in record
+    record['energy'] = -2.
+    assert record['energy'] == -2.
+    del record['energy']
+    assert 'energy' not in record
+    with pytest.raises(KeyError):
+        record['energy']
+
+    # ...but they cannot get new keys
+    with pytest.raises(KeyError):
+        record['foo'] = 'bar'
+
+    # ...and they should be smaller
+    assert sys.getsizeof(record) < sys.getsizeof(doc)
+
+
+def test_Record_copying():
+    record = AdsorptionRecord(__make_adsorption_doc())
+    for new_record in [pickle.loads(pickle.dumps(record)), copy.copy(record), copy.deepcopy(record)]:
+        assert type(new_record) is AdsorptionRecord
+        assert new_record == record
+
+
+def test_Record_with_fields():
+    assert AdsorptionRecord.with_fields(['energy', '_id']) is AdsorptionRecord
+
+    record_type = AdsorptionRecord.with_fields(['energy', 'dates'])
+    assert record_type.__name__ == 'AdsorptionRecord'
+    assert record_type._fields == AdsorptionRecord._fields + ('dates',)
+    assert record_type is AdsorptionRecord.with_fields(['dates'])
+
+    # Records of extended types should survive pickling, too
+    record = record_type(dict(__make_adsorption_doc(), dates={'slab': 'yesterday'}))
+    assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_make_record_type():
+    record_type = make_record_type('FooRecord', ['_id', 'foo', 'bar.baz', 'copy'])
+    assert record_type._fields == ('foo', 'bar.baz', 'copy')
+    assert record_type is make_record_type('FooRecord', ['foo', 'bar.baz', 'copy'])
+
+    # Fields that are not identifiers or that share names with methods should
+    # still work
+    record = record_type({'foo': 1, 'bar.baz': 2, 'copy': 3})
+    assert record['bar.baz'] == 2
+    assert record['copy'] == 3
+    assert record.copy() == {'foo': 1, 'bar.baz': 2, 'copy': 3}
@@ -214,6 +214,7 @@ def test_GenerateAdsorptionSites():
             assert isinstance(doc['shift'], float)
             assert isinstance(doc['top'], bool)
             assert isinstance(doc['slab_repeat'], tuple)
+            assert doc['atoms']['slab'] in docs.slab_docs
 
             atoms = make_atoms_from_doc(doc)
             for atom in atoms:
@@ -0,0 +1,64 @@
+''' Tests for the `gaspy.tasks.db_managers.migrations` submodule '''
+
+__author__ = 'Kevin Tran'
+__email__ = 'ktran@andrew.cmu.edu'
+
+# Modify the python path so that we find/use the .gaspyrc.json in the testing
+# folder instead of the main folder
+import os
+os.environ['PYTHONPATH'] = '/home/GASpy/gaspy/tests:' + os.environ['PYTHONPATH']
+
+# Things we're testing
+from ....tasks.db_managers.migrations import (migrate_atoms_docs,
+                                              _make_atoms_doc_update)
+
+# Things we need to do the tests
+import pytest
+from ...test_cases.mongo_test_collections.mongo_utils import populate_unit_testing_collection
+from ....gasdb import get_mongo_collection
+from ....mongo import ATOMS_DOC_VERSION, make_atoms_from_doc
+
+
+@pytest.mark.parametrize('collection_tag', ['atoms', 'adsorption', 'catalog'])
+def test_migrate_atoms_docs(collection_tag):
+    with get_mongo_collection(collection_tag) as collection:
+        collection.delete_many({})
+    populate_unit_testing_collection(collection_tag)
+    try:
+        with get_mongo_collection(collection_tag) as collection:
+            old_docs = {doc['_id']: doc for doc in collection.find()}
+
+        n_migrated = migrate_atoms_docs(collection_tag, batch_size=7)
+        assert n_migrated == sum(1 for doc in old_docs.values()
+                                 if 'version' not in doc['atoms'])
+
+        # The migrated documents should still make the same atoms
+        with get_mongo_collection(collection_tag) as collection:
+            for doc in collection.find():
+                assert doc['atoms']['version'] == ATOMS_DOC_VERSION
+                assert make_atoms_from_doc(doc) == make_atoms_from_doc(old_docs[doc['_id']])
+
+        # Running it again should not do anything
+        assert migrate_atoms_docs(collection_tag) == 0
+
+    finally:
+        with get_mongo_collection(collection_tag) as collection:
+            collection.delete_many({})
+        populate_unit_testing_collection(collection_tag)
+
+
+def test__make_atoms_doc_update():
+    with get_mongo_collection('adsorption') as collection:
+        doc = collection.find_one()
+    paths = ['atoms', 'initial_configuration.atoms', 'not_a.path']
+    update = _make_atoms_doc_update(doc, paths)
+
+    assert set(update.keys()) == {'atoms', 'initial_configuration.atoms'}
+    for atoms_dict in update.values():
+        assert atoms_dict['version'] == ATOMS_DOC_VERSION
+        assert 'atoms' not in atoms_dict
+
+    # Converted documents should not need updates
+    doc['atoms'] = update['atoms']
+    doc['initial_configuration']['atoms'] = update['initial_configuration.atoms']
+    assert _make_atoms_doc_update(doc, paths) == {}